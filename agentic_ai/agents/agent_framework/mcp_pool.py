@@ -0,0 +1,334 @@
+"""
+Process-wide pool of MCP connections shared by the Agent Framework agents.
+
+Every agent used to build and ``__aenter__`` its own ``MCPStreamableHTTPTool``,
+paying for a new HTTP session plus the ``initialize`` / ``list_tools``
+handshake per conversation (and never closing it).  Agents now lease a
+connection from :data:`MCP_POOL` instead:
+
+```python
+lease = await MCP_POOL.acquire(self.mcp_server_uri, headers)
+agent = ChatAgent(..., tools=lease.functions)
+...
+await lease.release()
+```
+
+* Connections are keyed by server URI and request headers, so callers with a
+  different bearer token never share a session.  The tool catalog is loaded
+  once per connection and served from there; the MCP server may expose a
+  different tool set per role.
+* One MCP session carries any number of concurrent leases (requests are
+  multiplexed).  A lease does not pin its session: a session only counts as
+  busy while a tool call (or the initial catalog load) is running on it.
+  At most ``MCP_POOL_MAX_SESSIONS`` sessions stay open; when the pool is
+  full the least recently used session with no call in flight is closed,
+  or the caller waits up to ``MCP_POOL_ACQUIRE_TIMEOUT_SECONDS``.  A lease
+  whose session was closed reopens it on its next call, so agents can keep
+  their lease for as long as they are cached.
+* Sessions with no call in flight close after ``MCP_POOL_IDLE_SECONDS``.
+* A session idle for longer than ``MCP_POOL_HEALTH_SECONDS`` is pinged when
+  leased.  Dead sessions, and sessions whose transport failed during a tool
+  call, reconnect on next use.  Failed calls are not retried, because the
+  write tools are not idempotent.
+
+Pass ``lease.functions`` (or a filtered subset) to ``ChatAgent`` rather than
+the tool itself: a ``ChatAgent`` closes MCP tools it is given on exit.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+import weakref
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from agent_framework import MCPStreamableHTTPTool
+from agent_framework.exceptions import ToolExecutionException
+from mcp.shared.exceptions import McpError
+
+logger = logging.getLogger(__name__)
+
+MCP_POOL_MAX_SESSIONS = int(os.getenv("MCP_POOL_MAX_SESSIONS", "32"))
+MCP_POOL_IDLE_SECONDS = float(os.getenv("MCP_POOL_IDLE_SECONDS", "300"))
+MCP_POOL_HEALTH_SECONDS = float(os.getenv("MCP_POOL_HEALTH_SECONDS", "30"))
+MCP_POOL_ACQUIRE_TIMEOUT_SECONDS = float(os.getenv("MCP_POOL_ACQUIRE_TIMEOUT_SECONDS", "30"))
+
+_Key = Tuple[str, str]
+
+
+def _key(url: str, headers: Dict[str, str]) -> _Key:
+    # Headers carry the bearer token: key on a digest, never on the raw value.
+    return url, hashlib.sha256(json.dumps(sorted(headers.items())).encode()).hexdigest()
+
+
+class _PooledMCPTool(MCPStreamableHTTPTool):
+    """``MCPStreamableHTTPTool`` that reconnects its pooled session when needed."""
+
+    def __init__(self, connection: "MCPConnection", **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self._connection = connection
+
+    async def call_tool(self, tool_name: str, **kwargs: Any) -> Any:
+        async with self._connection.pool.using(self._connection):
+            try:
+                return await super().call_tool(tool_name, **kwargs)
+            except ToolExecutionException as exc:
+                if not isinstance(exc.__cause__, McpError):  # transport failure, not a tool error
+                    self._connection.broken = True
+                raise
+
+
+class MCPConnection:
+    """One MCP session, owned by a background task and shared by its leases."""
+
+    def __init__(
+        self,
+        pool: "MCPConnectionPool",
+        key: _Key,
+        url: str,
+        headers: Dict[str, str],
+        timeout: int,
+        request_timeout: int,
+    ) -> None:
+        self.pool = pool
+        self.key = key
+        self.tool = _PooledMCPTool(
+            self,
+            name="mcp-streamable",
+            url=url,
+            headers=headers,
+            timeout=timeout,
+            request_timeout=request_timeout,
+        )
+        self.leases = 0
+        self.active = 0  # tool calls in flight; only these keep the session open
+        self.last_used = time.monotonic()
+        self.last_checked = 0.0
+        self.broken = False
+        self.connects = 0
+        self._task: Optional[asyncio.Task] = None
+        self._stop: Optional[asyncio.Event] = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def functions(self) -> List[Any]:
+        """The cached tool catalog (``AIFunction`` objects bound to this session)."""
+        return self.tool.functions
+
+    @property
+    def connected(self) -> bool:
+        return not self.broken and self._task is not None and not self._task.done()
+
+    async def ensure_connected(self) -> None:
+        if self.connected:
+            return
+        async with self._lock:
+            if self.connected:
+                return
+            await self._close()
+            stop = asyncio.Event()
+            ready: asyncio.Future = asyncio.get_running_loop().create_future()
+            self._task = asyncio.create_task(self._run(ready, stop))
+            self._stop = stop
+            await ready
+            self.broken = False
+            self.connects += 1
+            self.last_checked = time.monotonic()
+            logger.info("[MCP POOL] Connected to %s (%d tools)", self.key[0], len(self.functions))
+
+    async def _run(self, ready: asyncio.Future, stop: asyncio.Event) -> None:
+        # The MCP client's anyio task groups must be entered and exited by the
+        # same task, so each session lives in its own task rather than in
+        # whichever request happened to open or evict it.
+        try:
+            self.tool._functions.clear()  # load_tools() appends to the catalog
+            async with self.tool:
+                ready.set_result(None)
+                await stop.wait()
+        except asyncio.CancelledError:
+            raise
+        except BaseException as exc:
+            if not ready.done():
+                ready.set_exception(exc)
+            else:
+                logger.warning("[MCP POOL] Session to %s failed: %s", self.key[0], exc)
+        finally:
+            self.broken = True
+
+    async def check(self) -> None:
+        """Ping a session that has been quiet for a while; reconnect it if dead."""
+        if self.connected and time.monotonic() - self.last_checked >= MCP_POOL_HEALTH_SECONDS:
+            try:
+                await asyncio.wait_for(self.tool.session.send_ping(), timeout=self.tool.timeout)
+                self.last_checked = time.monotonic()
+            except Exception as exc:
+                logger.warning("[MCP POOL] Health check of %s failed (%s); reconnecting", self.key[0], exc)
+                self.broken = True
+        await self.ensure_connected()
+
+    async def close(self) -> None:
+        async with self._lock:
+            await self._close()
+
+    async def _close(self) -> None:
+        task, self._task = self._task, None
+        if task is None:
+            return
+        self._stop.set()
+        try:
+            await task
+        except BaseException as exc:  # already logged by _run
+            logger.debug("[MCP POOL] Session to %s closed with %r", self.key[0], exc)
+
+
+class MCPLease:
+    """A caller's share of a pooled connection; ``release()`` it when done."""
+
+    def __init__(self, pool: "MCPConnectionPool", connection: MCPConnection) -> None:
+        self._pool = pool
+        self.connection: Optional[MCPConnection] = connection
+
+    @property
+    def tool(self) -> MCPStreamableHTTPTool:
+        if self.connection is None:
+            raise RuntimeError("MCP lease already released")
+        return self.connection.tool
+
+    @property
+    def functions(self) -> List[Any]:
+        return self.tool.functions
+
+    async def release(self) -> None:
+        connection, self.connection = self.connection, None
+        if connection is not None:
+            await self._pool._release(connection)
+
+    async def __aenter__(self) -> "MCPLease":
+        return self
+
+    async def __aexit__(self, exc_type: Any, exc_value: Any, traceback: Any) -> None:
+        await self.release()
+
+
+class MCPConnectionPool:
+    """Bounded set of open :class:`MCPConnection` sessions keyed by (URI, headers)."""
+
+    def __init__(
+        self,
+        max_sessions: int = MCP_POOL_MAX_SESSIONS,
+        idle_seconds: float = MCP_POOL_IDLE_SECONDS,
+        acquire_timeout: float = MCP_POOL_ACQUIRE_TIMEOUT_SECONDS,
+    ) -> None:
+        self.max_sessions = max(1, max_sessions)
+        self.idle_seconds = idle_seconds
+        self.acquire_timeout = acquire_timeout
+        self._connections: Dict[_Key, MCPConnection] = {}  # open sessions
+        self._known: "weakref.WeakValueDictionary[_Key, MCPConnection]" = weakref.WeakValueDictionary()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._released: Optional[asyncio.Condition] = None
+
+    def __len__(self) -> int:
+        return len(self._connections)
+
+    def _bind_loop(self) -> asyncio.Condition:
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # Sessions of a finished event loop (e.g. an earlier asyncio.run) are unusable.
+            self._loop = loop
+            self._connections = {}
+            self._known = weakref.WeakValueDictionary()
+            self._released = asyncio.Condition()
+        return self._released
+
+    async def acquire(
+        self,
+        url: str,
+        headers: Dict[str, str],
+        timeout: int = 30,
+        request_timeout: int = 30,
+    ) -> MCPLease:
+        """Lease the connection for ``url`` + ``headers``, connecting if needed."""
+        self._bind_loop()
+        key = _key(url, headers)
+        connection = self._known.get(key)
+        if connection is None:
+            connection = MCPConnection(self, key, url, dict(headers), timeout, request_timeout)
+            self._known[key] = connection
+        connection.leases += 1
+        try:
+            async with self.using(connection):
+                await connection.check()
+        except BaseException:
+            await self._release(connection)
+            raise
+        return MCPLease(self, connection)
+
+    @asynccontextmanager
+    async def using(self, connection: MCPConnection) -> AsyncIterator[MCPConnection]:
+        """Hold an open session for ``connection`` while the block runs."""
+        await self._reserve(connection)
+        connection.active += 1
+        try:
+            await connection.ensure_connected()
+            yield connection
+        finally:
+            connection.active -= 1
+            connection.last_used = time.monotonic()
+            await self._notify()
+            if not connection.connected and connection.active == 0:
+                await self._drop(connection)
+
+    async def _reserve(self, connection: MCPConnection) -> None:
+        released = self._bind_loop()
+        deadline = time.monotonic() + self.acquire_timeout
+        while True:
+            await self._expire()
+            if self._connections.get(connection.key) is connection:
+                return
+            if len(self._connections) < self.max_sessions:
+                self._connections[connection.key] = connection
+                return
+            idle = [c for c in self._connections.values() if c.active == 0]
+            if idle:
+                await self._drop(min(idle, key=lambda c: c.last_used))
+                continue
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise RuntimeError(f"MCP connection pool exhausted ({self.max_sessions} sessions busy)")
+            async with released:
+                try:
+                    await asyncio.wait_for(released.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def close(self) -> None:
+        """Close every pooled session (application shutdown)."""
+        for connection in list(self._connections.values()):
+            await self._drop(connection)
+
+    async def _release(self, connection: MCPConnection) -> None:
+        connection.leases -= 1
+
+    async def _notify(self) -> None:
+        if self._released is not None:
+            async with self._released:
+                self._released.notify_all()
+
+    async def _expire(self) -> None:
+        cutoff = time.monotonic() - self.idle_seconds
+        for connection in list(self._connections.values()):
+            if connection.active == 0 and connection.last_used < cutoff:
+                await self._drop(connection)
+
+    async def _drop(self, connection: MCPConnection) -> None:
+        if self._connections.get(connection.key) is connection:
+            del self._connections[connection.key]
+        await connection.close()
+
+
+MCP_POOL = MCPConnectionPool()
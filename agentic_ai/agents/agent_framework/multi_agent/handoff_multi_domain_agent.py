@@ -22,10 +22,12 @@ import re
 from typing import Any, Dict, List, Optional
 
 from pydantic import BaseModel, Field
-from agent_framework import ChatAgent, ChatMessage, Role, MCPStreamableHTTPTool
+from agent_framework import ChatAgent, ChatMessage, Role
 from agent_framework.azure import AzureOpenAIChatClient
 
 from agents.base_agent import BaseAgent
+from agents.openai_clients import get_async_client
+from agents.agent_framework.mcp_pool import MCP_POOL, MCPLease
 from agents.agent_framework.utils import create_filtered_tool_list
 
 logger = logging.getLogger(__name__)
@@ -175,14 +177,16 @@ class Agent(BaseAgent):
         self._ws_manager = None
         
         # Track current agent and conversation history per domain
-        self._current_domain = state_store.get(f"{session_id}_current_domain", None)
+        self._domain_key = f"{session_id}_current_domain"
+        self._current_domain = None if self._state_deferred else state_store.get(self._domain_key, None)
         self._domain_agents: Dict[str, ChatAgent] = {}
         self._domain_threads: Dict[str, Any] = {}
+        self._mcp_lease: MCPLease | None = None
         self._initialized = False
         
         # Turn tracking for tool grouping
         self._turn_key = f"{session_id}_handoff_turn"
-        self._current_turn = state_store.get(self._turn_key, 0)
+        self._current_turn = 0 if self._state_deferred else state_store.get(self._turn_key, 0)
         
         # Context transfer configuration: -1 = all history, 0 = none, N = last N turns
         self._context_transfer_turns = int(os.getenv("HANDOFF_CONTEXT_TRANSFER_TURNS", "-1"))
@@ -249,6 +253,15 @@ class Agent(BaseAgent):
                     return True
         return False
 
+    async def aload_state(self, *keys: str) -> Dict[str, Any]:
+        values = await super().aload_state(self._turn_key, self._domain_key, *keys)
+        self._current_turn = values.get(self._turn_key, 0)
+        self._current_domain = values.get(self._domain_key)
+        return values
+
+    def _thread_state_key(self, domain_id: str) -> str:
+        return f"{self.session_id}_thread_{domain_id}"
+
     def set_websocket_manager(self, manager: Any) -> None:
         """Allow backend to inject WebSocket manager for streaming events."""
         self._ws_manager = manager
@@ -266,25 +279,27 @@ class Agent(BaseAgent):
             )
 
         headers = self._build_headers()
-        base_mcp_tool = await self._create_mcp_tool(headers)
-
-        # Connect to MCP server once to load all available tools
-        if base_mcp_tool:
-            await base_mcp_tool.__aenter__()
-            logger.info(f"[HANDOFF] Connected to MCP server, loaded {len(base_mcp_tool.functions)} tools")
+        # Lease the pooled MCP session; its tool catalog is filtered per domain below
+        self._mcp_lease = await self._lease_mcp_tool(headers)
+        if self._mcp_lease:
+            logger.info(f"[HANDOFF] Leased MCP connection with {len(self._mcp_lease.functions)} tools")
 
         chat_client = AzureOpenAIChatClient(
             api_key=self.azure_openai_key,
+            async_client=get_async_client(self.azure_openai_endpoint, self.api_version, self.azure_openai_key),
             deployment_name=self.azure_deployment,
             endpoint=self.azure_openai_endpoint,
             api_version=self.api_version,
         )
 
+        # Fetch every domain's saved thread in one store read
+        thread_states = await self._aget_many([self._thread_state_key(domain_id) for domain_id in DOMAINS])
+
         # Create all domain specialist agents with filtered tools
         for domain_id, domain_config in DOMAINS.items():
             # Create filtered tool list for this domain using common utility
             domain_tools = create_filtered_tool_list(
-                base_mcp_tool=base_mcp_tool,
+                base_mcp_tool=self._mcp_lease,
                 allowed_tool_names=domain_config["tools"],
                 agent_name=domain_id
             )
@@ -302,8 +317,7 @@ class Agent(BaseAgent):
             self._domain_agents[domain_id] = agent
             
             # Create or restore thread for this domain
-            thread_state_key = f"{self.session_id}_thread_{domain_id}"
-            thread_state = self.state_store.get(thread_state_key)
+            thread_state = thread_states.get(self._thread_state_key(domain_id))
             
             if thread_state:
                 self._domain_threads[domain_id] = await agent.deserialize_thread(thread_state)
@@ -313,34 +327,36 @@ class Agent(BaseAgent):
         self._initialized = True
         logger.info(f"[HANDOFF] Initialized {len(self._domain_agents)} domain specialists with filtered tools")
 
+    async def aclose(self) -> None:
+        """Exit the domain agents and return the MCP session to the pool."""
+        agents, self._domain_agents, self._domain_threads = list(self._domain_agents.values()), {}, {}
+        lease, self._mcp_lease = self._mcp_lease, None
+        self._initialized = False
+        for agent in agents:
+            await agent.__aexit__(None, None, None)
+        if lease is not None:
+            await lease.release()
+
     def _build_headers(self) -> Dict[str, str]:
         headers: Dict[str, str] = {"Content-Type": "application/json"}
         if self._access_token:
             headers["Authorization"] = f"Bearer {self._access_token}"
         return headers
 
-    async def _create_mcp_tool(self, headers: Dict[str, str]) -> MCPStreamableHTTPTool | None:
+    async def _lease_mcp_tool(self, headers: Dict[str, str]) -> MCPLease | None:
         """
-        Create the base MCP tool that will be shared across all domain specialists.
+        Lease the pooled MCP connection shared by all domain specialists.
         
-        The tool will be connected once and then filtered for each domain.
+        The connection's cached tool catalog is filtered for each domain.
         
         Returns:
-            MCPStreamableHTTPTool instance or None if MCP server is not configured
+            MCPLease or None if MCP server is not configured
         """
         if not self.mcp_server_uri:
             logger.warning("MCP_SERVER_URI is not configured; agents will run without MCP tools.")
             return None
 
-        tool = MCPStreamableHTTPTool(
-            name="mcp-streamable",
-            url=self.mcp_server_uri,
-            headers=headers,
-            timeout=30,
-            request_timeout=30,
-        )
-        
-        return tool
+        return await MCP_POOL.acquire(self.mcp_server_uri, headers, timeout=30, request_timeout=30)
 
     async def _build_context_prefix(self, from_domain: str, to_domain: str) -> str | None:
         """
@@ -429,14 +445,9 @@ class Agent(BaseAgent):
         )
 
         try:
-            # Use OpenAI client directly for structured output support
-            from openai import AsyncAzureOpenAI
-            
-            client = AsyncAzureOpenAI(
-                api_key=self.azure_openai_key,
-                api_version=self.api_version,
-                azure_endpoint=self.azure_openai_endpoint,
-            )
+            # Use OpenAI client directly for structured output support; the
+            # shared client reuses its connections across messages.
+            client = get_async_client(self.azure_openai_endpoint, self.api_version, self.azure_openai_key)
             
             # Use beta API with structured output
             completion = await client.beta.chat.completions.parse(
@@ -490,8 +501,7 @@ class Agent(BaseAgent):
         await self._setup_agents()
 
         # Increment turn counter
-        self._current_turn += 1
-        self.state_store[self._turn_key] = self._current_turn
+        self._current_turn += 1  # persisted with the turn's state
 
         # Determine if we need upfront classification
         is_first_message = self._current_domain is None
@@ -534,7 +544,6 @@ class Agent(BaseAgent):
         # Update current domain
         previous_domain = self._current_domain
         self._current_domain = target_domain
-        self.state_store[f"{self.session_id}_current_domain"] = target_domain
 
         # Get the specialist agent and thread
         agent = self._domain_agents[target_domain]
@@ -615,7 +624,6 @@ class Agent(BaseAgent):
                 
                 # Update domain
                 self._current_domain = new_target_domain
-                self.state_store[f"{self.session_id}_current_domain"] = new_target_domain
                 
                 # Announce handoff
                 handoff_message = (
@@ -708,17 +716,17 @@ class Agent(BaseAgent):
             {"role": "user", "content": prompt},
             {"role": "assistant", "content": assistant_response},
         ]
-        self.append_to_chat_history(messages)
-
-        # Save thread state for this domain
-        thread_state_key = f"{self.session_id}_thread_{target_domain}"
+        # Save overall state, history, turn, current domain and this domain's
+        # thread in one store write
         new_state = await thread.serialize()
-        self.state_store[thread_state_key] = new_state
-
-        # Save overall state
-        self._setstate({
-            "mode": "handoff_multi_domain",
-            "current_domain": target_domain,
-        })
+        await self.asave_state(
+            {"mode": "handoff_multi_domain", "current_domain": target_domain},
+            messages,
+            {
+                self._turn_key: self._current_turn,
+                self._domain_key: target_domain,
+                self._thread_state_key(target_domain): new_state,
+            },
+        )
 
         return assistant_response
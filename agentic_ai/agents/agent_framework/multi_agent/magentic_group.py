@@ -4,12 +4,11 @@ import json
 import logging
 import os
 from threading import Lock as ThreadLock
-from typing import Any, Callable, Dict, Iterable, List, Optional, cast
+from typing import Any, Callable, Dict, List, Optional, cast
 
 from agent_framework import (
     ChatAgent,
     MagenticBuilder,
-    MCPStreamableHTTPTool,
     WorkflowCheckpoint,
     WorkflowOutputEvent,
     CheckpointStorage,
@@ -21,6 +20,8 @@ from agent_framework import (
 from agent_framework.azure import AzureOpenAIChatClient  # type: ignore[import]
 
 from agents.base_agent import BaseAgent
+from agents.openai_clients import get_async_client
+from agents.agent_framework.mcp_pool import MCP_POOL, MCPLease
 from agents.agent_framework.utils import create_filtered_tool_list
 
 logger = logging.getLogger(__name__)
@@ -211,6 +212,7 @@ DO NOT OUTPUT ANYTHING OTHER THAN JSON, AND DO NOT DEVIATE FROM THIS SCHEMA:
             )
         self._participant_client: Optional[AzureOpenAIChatClient] = None
         self._manager_client: Optional[AzureOpenAIChatClient] = None
+        self._mcp_lease: Optional[MCPLease] = None
         self._workflow_event_logging_enabled = bool(self._config.get("log_workflow_events", False))
         self._enable_plan_review = bool(self._config.get("enable_plan_review", False))
         self._manager_instructions = self._config.get(
@@ -231,6 +233,12 @@ DO NOT OUTPUT ANYTHING OTHER THAN JSON, AND DO NOT DEVIATE FROM THIS SCHEMA:
         """Allow backend to inject WebSocket manager for streaming events."""
         self._ws_manager = manager
 
+    async def aclose(self) -> None:
+        """Return the leased MCP session to the pool."""
+        lease, self._mcp_lease = self._mcp_lease, None
+        if lease is not None:
+            await lease.release()
+
     async def chat_async(self, prompt: str) -> str:
         self._validate_configuration()
 
@@ -294,12 +302,14 @@ DO NOT OUTPUT ANYTHING OTHER THAN JSON, AND DO NOT DEVIATE FROM THIS SCHEMA:
             headers["Authorization"] = f"Bearer {self._access_token}"
         return headers
 
-    async def _maybe_create_tools(self, headers: Dict[str, str]) -> List[MCPStreamableHTTPTool] | None:
+    async def _maybe_create_tools(self, headers: Dict[str, str]) -> MCPLease | None:
         if not self.mcp_server_uri:
             logger.warning("MCP_SERVER_URI is not configured; multi-agent team will run without MCP tools.")
             return None
+        if self._mcp_lease is not None:  # kept while cached; the session is only held during tool calls
+            return self._mcp_lease
 
-        logger.info(f"[MCP SETUP] Creating MCP tool with URI: {self.mcp_server_uri}")
+        logger.info(f"[MCP SETUP] Leasing MCP connection for URI: {self.mcp_server_uri}")
         request_headers = dict(headers)
         header_overrides = self._config.get("mcp_headers")
         if isinstance(header_overrides, dict):
@@ -314,15 +324,14 @@ DO NOT OUTPUT ANYTHING OTHER THAN JSON, AND DO NOT DEVIATE FROM THIS SCHEMA:
         last_error: Exception | None = None
         for attempt in range(1, retry_attempts + 1):
             try:
-                tool = MCPStreamableHTTPTool(
-                    name="mcp-streamable",
-                    url=self.mcp_server_uri,
-                    headers=request_headers,
+                self._mcp_lease = await MCP_POOL.acquire(
+                    self.mcp_server_uri,
+                    request_headers,
                     timeout=timeout_seconds,
                     request_timeout=request_timeout_seconds,
                 )
-                logger.info(f"[MCP SETUP] Successfully created MCP tool: {tool}")
-                return [tool]
+                logger.info(f"[MCP SETUP] Leased MCP connection with {len(self._mcp_lease.functions)} tools")
+                return self._mcp_lease
             except Exception as exc:  # pragma: no cover - defensive path
                 last_error = exc
                 if attempt < retry_attempts:
@@ -361,6 +370,7 @@ DO NOT OUTPUT ANYTHING OTHER THAN JSON, AND DO NOT DEVIATE FROM THIS SCHEMA:
             logger.info("[AgentFramework-Magentic] Using API key authentication for Azure OpenAI")
             return AzureOpenAIChatClient(
                 api_key=self.azure_openai_key,
+                async_client=get_async_client(self.azure_openai_endpoint, self.api_version, self.azure_openai_key),
                 deployment_name=self.azure_deployment,
                 endpoint=self.azure_openai_endpoint,
                 api_version=self.api_version,
@@ -382,7 +392,7 @@ DO NOT OUTPUT ANYTHING OTHER THAN JSON, AND DO NOT DEVIATE FROM THIS SCHEMA:
     async def _resume_previous_run(
         self,
         checkpoint_storage: CheckpointStorage,
-        tools: List[MCPStreamableHTTPTool] | None,
+        tools: MCPLease | None,
     ) -> str | None:
         resume_id = await self._get_latest_checkpoint_id(checkpoint_storage)
         if not resume_id:
@@ -430,7 +440,7 @@ DO NOT OUTPUT ANYTHING OTHER THAN JSON, AND DO NOT DEVIATE FROM THIS SCHEMA:
         self,
         participant_client: AzureOpenAIChatClient,
         manager_client: AzureOpenAIChatClient,
-        tools: List[MCPStreamableHTTPTool] | None,
+        tools: MCPLease | None,
         checkpoint_storage: CheckpointStorage,
     ) -> Any:
         participants = await self._create_participants(participant_client, tools)
@@ -481,16 +491,12 @@ DO NOT OUTPUT ANYTHING OTHER THAN JSON, AND DO NOT DEVIATE FROM THIS SCHEMA:
     async def _create_participants(
         self,
         participant_client: AzureOpenAIChatClient,
-        tools: Iterable[MCPStreamableHTTPTool] | None,
+        tools: MCPLease | None,
     ) -> Dict[str, ChatAgent]:
-        # Get base MCP tool (connect once, filter per agent)
-        base_mcp_tool = tools[0] if tools else None
-        logger.info(f"[MCP PARTICIPANTS] Creating participants with base MCP tool: {base_mcp_tool}")
-        
-        # CRITICAL: Connect to MCP server BEFORE filtering to load all available tools
+        # Leased MCP connection (already connected, catalog cached by the pool); filtered per agent
+        base_mcp_tool = tools
         if base_mcp_tool:
-            await base_mcp_tool.__aenter__()
-            logger.info(f"[MCP PARTICIPANTS] Connected to MCP server, loaded {len(base_mcp_tool.functions)} tools")
+            logger.info(f"[MCP PARTICIPANTS] Creating participants from {len(base_mcp_tool.functions)} pooled MCP tools")
         
         base_definitions: Dict[str, Dict[str, Any]] = {
             "crm_billing": {
@@ -598,7 +604,7 @@ DO NOT OUTPUT ANYTHING OTHER THAN JSON, AND DO NOT DEVIATE FROM THIS SCHEMA:
                     logger.info(f"[MCP PARTICIPANTS] Assigned {len(filtered_tools)} filtered tools to agent '{participant_id}'")
             elif base_mcp_tool is not None and "tools" not in agent_kwargs:
                 # Fallback: if no tool list defined, give all tools
-                agent_kwargs["tools"] = base_mcp_tool
+                agent_kwargs["tools"] = base_mcp_tool.functions
                 logger.warning(f"[MCP PARTICIPANTS] No tool filter for '{participant_id}', using all tools")
 
             merged_kwargs = self._apply_participant_overrides(participant_id, agent_kwargs)
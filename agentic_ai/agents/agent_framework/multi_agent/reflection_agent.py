@@ -1,11 +1,13 @@
 import json
 import logging
-from typing import Any, Dict, List
+from typing import Any, Dict
 
-from agent_framework import AgentThread, ChatAgent, MCPStreamableHTTPTool
+from agent_framework import AgentThread, ChatAgent
 from agent_framework.azure import AzureOpenAIChatClient
 
 from agents.base_agent import BaseAgent
+from agents.openai_clients import get_async_client
+from agents.agent_framework.mcp_pool import MCP_POOL, MCPLease
 
 logger = logging.getLogger(__name__)
 
@@ -17,17 +19,23 @@ class Agent(BaseAgent):
         self._primary_agent: ChatAgent | None = None
         self._reviewer: ChatAgent | None = None
         self._thread: AgentThread | None = None
+        self._mcp_lease: MCPLease | None = None
         self._initialized = False
         self._access_token = access_token
         self._ws_manager = None  # WebSocket manager for streaming
         # Track conversation turn for tool call grouping - load from state store
         self._turn_key = f"{session_id}_current_turn"
-        self._current_turn = state_store.get(self._turn_key, 0)
+        self._current_turn = 0 if self._state_deferred else state_store.get(self._turn_key, 0)
         
         # Log that reflection agent is being used
         print(f"REFLECTION AGENT INITIALIZED - Session: {session_id}")
         logger.info(f"REFLECTION AGENT INITIALIZED - Session: {session_id}")
 
+    async def aload_state(self, *keys: str) -> Dict[str, Any]:
+        values = await super().aload_state(self._turn_key, *keys)
+        self._current_turn = values.get(self._turn_key, 0)
+        return values
+
     def set_websocket_manager(self, manager: Any) -> None:
         """Allow backend to inject WebSocket manager for streaming events."""
         self._ws_manager = manager
@@ -44,16 +52,17 @@ class Agent(BaseAgent):
             )
 
         headers = self._build_headers()
-        mcp_tools = await self._maybe_create_tools(headers)
+        self._mcp_lease = await self._lease_mcp_tools(headers)
 
         chat_client = AzureOpenAIChatClient(
             api_key=self.azure_openai_key,
+            async_client=get_async_client(self.azure_openai_endpoint, self.api_version, self.azure_openai_key),
             deployment_name=self.azure_deployment,
             endpoint=self.azure_openai_endpoint,
             api_version=self.api_version,
         )
 
-        tools = mcp_tools[0] if mcp_tools else None
+        tools = self._mcp_lease.functions if self._mcp_lease else None
 
         # Primary Agent - Customer Support Agent with MCP tools
         self._primary_agent = ChatAgent(
@@ -86,8 +95,7 @@ class Agent(BaseAgent):
             await self._primary_agent.__aenter__()
             await self._reviewer.__aenter__()
         except Exception:
-            self._primary_agent = None
-            self._reviewer = None
+            await self.aclose()
             raise
 
         if self.state:
@@ -97,23 +105,28 @@ class Agent(BaseAgent):
 
         self._initialized = True
 
+    async def aclose(self) -> None:
+        """Exit both ChatAgent contexts and return the MCP session to the pool."""
+        agents = [a for a in (self._reviewer, self._primary_agent) if a is not None]
+        self._primary_agent = self._reviewer = self._thread = None
+        lease, self._mcp_lease = self._mcp_lease, None
+        self._initialized = False
+        for agent in agents:
+            await agent.__aexit__(None, None, None)
+        if lease is not None:
+            await lease.release()
+
     def _build_headers(self) -> Dict[str, str]:
         headers = {"Content-Type": "application/json"}
         if self._access_token:
             headers["Authorization"] = f"Bearer {self._access_token}"
         return headers
 
-    async def _maybe_create_tools(self, headers: Dict[str, str]) -> List[MCPStreamableHTTPTool] | None:
+    async def _lease_mcp_tools(self, headers: Dict[str, str]) -> MCPLease | None:
         if not self.mcp_server_uri:
             logger.warning("MCP_SERVER_URI not configured; agents run without MCP tools.")
             return None
-        return [MCPStreamableHTTPTool(
-            name="mcp-streamable",
-            url=self.mcp_server_uri,
-            headers=headers,
-            timeout=30,
-            request_timeout=30,
-        )]
+        return await MCP_POOL.acquire(self.mcp_server_uri, headers, timeout=30, request_timeout=30)
 
     async def chat_async(self, prompt: str) -> str:
         """Run Primary Agent → Reviewer → Primary Agent refinement pipeline for customer support."""
@@ -124,8 +137,7 @@ class Agent(BaseAgent):
         if not (self._primary_agent and self._reviewer and self._thread):
             raise RuntimeError("Agents not initialized correctly.")
 
-        self._current_turn += 1
-        self.state_store[self._turn_key] = self._current_turn
+        self._current_turn += 1  # persisted with the turn's state
 
         # Use streaming if WebSocket manager is available
         if self._ws_manager:
@@ -411,10 +423,8 @@ class Agent(BaseAgent):
             {"role": "user", "content": prompt},
             {"role": "assistant", "content": assistant_response},
         ]
-        self.append_to_chat_history(messages)
-
         new_state = await self._thread.serialize()
-        self._setstate(new_state)
+        await self.asave_state(new_state, messages, {self._turn_key: self._current_turn})
 
         return assistant_response
 
@@ -486,15 +496,11 @@ class Agent(BaseAgent):
             {"role": "user", "content": prompt},
             {"role": "assistant", "content": assistant_response},
         ]
-        self.append_to_chat_history(messages)
-
         new_state = await self._thread.serialize()
-        self._setstate(new_state)
+        await self.asave_state(new_state, messages, {self._turn_key: self._current_turn})
 
         return assistant_response
-        self.append_to_chat_history(messages)
-
         new_state = await self._thread.serialize()
-        self._setstate(new_state)
+        await self.asave_state(new_state, messages, {self._turn_key: self._current_turn})
 
         return assistant_response
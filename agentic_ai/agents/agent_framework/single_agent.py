@@ -1,11 +1,13 @@
 import json
 import logging
-from typing import Any, Dict, List
+from typing import Any, Dict
 
-from agent_framework import AgentThread, ChatAgent, MCPStreamableHTTPTool
+from agent_framework import AgentThread, ChatAgent
 from agent_framework.azure import AzureOpenAIChatClient
 
 from agents.base_agent import BaseAgent
+from agents.openai_clients import get_async_client
+from agents.agent_framework.mcp_pool import MCP_POOL, MCPLease
 
 logger = logging.getLogger(__name__)
 
@@ -17,12 +19,18 @@ class Agent(BaseAgent):
         super().__init__(state_store, session_id)
         self._agent: ChatAgent | None = None
         self._thread: AgentThread | None = None
+        self._mcp_lease: MCPLease | None = None
         self._initialized = False
         self._access_token = access_token
         self._ws_manager = None  # WebSocket manager for streaming
         # Track conversation turn for tool call grouping - load from state store
         self._turn_key = f"{session_id}_current_turn"
-        self._current_turn = state_store.get(self._turn_key, 0)
+        self._current_turn = 0 if self._state_deferred else state_store.get(self._turn_key, 0)
+
+    async def aload_state(self, *keys: str) -> Dict[str, Any]:
+        values = await super().aload_state(self._turn_key, *keys)
+        self._current_turn = values.get(self._turn_key, 0)
+        return values
 
     def set_websocket_manager(self, manager: Any) -> None:
         """Allow backend to inject WebSocket manager for streaming events."""
@@ -40,10 +48,11 @@ class Agent(BaseAgent):
             )
 
         headers = self._build_headers()
-        mcp_tools = await self._maybe_create_tools(headers)
+        self._mcp_lease = await self._lease_mcp_tools(headers)
 
         chat_client = AzureOpenAIChatClient(
             api_key=self.azure_openai_key,
+            async_client=get_async_client(self.azure_openai_endpoint, self.api_version, self.azure_openai_key),
             deployment_name=self.azure_deployment,
             endpoint=self.azure_openai_endpoint,
             api_version=self.api_version,
@@ -56,7 +65,8 @@ class Agent(BaseAgent):
             "Never hallunicate any operation that you do not actually do."
         )
 
-        tools = mcp_tools[0] if mcp_tools else None
+        # The pooled session's functions, not the tool: ChatAgent closes MCP tools it owns.
+        tools = self._mcp_lease.functions if self._mcp_lease else None
 
         self._agent = ChatAgent(
             name="ai_assistant",
@@ -70,10 +80,9 @@ class Agent(BaseAgent):
             await self._agent.__aenter__()
         except Exception:
             self._agent = None
+            await self.aclose()
             raise
 
-        await self._log_mcp_tool_details()
-
         if self.state:
             self._thread = await self._agent.deserialize_thread(self.state)
         else:
@@ -81,51 +90,28 @@ class Agent(BaseAgent):
 
         self._initialized = True
 
+    async def aclose(self) -> None:
+        """Exit the ChatAgent context and return the MCP session to the pool."""
+        agent, self._agent, self._thread = self._agent, None, None
+        lease, self._mcp_lease = self._mcp_lease, None
+        self._initialized = False
+        if agent is not None:
+            await agent.__aexit__(None, None, None)
+        if lease is not None:
+            await lease.release()
+
     def _build_headers(self) -> Dict[str, str]:
         headers: Dict[str, str] = {"Content-Type": "application/json"}
         if self._access_token:
             headers["Authorization"] = f"Bearer {self._access_token}"
         return headers
 
-    async def _maybe_create_tools(self, headers: Dict[str, str]) -> List[MCPStreamableHTTPTool] | None:
+    async def _lease_mcp_tools(self, headers: Dict[str, str]) -> MCPLease | None:
         if not self.mcp_server_uri:
             logger.warning("MCP_SERVER_URI is not configured; agent will run without MCP tools.")
             return None
 
-        tool = MCPStreamableHTTPTool(
-            name="mcp-streamable",
-            url=self.mcp_server_uri,
-            headers=headers,
-            timeout=30,
-            request_timeout=30,
-        )
-
-        return [tool]
-
-    async def _log_mcp_tool_details(self) -> None:
-        if not self._agent:
-            return
-
-        mcp_tools = getattr(self._agent, "_local_mcp_tools", None)
-        if not mcp_tools:
-            logger.debug("No MCP tools registered on the agent; skipping tool inspection.")
-            return
-
-        mcp_tool = mcp_tools[0]
-        session = getattr(mcp_tool, "session", None)
-        if session is None:
-            logger.debug("MCP tool session is not available; cannot list tools for debugging.")
-            return
-
-        try:
-            tool_list = await session.list_tools()
-        except Exception as exc:
-            logger.exception("Failed to fetch MCP tool metadata: %s", exc)
-            return
-
-        if not tool_list or not getattr(tool_list, "tools", None):
-            logger.debug("No tools returned from MCP server during inspection.")
-            return
+        return await MCP_POOL.acquire(self.mcp_server_uri, headers, timeout=30, request_timeout=30)
 
     async def chat_async(self, prompt: str) -> str:
         await self._setup_single_agent()
@@ -133,9 +119,8 @@ class Agent(BaseAgent):
         if not self._agent or not self._thread:
             raise RuntimeError("Agent Framework single agent failed to initialize correctly.")
 
-        # Increment turn counter for this new conversation turn and persist to state store
+        # Increment turn counter for this new conversation turn; persisted with the turn's state
         self._current_turn += 1
-        self.state_store[self._turn_key] = self._current_turn
 
         # Use streaming if WebSocket manager is available
         if self._ws_manager:
@@ -149,10 +134,8 @@ class Agent(BaseAgent):
             {"role": "user", "content": prompt},
             {"role": "assistant", "content": assistant_response},
         ]
-        self.append_to_chat_history(messages)
-
         new_state = await self._thread.serialize()
-        self._setstate(new_state)
+        await self.asave_state(new_state, messages, {self._turn_key: self._current_turn})
 
         return assistant_response
 
@@ -227,9 +210,7 @@ class Agent(BaseAgent):
             {"role": "user", "content": prompt},
             {"role": "assistant", "content": assistant_response},
         ]
-        self.append_to_chat_history(messages)
-
         new_state = await self._thread.serialize()
-        self._setstate(new_state)
+        await self.asave_state(new_state, messages, {self._turn_key: self._current_turn})
 
         return assistant_response
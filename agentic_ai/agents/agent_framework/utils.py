@@ -10,25 +10,26 @@ from typing import Any, List, Set
 
 from agent_framework import MCPStreamableHTTPTool
 
+from agents.agent_framework.mcp_pool import MCPLease
+
 logger = logging.getLogger(__name__)
 
 
 class FilteredMCPTool:
     """
-    Wrapper around MCPStreamableHTTPTool that filters functions based on allowed tool names.
+    Wrapper around an MCP tool or pooled MCP lease that filters functions based on allowed tool names.
     
     This allows each agent to have access only to their specific tools,
     preventing unauthorized tool access and keeping agents focused on their domain.
     
     Example usage:
         ```python
-        # Connect to MCP server once
-        base_mcp_tool = MCPStreamableHTTPTool(url="http://localhost:8000")
-        await base_mcp_tool.__aenter__()
+        # Lease the shared connection; its tool catalog is cached by the pool
+        lease = await MCP_POOL.acquire("http://localhost:8000/mcp", headers)
         
         # Create filtered wrappers for different agents
         billing_tools = FilteredMCPTool(
-            mcp_tool=base_mcp_tool,
+            mcp_tool=lease,
             allowed_tool_names=["get_customer_detail", "get_billing_summary", ...]
         )
         billing_tools.filter_functions()
@@ -38,12 +39,12 @@ class FilteredMCPTool:
         ```
     """
     
-    def __init__(self, mcp_tool: MCPStreamableHTTPTool, allowed_tool_names: List[str]) -> None:
+    def __init__(self, mcp_tool: MCPStreamableHTTPTool | MCPLease, allowed_tool_names: List[str]) -> None:
         """
         Initialize filtered MCP tool wrapper.
         
         Args:
-            mcp_tool: The underlying MCP tool with all functions loaded
+            mcp_tool: The underlying MCP tool or pooled lease with all functions loaded
             allowed_tool_names: List of tool names this agent is allowed to use
         """
         self._mcp_tool = mcp_tool
@@ -96,7 +97,7 @@ class FilteredMCPTool:
         """
         Enter async context - connects underlying MCP tool and filters functions.
         
-        Note: If the underlying MCP tool is already connected, this won't reconnect it.
+        Note: If the underlying MCP tool is already connected (or is a pooled lease), this won't reconnect it.
         """
         await self._mcp_tool.__aenter__()
         self.filter_functions()
@@ -104,27 +105,27 @@ class FilteredMCPTool:
     
     async def __aexit__(self, exc_type: Any, exc_value: Any, traceback: Any) -> None:
         """
-        Exit async context - closes underlying MCP tool.
+        Exit async context - closes underlying MCP tool, or releases a pooled lease.
         
-        Warning: This will close the underlying MCP connection. If multiple agents
+        Warning: For a plain MCP tool this closes the connection. If multiple agents
         share the same base MCP tool, closing one will affect all others.
         """
         await self._mcp_tool.__aexit__(exc_type, exc_value, traceback)
 
 
 def create_filtered_tool_list(
-    base_mcp_tool: MCPStreamableHTTPTool | None,
+    base_mcp_tool: MCPStreamableHTTPTool | MCPLease | None,
     allowed_tool_names: List[str],
     agent_name: str = "unknown"
 ) -> List[Any] | None:
     """
-    Helper function to create a filtered tool list from a base MCP tool.
+    Helper function to create a filtered tool list from a base MCP tool or pooled lease.
     
     This is a convenience function that encapsulates the filtering pattern
     used across different agent implementations.
     
     Args:
-        base_mcp_tool: The base MCP tool with all functions loaded (or None)
+        base_mcp_tool: The base MCP tool or pooled lease with all functions loaded (or None)
         allowed_tool_names: List of tool names to allow for this agent
         agent_name: Name of the agent (for logging purposes)
         
@@ -133,11 +134,10 @@ def create_filtered_tool_list(
         
     Example:
         ```python
-        base_tool = MCPStreamableHTTPTool(url="http://localhost:8000")
-        await base_tool.__aenter__()
+        lease = await MCP_POOL.acquire("http://localhost:8000/mcp", headers)
         
         billing_tools = create_filtered_tool_list(
-            base_mcp_tool=base_tool,
+            base_mcp_tool=lease,
             allowed_tool_names=["get_customer_detail", "pay_invoice"],
             agent_name="crm_billing"
         )
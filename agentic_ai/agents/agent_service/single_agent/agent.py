@@ -261,6 +261,13 @@ class Agent(BaseAgent):
         if not self.conn_str:
             raise ValueError("PROJECT_CONNECTION_STRING environment variable is not set")
     
+    async def aload_state(self, *keys: str) -> Dict[str, Any]:
+        """Load state and pick up the stored conversation ID (deferred stores)."""
+        values = await super().aload_state(*keys)
+        if self.state is not None:
+            self.conversation_id = self.state
+        return values
+
     async def _setup_azure_agent(self) -> None:
         """Initialize the Azure AI agent and tools if not already done."""
         if self._initialized:
@@ -13,6 +13,7 @@ from autogen_ext.models.openai import AzureOpenAIChatCompletionClient
 from autogen_ext.tools.mcp import StreamableHttpServerParams, mcp_server_tools  
 
 from agents.base_agent import BaseAgent
+from agents.openai_clients import get_http_client
 
 #Define termination conditions
 text_mention_termination = TextMentionTermination("FINAL_ANSWER:")
@@ -96,6 +97,7 @@ class Agent(BaseAgent):
             # 2. -----------------  Shared Model Client -----------------  
             model_client = AzureOpenAIChatCompletionClient(  
                 api_key=self.azure_openai_key,  
+                http_client=get_http_client(),  
                 azure_endpoint=self.azure_openai_endpoint,  
                 api_version=self.api_version,  
                 azure_deployment=self.azure_deployment,  
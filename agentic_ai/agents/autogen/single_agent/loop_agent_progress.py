@@ -19,6 +19,7 @@ from fastmcp.client import Client
 from fastmcp.client.transports import StreamableHttpTransport
 
 from agents.base_agent import BaseAgent
+from agents.openai_clients import get_http_client
 import mcp
 from fastmcp.exceptions import ToolError
 
@@ -170,6 +171,7 @@ class Agent(BaseAgent):
         # Set up the OpenAI/Azure model client
         model_client = AzureOpenAIChatCompletionClient(
             api_key=self.azure_openai_key,
+            http_client=get_http_client(),
             azure_endpoint=self.azure_openai_endpoint,
             api_version=self.api_version,
             azure_deployment=self.azure_deployment,
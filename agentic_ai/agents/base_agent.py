@@ -22,17 +22,68 @@ class BaseAgent:
   
         self.session_id = session_id  
         self.state_store = state_store  
+        self._chat_history_key = f"{session_id}_chat_history"
   
-        self.chat_history: List[Dict[str, str]] = self.state_store.get(f"{session_id}_chat_history", [])  
-        self.state: Optional[Any] = self.state_store.get(session_id, None) 
-        logging.debug(f"Chat history for session {session_id}: {self.chat_history}")  
+        # Stores with async I/O (applications/utils.py AsyncStateStore) are not
+        # read here, where it would block the event loop: the caller awaits
+        # aload_state() before the first turn instead.
+        self._state_deferred = not isinstance(state_store, dict) and hasattr(state_store, "aget_many")
+        self.chat_history: List[Dict[str, str]] = []
+        self.state: Optional[Any] = None
+        if not self._state_deferred:
+            self.chat_history = self.state_store.get(self._chat_history_key, [])
+            self.state = self.state_store.get(session_id, None)
+            logging.debug(f"Chat history for session {session_id}: {self.chat_history}")  
   
     def _setstate(self, state: Any) -> None:  
         self.state_store[self.session_id] = state  
+        self.state = state  # a reused instance resumes from the latest state  
   
     def append_to_chat_history(self, messages: List[Dict[str, str]]) -> None:  
         self.chat_history.extend(messages)  
-        self.state_store[f"{self.session_id}_chat_history"] = self.chat_history  
+        self.state_store[self._chat_history_key] = self.chat_history  
+
+    async def aload_state(self, *keys: str) -> Dict[str, Any]:
+        """
+        Load state, chat history and any extra ``keys`` in one awaited read.
+        Returns the values found; subclasses pass their own keys and pick
+        them out of the result.
+        """
+        values = await self._aget_many([self.session_id, self._chat_history_key, *keys])
+        self.chat_history = values.get(self._chat_history_key, [])
+        self.state = values.get(self.session_id)
+        self._state_deferred = False
+        logging.debug(f"Chat history for session {self.session_id}: {self.chat_history}")
+        return values
+
+    async def asave_state(
+        self,
+        state: Any,
+        messages: Optional[List[Dict[str, str]]] = None,
+        extra: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        """
+        Awaitable ``_setstate`` + ``append_to_chat_history``: state, history
+        and ``extra`` keys are written with one store call.
+        """
+        if messages:
+            self.chat_history.extend(messages)
+        self.state = state
+        await self._aset_many({self.session_id: state, self._chat_history_key: self.chat_history, **(extra or {})})
+
+    async def _aget_many(self, keys: List[str]) -> Dict[str, Any]:
+        """Read several keys, awaiting the store if it has async I/O (plain dicts work too)."""
+        aget_many = getattr(self.state_store, "aget_many", None)
+        if aget_many is not None:
+            return await aget_many(keys)
+        return {key: self.state_store[key] for key in keys if key in self.state_store}
+
+    async def _aset_many(self, items: Dict[str, Any]) -> None:
+        aset_many = getattr(self.state_store, "aset_many", None)
+        if aset_many is not None:
+            await aset_many(items)
+        else:
+            self.state_store.update(items)
   
     def set_websocket_manager(self, manager: Any) -> None:
         """
@@ -45,4 +96,11 @@ class BaseAgent:
         """  
         Override in child class!  
         """  
-        raise NotImplementedError("chat_async should be implemented in subclass.")  
\ No newline at end of file
+        raise NotImplementedError("chat_async should be implemented in subclass.")  
+
+    async def aclose(self) -> None:
+        """
+        Release long-lived resources (MCP sessions, clients).
+        Called when the backend evicts a cached agent; override as needed.
+        """
+        pass
@@ -0,0 +1,221 @@
+"""
+Shared Azure OpenAI clients for every agent framework.
+
+Each agent used to build its own chat client (``AzureOpenAIChatClient``,
+``AzureOpenAIChatCompletionClient`` or ``AzureChatCompletion``), and with it
+its own HTTP connection pool.  So most turns paid for a fresh TCP + TLS
+handshake.  This module keeps, per event loop:
+
+* one keep-alive ``httpx.AsyncClient`` (HTTP/2 when ``h2`` is installed)
+  whose pool limits come from ``AOAI_MAX_CONNECTIONS``,
+  ``AOAI_MAX_KEEPALIVE_CONNECTIONS`` and ``AOAI_KEEPALIVE_EXPIRY_SECONDS``;
+* one ``AsyncAzureOpenAI`` per (endpoint, API version, credential) on top
+  of it.  The deployment is chosen per request, so every deployment on an
+  endpoint shares the connections.
+
+``AOAI_DEPLOYMENT_CONCURRENCY`` caps in-flight requests per deployment,
+for example ``16`` for every deployment or ``gpt-4.1=8,gpt-4o-mini=32,*=16``
+per deployment.  Excess requests wait for a slot rather than hitting 429s.
+Streaming responses hold their slot until the stream is closed.
+
+Use :func:`get_async_client` where a framework accepts a prebuilt client
+(Agent Framework ``async_client=``, Semantic Kernel ``async_client=``) and
+:func:`get_http_client` where it accepts an HTTP client (AutoGen
+``http_client=``).  Defaults come from the same ``AZURE_OPENAI_*``
+variables as :class:`agents.base_agent.BaseAgent`.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import httpx
+from openai import AsyncAzureOpenAI
+
+logger = logging.getLogger(__name__)
+
+AOAI_MAX_CONNECTIONS = int(os.getenv("AOAI_MAX_CONNECTIONS", "100"))
+AOAI_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("AOAI_MAX_KEEPALIVE_CONNECTIONS", "20"))
+AOAI_KEEPALIVE_EXPIRY_SECONDS = float(os.getenv("AOAI_KEEPALIVE_EXPIRY_SECONDS", "120"))
+AOAI_TIMEOUT_SECONDS = float(os.getenv("AOAI_TIMEOUT_SECONDS", "120"))
+AOAI_HTTP2 = os.getenv("AOAI_HTTP2", "true").lower() in ("1", "true", "yes")
+AOAI_DEPLOYMENT_CONCURRENCY = os.getenv("AOAI_DEPLOYMENT_CONCURRENCY", "")
+
+_DEPLOYMENT_PATH = re.compile(r"/openai/deployments/([^/]+)/")
+
+
+def _parse_concurrency(spec: str) -> Tuple[Dict[str, int], int]:
+    """``"8"`` / ``"gpt-4.1=8,*=16"`` -> (per-deployment caps, default cap; 0 = none)."""
+    limits: Dict[str, int] = {}
+    default = 0
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        name, _, value = part.rpartition("=")
+        if not name or name == "*":
+            default = int(value)
+        else:
+            limits[name] = int(value)
+    return limits, default
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class _ReleasingStream(httpx.AsyncByteStream):
+    """Response body that gives its deployment slot back when closed."""
+
+    def __init__(self, stream: httpx.AsyncByteStream, semaphore: asyncio.Semaphore) -> None:
+        self._stream = stream
+        self._semaphore: Optional[asyncio.Semaphore] = semaphore
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            semaphore, self._semaphore = self._semaphore, None
+            if semaphore is not None:
+                semaphore.release()
+
+
+class DeploymentLimitTransport(httpx.AsyncBaseTransport):
+    """Caps concurrent requests per Azure OpenAI deployment (taken from the URL)."""
+
+    def __init__(self, inner: httpx.AsyncBaseTransport, limits: Dict[str, int], default: int) -> None:
+        self._inner = inner
+        self._limits = limits
+        self._default = default
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    def _semaphore(self, path: str) -> Optional[asyncio.Semaphore]:
+        match = _DEPLOYMENT_PATH.search(path)
+        if not match:
+            return None
+        deployment = match.group(1)
+        semaphore = self._semaphores.get(deployment)
+        if semaphore is None:
+            limit = self._limits.get(deployment, self._default)
+            if limit <= 0:
+                return None
+            semaphore = self._semaphores[deployment] = asyncio.Semaphore(limit)
+        return semaphore
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        semaphore = self._semaphore(request.url.path)
+        if semaphore is None:
+            return await self._inner.handle_async_request(request)
+        await semaphore.acquire()
+        try:
+            response = await self._inner.handle_async_request(request)
+        except BaseException:
+            semaphore.release()
+            raise
+        response.stream = _ReleasingStream(response.stream, semaphore)
+        return response
+
+    async def aclose(self) -> None:
+        await self._inner.aclose()
+
+
+def _build_http_client() -> httpx.AsyncClient:
+    http2 = AOAI_HTTP2 and _http2_available()
+    if AOAI_HTTP2 and not http2:
+        logger.info("h2 is not installed; Azure OpenAI clients use HTTP/1.1 keep-alive")
+    transport: httpx.AsyncBaseTransport = httpx.AsyncHTTPTransport(
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=AOAI_MAX_CONNECTIONS,
+            max_keepalive_connections=AOAI_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=AOAI_KEEPALIVE_EXPIRY_SECONDS,
+        ),
+        retries=1,  # reconnect once if a pooled connection was closed by the server
+    )
+    limits, default = _parse_concurrency(AOAI_DEPLOYMENT_CONCURRENCY)
+    if limits or default:
+        transport = DeploymentLimitTransport(transport, limits, default)
+    return httpx.AsyncClient(transport=transport, timeout=httpx.Timeout(AOAI_TIMEOUT_SECONDS, connect=10.0))
+
+
+class _LoopClients:
+    def __init__(self) -> None:
+        self.http = _build_http_client()
+        self.openai: Dict[Tuple[str, str, Any], AsyncAzureOpenAI] = {}
+
+
+_lock = threading.Lock()
+_by_loop: Dict[Optional[asyncio.AbstractEventLoop], _LoopClients] = {}
+
+
+def _clients() -> _LoopClients:
+    # httpx connections belong to the event loop that opened them, so each
+    # loop (normally just the backend's one) gets its own pool.
+    try:
+        loop: Optional[asyncio.AbstractEventLoop] = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+    with _lock:
+        for stale in [l for l in _by_loop if l is not None and l.is_closed()]:
+            del _by_loop[stale]
+        clients = _by_loop.get(loop)
+        if clients is None:
+            clients = _by_loop[loop] = _LoopClients()
+        return clients
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """The shared keep-alive HTTP client (AutoGen: ``http_client=``)."""
+    return _clients().http
+
+
+def get_async_client(
+    endpoint: Optional[str] = None,
+    api_version: Optional[str] = None,
+    api_key: Optional[str] = None,
+    azure_ad_token_provider: Optional[Callable[[], Any]] = None,
+    credential_key: Optional[str] = None,
+) -> AsyncAzureOpenAI:
+    """The shared ``AsyncAzureOpenAI`` for an endpoint / API version / credential.
+
+    With ``azure_ad_token_provider``, pass a stable ``credential_key`` (e.g.
+    the identity's client id) when providers are built per agent: callers
+    with the same key share the client created with the first provider.
+    Without one the provider itself is the key, so only callers reusing the
+    same provider object share a client.
+    """
+    endpoint = endpoint or os.getenv("AZURE_OPENAI_ENDPOINT") or ""
+    api_version = api_version or os.getenv("AZURE_OPENAI_API_VERSION") or ""
+    credential: Any
+    if azure_ad_token_provider is None:
+        api_key = api_key or os.getenv("AZURE_OPENAI_API_KEY")
+        credential = hashlib.sha256((api_key or "").encode()).hexdigest()
+    elif credential_key is not None:
+        credential = f"token-provider:{credential_key}"
+    else:
+        # Holding the provider keeps its id from being reused by another one.
+        credential = ("token-provider", azure_ad_token_provider)
+    clients = _clients()
+    key = (endpoint.rstrip("/"), api_version, credential)
+    with _lock:
+        client = clients.openai.get(key)
+        if client is None:
+            client = clients.openai[key] = AsyncAzureOpenAI(
+                azure_endpoint=endpoint,
+                api_version=api_version,
+                api_key=api_key if azure_ad_token_provider is None else None,
+                azure_ad_token_provider=azure_ad_token_provider,
+                http_client=clients.http,
+            )
+        return client
@@ -24,6 +24,7 @@ from semantic_kernel.connectors.mcp import MCPSsePlugin
 from semantic_kernel.functions import kernel_function  
   
 from agents.base_agent import BaseAgent  
+from agents.openai_clients import get_async_client
   
 # ─────────────────────────  Logging  ──────────────────────────  
 logging.basicConfig(  
@@ -144,7 +145,7 @@ class Agent(BaseAgent):
   
         # --- Customer-Service LLM agent ------------------------------  
         self.customer_service_agent = ChatCompletionAgent(  
-            service=AzureChatCompletion(),  
+            service=AzureChatCompletion(async_client=get_async_client()),  
             name="customer_service_agent",  
             instructions=( "You are a helpful assistant. You can use multiple tools to find information and answer questions. "  
             "When customer ask for a product return, first check if the product is eligible for return, that is if the order has been delivered and check with customer if the condition of the product is acceptable and the return is within 30 days of delivery. "  
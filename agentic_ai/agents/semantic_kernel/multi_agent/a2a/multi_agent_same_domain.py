@@ -1,5 +1,6 @@
 import logging
 from agents.base_agent import BaseAgent
+from agents.openai_clients import get_async_client
 from semantic_kernel.agents import ChatCompletionAgent, ChatHistoryAgentThread
 from semantic_kernel.connectors.ai.open_ai import AzureChatCompletion
 from semantic_kernel.connectors.mcp import MCPSsePlugin
@@ -44,7 +45,7 @@ class Agent(BaseAgent):
         # Open the SSE connection so tools/prompts are loaded
         await contoso_plugin.connect()
         logistic_agent = ChatCompletionAgent(
-            service=AzureChatCompletion(),
+            service=AzureChatCompletion(async_client=get_async_client()),
             name="logistic_agent",
             instructions="Schedule pick-up for a product return. First, when you receive a request to schedule pick up from an address, check your availability options and return the available slots. "
             "If the customer accepts a slot, schedule the pick-up and return the confirmation. ",
@@ -53,7 +54,7 @@ class Agent(BaseAgent):
 
         # Define compete agents and use them to create the main agent.
         self.customer_service_agent = ChatCompletionAgent(
-            service=AzureChatCompletion(),
+            service=AzureChatCompletion(async_client=get_async_client()),
             name="customer_service_agent",
             instructions="You are a helpful assistant. You can use multiple tools to find information and answer questions. "  
             "When customer ask for a product return, first check if the product is eligible for return, that is if the order has been delivered and check with customer if the condition of the product is acceptable and the return is within 30 days of delivery. "  
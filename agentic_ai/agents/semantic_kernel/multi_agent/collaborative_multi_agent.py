@@ -3,6 +3,7 @@ import logging
 from typing import List, Optional
 
 from agents.base_agent import BaseAgent
+from agents.openai_clients import get_async_client
 from semantic_kernel.agents import AgentGroupChat, ChatCompletionAgent
 from semantic_kernel.agents.strategies import (
     KernelFunctionSelectionStrategy,
@@ -62,6 +63,7 @@ class Agent(BaseAgent):
         system_kernel.add_service(
             service=AzureChatCompletion(
                 api_key=self.azure_openai_key,
+                async_client=get_async_client(self.azure_openai_endpoint, self.api_version, self.azure_openai_key),
                 endpoint=self.azure_openai_endpoint,
                 api_version=self.api_version,
                 deployment_name=self.azure_deployment,
@@ -83,6 +85,7 @@ class Agent(BaseAgent):
         specialist_kernel.add_service(
             service=AzureChatCompletion(
                 api_key=self.azure_openai_key,
+                async_client=get_async_client(self.azure_openai_endpoint, self.api_version, self.azure_openai_key),
                 endpoint=self.azure_openai_endpoint,
                 api_version=self.api_version,
                 deployment_name=self.azure_deployment,
@@ -1,6 +1,7 @@
 import logging
 
 from agents.base_agent import BaseAgent
+from agents.openai_clients import get_async_client
 from semantic_kernel.agents import ChatCompletionAgent, ChatHistoryAgentThread
 from semantic_kernel.connectors.ai.open_ai import AzureChatCompletion
 from semantic_kernel.connectors.mcp import MCPStreamableHttpPlugin
@@ -35,6 +36,7 @@ class Agent(BaseAgent):
 
         service = AzureChatCompletion(
             api_key=self.azure_openai_key,
+            async_client=get_async_client(self.azure_openai_endpoint, self.api_version, self.azure_openai_key),
             endpoint=self.azure_openai_endpoint,
             api_version=self.api_version,
             deployment_name=self.azure_deployment,
@@ -14,6 +14,7 @@ from semantic_kernel.connectors.mcp import MCPStreamableHttpPlugin
 from semantic_kernel.contents import ChatMessageContent
 import logging
 from agents.base_agent import BaseAgent  # adjust path
+from agents.openai_clients import get_async_client
 
 # Configure logging
 logging.basicConfig(
@@ -49,7 +50,7 @@ class Agent(BaseAgent):
 
 
         crm_billing = ChatCompletionAgent(
-            service=AzureChatCompletion(deployment_name=self.azure_deployment),
+            service=AzureChatCompletion(deployment_name=self.azure_deployment, async_client=get_async_client()),
             name="crm_billing",
             description="Query  CRM / billing systems for account, subscription, "
             "invoice, and payment information",
@@ -67,7 +68,7 @@ class Agent(BaseAgent):
         )
 
         product_promotions = ChatCompletionAgent(
-            service=AzureChatCompletion(deployment_name=self.azure_deployment),
+            service=AzureChatCompletion(deployment_name=self.azure_deployment, async_client=get_async_client()),
             name="product_promotions",
             description="Retrieve promotional offers, product availability, eligibility ",
             instructions="You are the Product & Promotions Agent.\n"
@@ -82,7 +83,7 @@ class Agent(BaseAgent):
         )
 
         security_authentication = ChatCompletionAgent(
-            service=AzureChatCompletion(deployment_name=self.azure_deployment),
+            service=AzureChatCompletion(deployment_name=self.azure_deployment, async_client=get_async_client()),
             name="security_authentication",
             description="Investigate authentication logs, account lockouts, and security incidents",
             instructions="You are the Security & Authentication Agent.\n"
@@ -105,7 +106,7 @@ class Agent(BaseAgent):
 
             self._orchestration = MagenticOrchestration(
                 members=self._agents,
-                manager=StandardMagenticManager(max_round_count=5, chat_completion_service=AzureChatCompletion(deployment_name=self.azure_deployment)),
+                manager=StandardMagenticManager(max_round_count=5, chat_completion_service=AzureChatCompletion(deployment_name=self.azure_deployment, async_client=get_async_client())),
                 agent_response_callback=agent_response_callback,
             )
 
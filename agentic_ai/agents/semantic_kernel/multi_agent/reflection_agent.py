@@ -13,6 +13,7 @@ from semantic_kernel.connectors.ai.open_ai import AzureChatCompletion
 from semantic_kernel.connectors.mcp import MCPStreamableHttpPlugin
 from semantic_kernel.contents import ChatMessageContent
 from agents.base_agent import BaseAgent
+from agents.openai_clients import get_async_client
 
 # Configure logging
 logging.basicConfig(
@@ -56,7 +57,7 @@ class Agent(BaseAgent):
         await self._mcp_plugin.connect()
 
         primary_agent = ChatCompletionAgent(
-            service=AzureChatCompletion(deployment_name=self.azure_deployment),
+            service=AzureChatCompletion(deployment_name=self.azure_deployment, async_client=get_async_client()),
             name="PrimaryAgent",
             description="You are a helpful assistant answering customer questions for internet provider Contosso.",
             instructions=(
@@ -71,7 +72,7 @@ class Agent(BaseAgent):
         )
 
         secondary_agent = ChatCompletionAgent(
-            service=AzureChatCompletion(deployment_name=self.azure_deployment),
+            service=AzureChatCompletion(deployment_name=self.azure_deployment, async_client=get_async_client()),
             name="SecondaryAgent",
             description="You are a supervisor assistant who the primary agent reports to before answering user",
             instructions=(
@@ -0,0 +1,165 @@
+"""
+Session-scoped agent cache for the FastAPI backend.
+
+Building an agent is expensive: for ``agents.agent_framework.single_agent``
+it means a new chat client and ``ChatAgent``, an MCP session with its
+``list_tools`` handshake, and deserialising the conversation thread.
+``AgentCache`` keeps one live agent per session, so later turns reuse it.
+
+* LRU capacity (``AGENT_CACHE_SIZE``, default 256; ``0`` disables caching)
+* idle TTL (``AGENT_CACHE_TTL_SECONDS``, default 1800)
+* a new access token for a session replaces its agent, so MCP calls never
+  run with a stale or another caller's bearer token
+* turns of one session are serialised on a per-session lock
+* a new agent's state is loaded with ``await agent.aload_state()`` (one
+  awaited store read) before its first turn
+* evicted agents are closed with ``aclose()`` once their current turn is
+  done, which closes their MCP sessions
+
+The cache is per process.  With several backend processes, route each
+session to one process or set ``AGENT_CACHE_SIZE=0``.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Callable, Dict, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+AGENT_CACHE_SIZE = int(os.getenv("AGENT_CACHE_SIZE", "256"))
+AGENT_CACHE_TTL_SECONDS = float(os.getenv("AGENT_CACHE_TTL_SECONDS", "1800"))
+
+
+def _token_key(token: Optional[str]) -> str:
+    # Compare tokens by digest so entries never need to be matched on the raw secret.
+    return hashlib.sha256((token or "").encode()).hexdigest()
+
+
+@dataclass
+class _Entry:
+    agent: Any
+    token_key: str
+    last_used: float = field(default_factory=time.monotonic)
+    loaded: bool = False
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+
+
+class AgentCache:
+    """Bounded ``session_id -> agent`` cache with idle TTL and LRU eviction."""
+
+    def __init__(
+        self,
+        factory: Callable[[str, Optional[str]], Any],
+        max_size: int = AGENT_CACHE_SIZE,
+        ttl_seconds: float = AGENT_CACHE_TTL_SECONDS,
+    ) -> None:
+        self.factory = factory
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._closing: Set[asyncio.Task] = set()
+        self.stats: Dict[str, int] = {"hits": 0, "misses": 0, "token_changes": 0, "evictions": 0}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @asynccontextmanager
+    async def session(self, session_id: str, access_token: Optional[str] = None) -> AsyncIterator[Any]:
+        """Yield the session's agent, holding its lock for the duration of the turn."""
+        if self.max_size <= 0:
+            agent = self.factory(session_id, access_token)
+            try:
+                await _load(agent)
+                yield agent
+            finally:
+                await _close(agent)
+            return
+
+        self._expire()
+        token_key = _token_key(access_token)
+        while True:
+            entry = self._entries.get(session_id)
+            if entry is not None and entry.token_key != token_key:
+                self.stats["token_changes"] += 1
+                self._evict(session_id)
+                entry = None
+            if entry is None:
+                self.stats["misses"] += 1
+                entry = _Entry(self.factory(session_id, access_token), token_key)
+                self._entries[session_id] = entry
+                self._trim()
+            else:
+                self.stats["hits"] += 1
+                self._entries.move_to_end(session_id)
+            await entry.lock.acquire()
+            # Replaced (new token, reset) while we waited for the previous turn: start over.
+            if self._entries.get(session_id) is entry:
+                break
+            entry.lock.release()
+        try:
+            if not entry.loaded:
+                await _load(entry.agent)
+                entry.loaded = True
+            yield entry.agent
+        finally:
+            entry.last_used = time.monotonic()
+            entry.lock.release()
+
+    def invalidate(self, session_id: str) -> None:
+        """Drop the session's agent (e.g. after its state was reset)."""
+        if session_id in self._entries:
+            self._evict(session_id)
+
+    async def aclose(self) -> None:
+        """Close every cached agent; used on application shutdown."""
+        for session_id in list(self._entries):
+            self._evict(session_id)
+        if self._closing:
+            await asyncio.gather(*self._closing, return_exceptions=True)
+
+    # ------------------------------------------------------------------
+    def _expire(self) -> None:
+        deadline = time.monotonic() - self.ttl_seconds
+        for session_id, entry in list(self._entries.items()):
+            if entry.last_used < deadline and not entry.lock.locked():
+                self._evict(session_id)
+
+    def _trim(self) -> None:
+        while len(self._entries) > self.max_size:
+            self._evict(next(iter(self._entries)))
+
+    def _evict(self, session_id: str) -> None:
+        entry = self._entries.pop(session_id)
+        self.stats["evictions"] += 1
+        task = asyncio.get_running_loop().create_task(self._close_entry(session_id, entry))
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    async def _close_entry(self, session_id: str, entry: _Entry) -> None:
+        async with entry.lock:  # let a running turn finish first
+            await _close(entry.agent)
+        logger.debug("Closed cached agent for session %s", session_id)
+
+
+async def _load(agent: Any) -> None:
+    aload_state = getattr(agent, "aload_state", None)
+    if aload_state is not None:
+        await aload_state()
+
+
+async def _close(agent: Any) -> None:
+    aclose = getattr(agent, "aclose", None)
+    if aclose is None:
+        return
+    try:
+        await aclose()
+    except Exception:
+        logger.exception("Failed to close agent for session %s", getattr(agent, "session_id", "?"))
@@ -7,6 +7,7 @@ Only two lines changed compared with your original file:
 Everything else is untouched.  
 """  
   
+import logging
 import os  
 import sys  
 from pathlib import Path  
@@ -72,14 +73,51 @@ Agent = getattr(agent_module, "Agent")
 # Get the correct state-store implementation  
 # ------------------------------------------------------------------  
 from utils import get_state_store  
+from state_cache import CachedStateStore
   
-STATE_STORE = get_state_store()  # either dict or CosmosDBStateStore  
+# InMemoryStateStore or CosmosDBStateStore behind a write-behind cache;
+# each turn's writes reach the store in one flush_state() at the end of the turn,
+# and STATE_STORE.turn() keeps what the turn read watched until then
+STATE_STORE = CachedStateStore(get_state_store())
+
+
+async def flush_state() -> None:
+    try:
+        await STATE_STORE.flush()
+    except Exception:
+        logging.exception("State store flush failed; dirty keys are retried on the next flush")
+
+# ------------------------------------------------------------------
+# One live agent per session (MCP session, thread) reused across turns
+# ------------------------------------------------------------------
+from agent_cache import AgentCache
+
+
+def build_agent(session_id: str, token: Optional[str]):
+    # Propagate the bearer token down to the agent so it can call the MCP (via APIM)
+    try:
+        return Agent(STATE_STORE, session_id, access_token=token)
+    except TypeError:
+        return Agent(STATE_STORE, session_id)
+
+
+AGENTS = AgentCache(build_agent)
   
 # ------------------------------------------------------------------  
 # FastAPI app  
 # ------------------------------------------------------------------  
 app = FastAPI()
 
+
+@app.on_event("shutdown")
+async def close_agents() -> None:
+    await AGENTS.aclose()
+    # Agents only release their leases; the pooled MCP sessions are closed here.
+    mcp_pool = sys.modules.get("agents.agent_framework.mcp_pool")
+    if mcp_pool is not None:
+        await mcp_pool.MCP_POOL.close()
+    await STATE_STORE.aclose()
+
 # Add CORS middleware to handle preflight OPTIONS requests from React frontend
 app.add_middleware(
     CORSMiddleware,
@@ -141,26 +179,26 @@ class SessionResetRequest(BaseModel):
   
 @app.post("/chat", response_model=ChatResponse)  
 async def chat(req: ChatRequest, token: str = Depends(verify_token)):  
-    # Propagate the bearer token down to the agent so it can call the MCP (via APIM)
     try:
-        agent = Agent(STATE_STORE, req.session_id, access_token=token)
-    except TypeError:
-        agent = Agent(STATE_STORE, req.session_id)
-    answer = await agent.chat_async(req.prompt)  
+        with STATE_STORE.turn():
+            async with AGENTS.session(req.session_id, token) as agent:
+                agent.set_websocket_manager(None)  # a cached agent may have streamed for /ws/chat
+                answer = await agent.chat_async(req.prompt)  
+    finally:
+        await flush_state()
     return ChatResponse(response=answer)  
   
 @app.post("/reset_session")  
 async def reset_session(req: SessionResetRequest, token: str = Depends(verify_token)):  
-    if req.session_id in STATE_STORE:  
-        del STATE_STORE[req.session_id]  
-    hist_key = f"{req.session_id}_chat_history"  
-    if hist_key in STATE_STORE:  
-        del STATE_STORE[hist_key]
+    AGENTS.invalidate(req.session_id)
+    await STATE_STORE.adelete(req.session_id)
+    await STATE_STORE.adelete(f"{req.session_id}_chat_history")
+    await flush_state()
     return {"status": "success", "message": "Session reset successfully"}
 
 @app.get("/history/{session_id}", response_model=ConversationHistoryResponse)  
 async def get_conversation_history(session_id: str, token: str = Depends(verify_token)):  
-    history = STATE_STORE.get(f"{session_id}_chat_history", [])  
+    history = await STATE_STORE.aget(f"{session_id}_chat_history", [])  
     return ConversationHistoryResponse(session_id=session_id, history=history)  
 # ──────────────────────────────────────────────────────────────
 # NEW: WebSocket streaming endpoint
@@ -190,46 +228,45 @@ async def ws_chat(ws: WebSocket):
             if not prompt:
                 continue
 
-            # Create agent for this session
-            try:
-                agent = Agent(STATE_STORE, session_id, access_token=token)
-            except TypeError:
-                agent = Agent(STATE_STORE, session_id)
-
-            # Inject WebSocket manager for Magentic streaming
-            if hasattr(agent, "set_websocket_manager"):
-                agent.set_websocket_manager(MANAGER)
-
-            # Set progress sink if supported (for some agent types)
-            if hasattr(agent, "set_progress_sink"):
-                async def progress_sink(ev: dict):
-                    # Broadcast progress events
-                    await MANAGER.broadcast(session_id, ev)
-                agent.set_progress_sink(progress_sink)
-
-            # Stream events from agent
-            try:
-                # Check if agent supports streaming (Autogen or Agent Framework)
-                if hasattr(agent, "chat_stream"):
-                    # Autogen streaming
-                    async for event in agent.chat_stream(prompt):
-                        evt = await serialize_autogen_event(event)
-                        if evt and evt.get("type") in ("token", "message", "final"):
-                            await MANAGER.broadcast(session_id, evt)
-                elif hasattr(agent, "chat_async"):
-                    # Agent Framework - may or may not use streaming callback
-                    result = await agent.chat_async(prompt)
-                    # If agent has _ws_manager attribute, it supports streaming and events sent via callback
-                    # Otherwise, broadcast final result here
-                    if not hasattr(agent, "_ws_manager"):
-                        await MANAGER.broadcast(session_id, {"type": "final_result", "content": result})
-                    # Else: events including final result are sent via streaming callback
-                else:
-                    await MANAGER.broadcast(session_id, {"type": "error", "message": "Agent does not support streaming"})
-
-                await MANAGER.broadcast(session_id, {"type": "done"})
-            except Exception as e:
-                await MANAGER.broadcast(session_id, {"type": "error", "message": str(e)})
+            # Reuse (or create) this session's agent; holds the session lock for the turn
+            with STATE_STORE.turn():
+                async with AGENTS.session(session_id, token) as agent:
+                    # Inject WebSocket manager for Magentic streaming
+                    if hasattr(agent, "set_websocket_manager"):
+                        agent.set_websocket_manager(MANAGER)
+
+                    # Set progress sink if supported (for some agent types)
+                    if hasattr(agent, "set_progress_sink"):
+                        async def progress_sink(ev: dict):
+                            # Broadcast progress events
+                            await MANAGER.broadcast(session_id, ev)
+                        agent.set_progress_sink(progress_sink)
+
+                    # Stream events from agent
+                    try:
+                        # Check if agent supports streaming (Autogen or Agent Framework)
+                        if hasattr(agent, "chat_stream"):
+                            # Autogen streaming
+                            async for event in agent.chat_stream(prompt):
+                                evt = await serialize_autogen_event(event)
+                                if evt and evt.get("type") in ("token", "message", "final"):
+                                    await MANAGER.broadcast(session_id, evt)
+                        elif hasattr(agent, "chat_async"):
+                            # Agent Framework - may or may not use streaming callback
+                            result = await agent.chat_async(prompt)
+                            # If agent has _ws_manager attribute, it supports streaming and events sent via callback
+                            # Otherwise, broadcast final result here
+                            if not hasattr(agent, "_ws_manager"):
+                                await MANAGER.broadcast(session_id, {"type": "final_result", "content": result})
+                            # Else: events including final result are sent via streaming callback
+                        else:
+                            await MANAGER.broadcast(session_id, {"type": "error", "message": "Agent does not support streaming"})
+
+                        await MANAGER.broadcast(session_id, {"type": "done"})
+                    except Exception as e:
+                        await MANAGER.broadcast(session_id, {"type": "error", "message": str(e)})
+                    finally:
+                        await flush_state()
     except WebSocketDisconnect:
         pass
     finally:
@@ -0,0 +1,335 @@
+"""
+Write-behind cache in front of the state store.
+
+Agents write the store several times per turn: chat history, thread state,
+turn counters, per-domain threads and Magentic checkpoints.  With Cosmos DB
+each write used to be its own upsert.  ``CachedStateStore`` wraps whatever
+``utils.get_state_store()`` returns and keeps the same dict-style and
+``AsyncStateStore`` API:
+
+* reads go through an in-process LRU (``STATE_CACHE_SIZE`` entries, default
+  4096; ``0`` keeps nothing once flushed), including "not found" results;
+  ``aget_many`` fetches every miss with one store call
+* writes and deletes only mark the key dirty; ``await flush()`` writes all
+  dirty keys with one ``aset_many`` (plus concurrent deletes) and is the
+  barrier the backend awaits at the end of every turn
+* values mutated in place (``history.extend(...)``, ``setdefault(...)``
+  dicts) are detected at flush time by comparing a fingerprint taken when the
+  key was loaded or last written
+* ``with cache.turn():`` scopes one agent turn: keys it reads or writes are checked
+  for in-place changes at every flush (including other sessions') and are
+  not evicted until the turn has ended and one more flush has looked at
+  them.  Reads outside a turn are watched until the next flush only.
+* keys matching ``STATE_CACHE_WRITE_THROUGH`` (comma-separated ``fnmatch``
+  patterns, e.g. ``*_chat_history``; ``*`` for everything) are written
+  immediately instead, for state that must survive a crash mid-turn
+
+A failed flush keeps its keys dirty for the next one.  The cache is per
+process: with several backend processes, route each session to one process.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import collections.abc as abc
+import fnmatch
+import hashlib
+import json
+import logging
+import os
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+STATE_CACHE_SIZE = int(os.getenv("STATE_CACHE_SIZE", "4096"))
+STATE_CACHE_WRITE_THROUGH = [
+    pattern.strip() for pattern in os.getenv("STATE_CACHE_WRITE_THROUGH", "").split(",") if pattern.strip()
+]
+
+_ABSENT = object()   # cached "key does not exist"
+_DELETED = object()  # pending delete in the dirty set
+
+# (cache, keys read so far) of the turn running in the current context
+_current_turn: ContextVar[Optional[Tuple["CachedStateStore", Set[str]]]] = ContextVar(
+    "state_cache_turn", default=None
+)
+
+
+def _fingerprint(value: Any) -> Optional[bytes]:
+    try:
+        return hashlib.sha1(json.dumps(value, default=repr).encode()).digest()
+    except (TypeError, ValueError):
+        return None
+
+
+def _fingerprints(items: Mapping[str, Any]) -> Dict[str, Optional[bytes]]:
+    return {key: _fingerprint(value) for key, value in items.items() if value is not _DELETED}
+
+
+class CachedStateStore(abc.MutableMapping):
+    """Read-through LRU + write-behind wrapper around a state store."""
+
+    def __init__(
+        self,
+        store: Any,
+        max_entries: int = STATE_CACHE_SIZE,
+        write_through: Iterable[str] = tuple(STATE_CACHE_WRITE_THROUGH),
+    ) -> None:
+        self.store = store
+        self.max_entries = max(0, max_entries)
+        self.write_through: List[str] = list(write_through)
+        self._entries: "OrderedDict[str, Any]" = OrderedDict()
+        self._fingerprints: Dict[str, Optional[bytes]] = {}
+        self._touched: Set[str] = set()
+        self._held: "Counter[str]" = Counter()  # keys read by turns still running
+        self._dirty: Dict[str, Any] = {}
+        self._pending: Set[asyncio.Task] = set()
+        self._write_lock: Optional[asyncio.Lock] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self.stats: Dict[str, int] = {"hits": 0, "misses": 0, "writes": 0, "flushes": 0}
+
+    # ------------------------- dict-style API (agents) -------------------------
+    def __getitem__(self, key: str) -> Any:
+        self._touch([key])  # checked for in-place changes at the next flush
+        if key in self._entries:
+            self.stats["hits"] += 1
+            self._entries.move_to_end(key)
+            value = self._entries[key]
+        else:
+            value = self._load(key)
+        if value is _ABSENT:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        self._put(key, value)
+        self._touch([key])  # the caller keeps the value and may change it in place
+        if self._is_write_through(key):
+            self._write_soon(key, value)
+        else:
+            self._dirty[key] = value
+
+    def __delitem__(self, key: str) -> None:
+        if self.get(key, _ABSENT) is _ABSENT:
+            raise KeyError(key)
+        self._put(key, _ABSENT)
+        if self._is_write_through(key):
+            self._write_soon(key, _DELETED)
+        else:
+            self._dirty[key] = _DELETED
+
+    def __iter__(self) -> Iterator[str]:
+        keys = dict.fromkeys(k for k, v in self._entries.items() if v is not _ABSENT)
+        keys.update(dict.fromkeys(k for k in self.store if k not in self._entries))
+        return iter(keys)
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    # ------------------------- AsyncStateStore API -------------------------
+    async def aget(self, key: str, default: Any = None) -> Any:
+        return (await self.aget_many([key])).get(key, default)
+
+    async def aget_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        keys = list(dict.fromkeys(keys))
+        missing = [key for key in keys if key not in self._entries]
+        if missing:
+            self.stats["misses"] += len(missing)
+            found = await _aget_many(self.store, missing)
+            for key in missing:
+                if key not in self._entries:  # not written while we were reading
+                    self._put(key, found.get(key, _ABSENT), clean=True)
+        self.stats["hits"] += len(keys) - len(missing)
+        self._touch(keys)
+        values = {key: self._entries.get(key, _ABSENT) for key in keys}
+        self._trim()
+        return {key: value for key, value in values.items() if value is not _ABSENT}
+
+    async def aset(self, key: str, value: Any) -> None:
+        await self.aset_many({key: value})
+
+    async def aset_many(self, items: Mapping[str, Any]) -> None:
+        now: Dict[str, Any] = {}
+        self._touch(list(items))
+        for key, value in items.items():
+            self._put(key, value)
+            if self._is_write_through(key):
+                now[key] = value
+            else:
+                self._dirty[key] = value
+        if now:
+            await self._write(now, _fingerprints(now))
+
+    async def adelete(self, key: str) -> None:
+        self._put(key, _ABSENT)
+        if self._is_write_through(key):
+            await self._write({key: _DELETED}, {})
+        else:
+            self._dirty[key] = _DELETED
+
+    async def flush(self) -> None:
+        """Write every dirty key (one ``aset_many``); returns once all writes landed."""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            if self._pending:
+                await asyncio.gather(*list(self._pending), return_exceptions=True)
+            self._collect_mutations()
+            if self._dirty:
+                batch, self._dirty = self._dirty, {}
+                try:
+                    await self._write(batch, _fingerprints(batch))
+                except BaseException:
+                    for key, value in batch.items():
+                        self._dirty.setdefault(key, value)  # a newer write wins
+                    raise
+                self.stats["flushes"] += 1
+            self._trim()
+
+    @contextmanager
+    def turn(self) -> Iterator["CachedStateStore"]:
+        """Keep the keys read inside the block watched until the block has ended."""
+        keys: Set[str] = set()
+        token = _current_turn.set((self, keys))
+        try:
+            yield self
+        finally:
+            _current_turn.reset(token)
+            self._held.subtract(keys)
+            self._held += Counter()  # drop keys no other turn holds
+            self._touched.update(keys)  # looked at once more by the next flush
+
+    async def aclose(self) -> None:
+        try:
+            await self.flush()
+        finally:
+            await _aclose(self.store)
+
+    # ------------------------- internals -------------------------
+    def _is_write_through(self, key: str) -> bool:
+        return any(fnmatch.fnmatchcase(key, pattern) for pattern in self.write_through)
+
+    def _load(self, key: str) -> Any:
+        # Synchronous miss: read through the store's dict API.  Agents that
+        # prefetch with aload_state() rarely get here.
+        self.stats["misses"] += 1
+        value = self.store.get(key, _ABSENT)
+        self._put(key, value, clean=True)
+        self._trim()
+        return value
+
+    def _put(self, key: str, value: Any, clean: bool = False) -> None:
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        if clean:
+            self._fingerprints[key] = _fingerprint(value)
+
+    def _touch(self, keys: Iterable[str]) -> None:
+        self._touched.update(keys)
+        turn = _current_turn.get()
+        if turn is not None and turn[0] is self:
+            new = [key for key in keys if key not in turn[1]]
+            turn[1].update(new)
+            self._held.update(new)
+
+    def _collect_mutations(self) -> None:
+        # Keys held by running turns are checked too but stay watched: those
+        # turns may still change their values after this flush.
+        touched, self._touched = self._touched | self._held.keys(), set()
+        for key in touched:
+            if key in self._dirty or key not in self._entries:
+                continue
+            value = self._entries[key]
+            if value is _ABSENT or self._is_write_through(key):
+                continue
+            fingerprint = _fingerprint(value)
+            if fingerprint is not None and fingerprint != self._fingerprints.get(key):
+                self._dirty[key] = value
+
+    def _trim(self) -> None:
+        # Only clean entries are evicted; dirty ones stay until flushed.
+        excess = len(self._entries) - self.max_entries
+        for key in list(self._entries):
+            if excess <= 0:
+                break
+            if key not in self._dirty and key not in self._touched and key not in self._held:
+                del self._entries[key]
+                self._fingerprints.pop(key, None)
+                excess -= 1
+
+    def _write_soon(self, key: str, value: Any) -> None:
+        # Write-through from the synchronous API: start the write now and let
+        # flush() wait for it.
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            _sync_write(self.store, {key: value})
+            self._fingerprints[key] = _fingerprint(value)
+            return
+        items = {key: value}
+        task = loop.create_task(self._write_or_requeue(items, _fingerprints(items)))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def _write_or_requeue(self, items: Dict[str, Any], fingerprints: Dict[str, Optional[bytes]]) -> None:
+        try:
+            await self._write(items, fingerprints)
+        except Exception:
+            logger.exception("Write-through of %s failed; retrying on next flush", list(items))
+            for key, value in items.items():
+                self._dirty.setdefault(key, value)
+
+    async def _write(self, items: Dict[str, Any], fingerprints: Dict[str, Optional[bytes]]) -> None:
+        # ``fingerprints`` are taken when the batch is cut, before any await:
+        # a value changed in place while the write is in flight must still
+        # look dirty to the next flush.
+        if self._write_lock is None:
+            self._write_lock = asyncio.Lock()
+        async with self._write_lock:  # keeps writes of one key in order
+            upserts = {k: v for k, v in items.items() if v is not _DELETED}
+            deletes = [k for k, v in items.items() if v is _DELETED]
+            self.stats["writes"] += 1
+            await asyncio.gather(
+                *([_aset_many(self.store, upserts)] if upserts else []),
+                *(_adelete(self.store, key) for key in deletes),
+            )
+            self._fingerprints.update(fingerprints)
+
+
+# ---------------------------------------------------------------------------
+# store access (AsyncStateStore, or a plain dict-style store)
+# ---------------------------------------------------------------------------
+async def _aget_many(store: Any, keys: List[str]) -> Dict[str, Any]:
+    if hasattr(store, "aget_many"):
+        return await store.aget_many(keys)
+    return {key: store[key] for key in keys if key in store}
+
+
+async def _aset_many(store: Any, items: Dict[str, Any]) -> None:
+    if hasattr(store, "aset_many"):
+        await store.aset_many(items)
+    else:
+        store.update(items)
+
+
+async def _adelete(store: Any, key: str) -> None:
+    if hasattr(store, "adelete"):
+        await store.adelete(key)
+    else:
+        store.pop(key, None)
+
+
+async def _aclose(store: Any) -> None:
+    if hasattr(store, "aclose"):
+        await store.aclose()
+
+
+def _sync_write(store: Any, items: Dict[str, Any]) -> None:
+    for key, value in items.items():
+        if value is _DELETED:
+            store.pop(key, None)
+        else:
+            store[key] = value
@@ -0,0 +1,65 @@
+"""Shared fixtures: an in-memory stand-in for an ``azure.cosmos.aio`` container.
+
+Only the Cosmos-backed fixtures need ``azure-cosmos``; tests that do not use
+them run without it.
+"""
+
+import sys
+from pathlib import Path
+from typing import Any, Dict, List
+
+import pytest
+
+# Same layout backend.py runs with: applications/ for utils & co, agentic_ai/ for agents.*
+APPLICATIONS = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(APPLICATIONS), str(APPLICATIONS.parent)]
+
+
+class FakeContainer:
+    """Async ``read_item`` / ``upsert_item`` / ``delete_item`` over a dict, recording every call."""
+
+    def __init__(self) -> None:
+        self.docs: Dict[str, Dict[str, Any]] = {}
+        self.calls: List[tuple] = []
+
+    async def read_item(self, item: str, partition_key: List[str]) -> Dict[str, Any]:
+        self.calls.append(("read", item))
+        assert partition_key == ["default", item]
+        if item not in self.docs:
+            raise _not_found(item)
+        return dict(self.docs[item])
+
+    async def upsert_item(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        self.calls.append(("upsert", body["id"]))
+        self.docs[body["id"]] = dict(body)
+        return body
+
+    async def delete_item(self, item: str, partition_key: List[str]) -> None:
+        self.calls.append(("delete", item))
+        assert partition_key == ["default", item]
+        if item not in self.docs:
+            raise _not_found(item)
+        del self.docs[item]
+
+    def values(self) -> Dict[str, Any]:
+        return {key: doc["value"] for key, doc in self.docs.items()}
+
+
+def _not_found(item: str) -> Exception:
+    from azure.cosmos.exceptions import CosmosResourceNotFoundError
+
+    return CosmosResourceNotFoundError(message=f"{item} not found")
+
+
+@pytest.fixture
+def container() -> FakeContainer:
+    return FakeContainer()
+
+
+@pytest.fixture
+def cosmos_store(container, monkeypatch):
+    pytest.importorskip("azure.cosmos.exceptions")
+    from utils import AsyncCosmosDBStateStore
+
+    monkeypatch.delenv("DATA_TENANT_ID", raising=False)
+    return AsyncCosmosDBStateStore(container=container)
@@ -0,0 +1,266 @@
+"""CachedStateStore: read-through LRU, write-behind flush, mutation detection, write-through keys."""
+
+import asyncio
+import copy
+
+import pytest
+
+from state_cache import CachedStateStore
+from utils import InMemoryStateStore
+
+
+class Counting:
+    """Wraps an AsyncStateStore and counts round trips; ``fail`` makes writes raise.
+
+    Values are copied both ways, as with a remote store, so an in-place
+    change only reaches the store if the cache writes it.
+    """
+
+    def __init__(self, inner):
+        self.inner = inner
+        self.fail = False
+        self.calls = {"aget_many": 0, "aset_many": 0, "adelete": 0}
+
+    async def aget_many(self, keys):
+        self.calls["aget_many"] += 1
+        return copy.deepcopy(await self.inner.aget_many(keys))
+
+    async def aset_many(self, items):
+        self.calls["aset_many"] += 1
+        if self.fail:
+            raise RuntimeError("store unavailable")
+        await self.inner.aset_many(copy.deepcopy(dict(items)))
+
+    async def adelete(self, key):
+        self.calls["adelete"] += 1
+        await self.inner.adelete(key)
+
+    def get(self, key, default=None):
+        return default
+
+    def __iter__(self):
+        return iter(())
+
+
+@pytest.fixture
+def store():
+    return InMemoryStateStore()
+
+
+@pytest.fixture
+def backing(store):
+    return Counting(store)
+
+
+def test_reads_are_cached_including_misses(backing):
+    cache = CachedStateStore(backing)
+
+    async def scenario():
+        await backing.inner.aset("a", 1)
+        first = await cache.aget_many(["a", "missing"])
+        second = await cache.aget_many(["a", "missing"])
+        return first, second, await cache.aget("missing", "dflt")
+
+    assert asyncio.run(scenario()) == ({"a": 1}, {"a": 1}, "dflt")
+    assert backing.calls["aget_many"] == 1
+
+
+def test_writes_are_deferred_until_flush(backing, store):
+    cache = CachedStateStore(backing)
+
+    async def scenario():
+        await cache.aset_many({"a": 1, "b": 2})
+        cache["c"] = 3
+        assert store == {}
+        assert set(cache._dirty) == {"a", "b", "c"}
+        await cache.flush()
+
+    asyncio.run(scenario())
+    assert dict(store) == {"a": 1, "b": 2, "c": 3}
+    assert backing.calls["aset_many"] == 1
+    assert cache._dirty == {}
+
+
+def test_flush_without_changes_writes_nothing(backing):
+    cache = CachedStateStore(backing)
+
+    async def scenario():
+        await cache.aget_many(["a"])
+        await cache.flush()
+
+    asyncio.run(scenario())
+    assert backing.calls["aset_many"] == 0
+
+
+def test_delete_is_flushed(backing, store):
+    cache = CachedStateStore(backing)
+
+    async def scenario():
+        await cache.aset("a", 1)
+        await cache.flush()
+        await cache.adelete("a")
+        await cache.adelete("never-written")
+        assert "a" in store
+        await cache.flush()
+        return await cache.aget("a", "gone")
+
+    assert asyncio.run(scenario()) == "gone"
+    assert "a" not in store
+    assert backing.calls["adelete"] == 2
+
+
+def test_in_place_mutation_is_detected(backing, store):
+    cache = CachedStateStore(backing)
+
+    async def scenario():
+        await backing.inner.aset_many({"history": [1], "checkpoints": {}})
+        values = await cache.aget_many(["history", "checkpoints"])
+        values["history"].append(2)
+        cache["checkpoints"]["c1"] = 1  # setdefault-style dict kept by the caller
+        await cache.flush()
+
+    asyncio.run(scenario())
+    assert dict(store) == {"history": [1, 2], "checkpoints": {"c1": 1}}
+    assert backing.calls["aset_many"] == 1
+
+
+def test_running_turn_keeps_its_keys_watched_across_other_flushes(backing, store):
+    cache = CachedStateStore(backing, max_entries=0)
+    read, resume = asyncio.Event(), asyncio.Event()
+
+    async def session_b():
+        with cache.turn():
+            checkpoint = cache.setdefault("B_ckpt", {})
+            read.set()
+            await resume.wait()
+            checkpoint["latest"] = "ckpt-1"
+        await cache.flush()
+
+    async def scenario():
+        task = asyncio.create_task(session_b())
+        await read.wait()
+        with cache.turn():
+            await cache.aset("A", 1)
+        await cache.flush()  # session A's turn ends while B's is still running
+        assert "B_ckpt" in cache._entries
+        resume.set()
+        await task
+
+    asyncio.run(scenario())
+    assert dict(store) == {"A": 1, "B_ckpt": {"latest": "ckpt-1"}}
+    assert not cache._held
+    assert len(cache._entries) == 0
+
+
+def test_in_place_change_during_an_in_flight_flush_is_written(backing, store):
+    cache = CachedStateStore(backing)
+    sent, release = asyncio.Event(), asyncio.Event()
+    write = backing.aset_many
+
+    async def slow_aset_many(items):
+        items = copy.deepcopy(dict(items))  # serialised when sent
+        sent.set()
+        await release.wait()
+        await write(items)
+
+    backing.aset_many = slow_aset_many
+
+    async def scenario():
+        history = ["turn1"]
+        with cache.turn():
+            cache["h"] = history
+            flushing = asyncio.create_task(cache.flush())
+            await sent.wait()
+            history.append("turn2")  # after the batch left, before it landed
+            release.set()
+            await flushing
+        await cache.flush()
+
+    asyncio.run(scenario())
+    assert dict(store) == {"h": ["turn1", "turn2"]}
+
+
+def test_unchanged_values_are_not_rewritten(backing):
+    cache = CachedStateStore(backing)
+
+    async def scenario():
+        await cache.aset("a", [1])
+        await cache.flush()
+        await cache.aget("a")
+        await cache.flush()
+
+    asyncio.run(scenario())
+    assert backing.calls["aset_many"] == 1
+
+
+def test_failed_flush_requeues_dirty_keys(backing, store):
+    cache = CachedStateStore(backing)
+
+    async def scenario():
+        await cache.aset_many({"a": 1, "b": 2})
+        backing.fail = True
+        with pytest.raises(RuntimeError):
+            await cache.flush()
+        assert set(cache._dirty) == {"a", "b"}
+        await cache.aset("a", 10)  # a newer write wins over the re-queued value
+        backing.fail = False
+        await cache.flush()
+
+    asyncio.run(scenario())
+    assert dict(store) == {"a": 10, "b": 2}
+    assert cache._dirty == {}
+
+
+def test_write_through_keys_skip_the_flush(backing, store):
+    cache = CachedStateStore(backing, write_through=["*_chat_history"])
+
+    async def scenario():
+        await cache.aset_many({"s_chat_history": [1], "s": {"turn": 1}})
+        assert dict(store) == {"s_chat_history": [1]}
+        cache["t_chat_history"] = [2]  # sync API: written in the background
+        await cache.flush()
+
+    asyncio.run(scenario())
+    assert dict(store) == {"s_chat_history": [1], "s": {"turn": 1}, "t_chat_history": [2]}
+
+
+def test_failed_write_through_is_retried_on_flush(backing, store):
+    cache = CachedStateStore(backing, write_through=["*"])
+
+    async def scenario():
+        backing.fail = True
+        cache["a"] = 1
+        await asyncio.sleep(0)
+        with pytest.raises(RuntimeError):
+            await cache.flush()  # the failed background write re-queued "a"; still down
+        assert cache._dirty == {"a": 1}
+        backing.fail = False
+        await cache.flush()
+
+    asyncio.run(scenario())
+    assert dict(store) == {"a": 1}
+
+
+def test_size_zero_keeps_only_dirty_entries(backing):
+    cache = CachedStateStore(backing, max_entries=0)
+
+    async def scenario():
+        await cache.aget_many(["a", "b"])
+        await cache.aset("c", 1)
+        await cache.flush()  # the keys read before are still touched until this flush
+        await cache.flush()
+
+    asyncio.run(scenario())
+    assert len(cache._entries) == 0
+
+
+def test_plain_dict_backing():
+    backing = {"a": 1}
+    cache = CachedStateStore(backing)
+    assert cache["a"] == 1
+    cache["b"] = 2
+    del cache["a"]
+    assert backing == {"a": 1}
+    asyncio.run(cache.flush())
+    assert backing == {"b": 2}
+    assert dict(cache) == {"b": 2}
@@ -0,0 +1,123 @@
+"""AsyncStateStore implementations and BaseAgent's awaited state load/save."""
+
+import asyncio
+
+from agents.base_agent import BaseAgent
+from utils import AsyncStateStore, InMemoryStateStore
+
+
+class TurnAgent(BaseAgent):
+    """Minimal agent with one extra persisted key, like the real agents' turn counters."""
+
+    def __init__(self, state_store, session_id):
+        super().__init__(state_store, session_id)
+        self._turn_key = f"{session_id}_turn"
+        self.turn = 0 if self._state_deferred else state_store.get(self._turn_key, 0)
+
+    async def aload_state(self, *keys):
+        values = await super().aload_state(self._turn_key, *keys)
+        self.turn = values.get(self._turn_key, 0)
+        return values
+
+    async def chat_async(self, prompt):
+        self.turn += 1
+        await self.asave_state({"turn": self.turn}, [{"role": "user", "content": prompt}], {self._turn_key: self.turn})
+        return "ok"
+
+
+def test_stores_implement_protocol(cosmos_store):
+    assert isinstance(cosmos_store, AsyncStateStore)
+    assert isinstance(InMemoryStateStore(), AsyncStateStore)
+
+
+def test_aset_many_then_aget_many(cosmos_store, container):
+    async def scenario():
+        await cosmos_store.aset_many({"a": 1, "b": [2], "c": {"x": 3}})
+        return await cosmos_store.aget_many(["a", "b", "missing", "a"])
+
+    assert asyncio.run(scenario()) == {"a": 1, "b": [2]}
+    assert container.values() == {"a": 1, "b": [2], "c": {"x": 3}}
+    assert all(doc["tenant_id"] == "default" for doc in container.docs.values())
+    # duplicate keys are read once
+    assert [call for call in container.calls if call[0] == "read"] == [("read", "a"), ("read", "b"), ("read", "missing")]
+
+
+def test_aget_default(cosmos_store):
+    async def scenario():
+        await cosmos_store.aset("present", None)
+        return await cosmos_store.aget("present", "dflt"), await cosmos_store.aget("absent", "dflt")
+
+    assert asyncio.run(scenario()) == (None, "dflt")
+
+
+def test_adelete(cosmos_store, container):
+    async def scenario():
+        await cosmos_store.aset_many({"a": 1, "b": 2})
+        await cosmos_store.adelete("a")
+        await cosmos_store.adelete("never-written")  # missing keys are not an error
+        return await cosmos_store.aget_many(["a", "b"])
+
+    assert asyncio.run(scenario()) == {"b": 2}
+    assert ("delete", "never-written") in container.calls
+
+
+def test_in_memory_store_async_api():
+    store = InMemoryStateStore()
+
+    async def scenario():
+        await store.aset_many({"a": 1, "b": 2})
+        await store.adelete("a")
+        await store.adelete("missing")
+        return await store.aget_many(["a", "b"]), await store.aget("a", "dflt")
+
+    assert asyncio.run(scenario()) == ({"b": 2}, "dflt")
+    assert dict(store) == {"b": 2}
+
+
+def test_agent_defers_reads_on_async_store(cosmos_store, container):
+    agent = TurnAgent(cosmos_store, "s1")
+    assert agent._state_deferred
+    assert (agent.state, agent.chat_history, agent.turn) == (None, [], 0)
+    assert container.calls == []
+
+
+def test_agent_asave_then_aload(cosmos_store, container):
+    async def scenario():
+        agent = TurnAgent(cosmos_store, "s1")
+        await agent.aload_state()
+        await agent.chat_async("first")
+        await agent.chat_async("second")
+        reloaded = TurnAgent(cosmos_store, "s1")
+        values = await reloaded.aload_state()
+        return reloaded, values
+
+    reloaded, values = asyncio.run(scenario())
+    assert not reloaded._state_deferred
+    assert reloaded.state == {"turn": 2}
+    assert reloaded.turn == 2
+    assert [m["content"] for m in reloaded.chat_history] == ["first", "second"]
+    assert set(values) == {"s1", "s1_chat_history", "s1_turn"}
+    assert container.values() == {
+        "s1": {"turn": 2},
+        "s1_chat_history": reloaded.chat_history,
+        "s1_turn": 2,
+    }
+
+
+def test_agent_aload_state_on_empty_store(cosmos_store):
+    async def scenario():
+        agent = TurnAgent(cosmos_store, "new")
+        return agent, await agent.aload_state("new_other")
+
+    agent, values = asyncio.run(scenario())
+    assert values == {}
+    assert (agent.state, agent.chat_history, agent.turn) == (None, [], 0)
+
+
+def test_agent_on_plain_dict_reads_synchronously():
+    store = {}
+    asyncio.run(TurnAgent(store, "p").chat_async("hi"))
+    agent = TurnAgent(store, "p")
+    assert not agent._state_deferred
+    assert (agent.state, agent.turn) == ({"turn": 1}, 1)
+    assert agent.chat_history == [{"role": "user", "content": "hi"}]
@@ -12,15 +12,23 @@ Document schema
 Partition-key  
 -------------  
 Hierarchical / multi-hash on                /tenant_id  +  /id  
+
+Async access  
+------------  
+``get_state_store()`` returns a store that is both a ``MutableMapping`` (what  
+the agents use) and an :class:`AsyncStateStore`, so async callers such as the  
+backend and ``BaseAgent.aload_state`` / ``asave_state`` can await state I/O  
+instead of blocking the event loop.  
 """  
   
 from __future__ import annotations  
   
+import asyncio
 import json  
 import os  
 import logging  
 import collections.abc as abc  
-from typing import Any, Dict, Iterator, List, Optional  
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Protocol, runtime_checkable
 from datetime import datetime  
 
 # ---------------------------------------------------------------------------  
@@ -34,12 +42,25 @@ try:
     )  
 except ImportError:  
     CosmosClient = None  # type: ignore  
+
+try:
+    from azure.cosmos.aio import CosmosClient as AsyncCosmosClient
+except ImportError:
+    AsyncCosmosClient = None  # type: ignore
   
 try:  
     from azure.identity import ClientSecretCredential, DefaultAzureCredential  
 except ImportError:  
     ClientSecretCredential = DefaultAzureCredential = None  # type: ignore  
 
+try:
+    from azure.identity.aio import (
+        ClientSecretCredential as AsyncClientSecretCredential,
+        DefaultAzureCredential as AsyncDefaultAzureCredential,
+    )
+except ImportError:
+    AsyncClientSecretCredential = AsyncDefaultAzureCredential = None  # type: ignore
+
   
 def make_json_serializable(obj):  
     if isinstance(obj, dict):  
@@ -50,78 +71,141 @@ def make_json_serializable(obj):
         return obj.isoformat()  
     else:  
         return obj  
-# ---------------------------------------------------------------------------  
-# Cosmos-backed implementation  
-# ---------------------------------------------------------------------------  
-class CosmosDBStateStore(abc.MutableMapping):  
-    """  
-    Dict-like wrapper around a Cosmos DB container whose hierarchical  
-    partition key is (tenant_id, id).  
-  
-    Keys   -> session_id  
-    Values -> arbitrary JSON-serialisable python objects  
-    """  
-  
-    def __init__(self) -> None:  
-        if CosmosClient is None:  
-            raise RuntimeError("azure-cosmos is not installed")  
-  
-        endpoint = os.getenv("COSMOSDB_ENDPOINT") or os.getenv("COSMOS_DB_ENDPOINT")  
-        if not endpoint:  
-            raise RuntimeError("COSMOSDB_ENDPOINT must be defined")  
-  
-        # Data-level tenant (NOT the AAD tenant used for auth)  
-        self.tenant_id: str = os.getenv("DATA_TENANT_ID", "default")  
-  
-        self.client = CosmosClient(endpoint, credential=self._create_credential())  
-  
-        db_name = (  
-            os.getenv("COSMOSDB_DB_NAME")  
-            or os.getenv("COSMOS_DB_NAME")  
-            or "ai_state_db"  
-        )  
-        container_name = (  
-            os.getenv("COSMOSDB_CONTAINER_NAME")  
-            or os.getenv("COSMOS_CONTAINER_NAME")  
-            or "state_store"  
-        )  
-  
-        # Partition key: /tenant_id  +  /id  
-        pk = PartitionKey(path=["/tenant_id", "/id"], kind="MultiHash")  
-  
-        self.database = self.client.create_database_if_not_exists(id=db_name)  
-        self.container = self.database.create_container_if_not_exists(  
-            id=container_name,  
-            partition_key=pk,  
-        )  
-  
-    # ------------------------- authentication helpers -------------------------  
-    def _create_credential(self):  
-        key = os.getenv("COSMOSDB_KEY")  
-        if key:  
-            logging.info("CosmosDBStateStore: authenticating with KEY")  
-            return key  
-  
-        c_id, c_secret, t_id = (  
-            os.getenv("AAD_CLIENT_ID"),  
-            os.getenv("AAD_CLIENT_SECRET"),  
-            os.getenv("AAD_TENANT_ID"),  
-        )  
-        if c_id and c_secret and t_id:  
-            if ClientSecretCredential is None:  
-                raise RuntimeError("azure-identity is not installed")  
-            logging.info("CosmosDBStateStore: authenticating with AAD client-secret")  
-            return ClientSecretCredential(  
-                tenant_id=t_id, client_id=c_id, client_secret=c_secret  
-            )  
-  
-        if DefaultAzureCredential is None:  
-            raise RuntimeError(  
-                "No Cosmos key or AAD creds found, and azure-identity is missing."  
-            )  
-        logging.info("CosmosDBStateStore: authenticating with DefaultAzureCredential")  
-        return DefaultAzureCredential(exclude_interactive_browser_credential=True)  
-  
+# ---------------------------------------------------------------------------
+# Async interface
+# ---------------------------------------------------------------------------
+@runtime_checkable
+class AsyncStateStore(Protocol):
+    """
+    Awaitable counterpart of the dict-style store API.
+
+    ``aget_many`` returns only the keys that exist; ``adelete`` ignores
+    missing keys.
+    """
+
+    async def aget(self, key: str, default: Any = None) -> Any: ...
+
+    async def aset(self, key: str, value: Any) -> None: ...
+
+    async def adelete(self, key: str) -> None: ...
+
+    async def aget_many(self, keys: Iterable[str]) -> Dict[str, Any]: ...
+
+    async def aset_many(self, items: Mapping[str, Any]) -> None: ...
+
+    async def aclose(self) -> None: ...
+
+
+class InMemoryStateStore(dict):
+    """The in-process fallback: a plain dict that also implements AsyncStateStore."""
+
+    async def aget(self, key: str, default: Any = None) -> Any:
+        return self.get(key, default)
+
+    async def aset(self, key: str, value: Any) -> None:
+        self[key] = value
+
+    async def adelete(self, key: str) -> None:
+        self.pop(key, None)
+
+    async def aget_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        return {key: self[key] for key in keys if key in self}
+
+    async def aset_many(self, items: Mapping[str, Any]) -> None:
+        self.update(items)
+
+    async def aclose(self) -> None:
+        pass
+
+
+# ---------------------------------------------------------------------------
+# Cosmos configuration (shared by the sync and async stores)
+# ---------------------------------------------------------------------------
+def _cosmos_settings() -> tuple[str, str, str]:
+    """(endpoint, database name, container name) from the environment."""
+    endpoint = os.getenv("COSMOSDB_ENDPOINT") or os.getenv("COSMOS_DB_ENDPOINT")
+    if not endpoint:
+        raise RuntimeError("COSMOSDB_ENDPOINT must be defined")
+    db_name = (
+        os.getenv("COSMOSDB_DB_NAME")
+        or os.getenv("COSMOS_DB_NAME")
+        or "ai_state_db"
+    )
+    container_name = (
+        os.getenv("COSMOSDB_CONTAINER_NAME")
+        or os.getenv("COSMOS_CONTAINER_NAME")
+        or "state_store"
+    )
+    return endpoint, db_name, container_name
+
+
+def _cosmos_credential(secret_cls: Any, default_cls: Any, label: str):
+    key = os.getenv("COSMOSDB_KEY")
+    if key:
+        logging.info("%s: authenticating with KEY", label)
+        return key
+
+    c_id, c_secret, t_id = (
+        os.getenv("AAD_CLIENT_ID"),
+        os.getenv("AAD_CLIENT_SECRET"),
+        os.getenv("AAD_TENANT_ID"),
+    )
+    if c_id and c_secret and t_id:
+        if secret_cls is None:
+            raise RuntimeError("azure-identity is not installed")
+        logging.info("%s: authenticating with AAD client-secret", label)
+        return secret_cls(tenant_id=t_id, client_id=c_id, client_secret=c_secret)
+
+    if default_cls is None:
+        raise RuntimeError(
+            "No Cosmos key or AAD creds found, and azure-identity is missing."
+        )
+    logging.info("%s: authenticating with DefaultAzureCredential", label)
+    return default_cls(exclude_interactive_browser_credential=True)
+
+
+def _partition_key() -> "PartitionKey":
+    # Partition key: /tenant_id  +  /id
+    return PartitionKey(path=["/tenant_id", "/id"], kind="MultiHash")
+
+
+# ---------------------------------------------------------------------------
+# Cosmos-backed implementation
+# ---------------------------------------------------------------------------
+class CosmosDBStateStore(abc.MutableMapping):
+    """
+    Dict-like wrapper around a Cosmos DB container whose hierarchical
+    partition key is (tenant_id, id).
+
+    Keys   -> session_id
+    Values -> arbitrary JSON-serialisable python objects
+
+    The ``a*`` methods (AsyncStateStore) reach the same container through
+    :class:`AsyncCosmosDBStateStore`.
+    """
+
+    def __init__(self) -> None:
+        if CosmosClient is None:
+            raise RuntimeError("azure-cosmos is not installed")
+
+        endpoint, db_name, container_name = _cosmos_settings()
+
+        # Data-level tenant (NOT the AAD tenant used for auth)
+        self.tenant_id: str = os.getenv("DATA_TENANT_ID", "default")
+
+        self.client = CosmosClient(endpoint, credential=self._create_credential())
+
+        self.database = self.client.create_database_if_not_exists(id=db_name)
+        self.container = self.database.create_container_if_not_exists(
+            id=container_name,
+            partition_key=_partition_key(),
+        )
+        self._aio: Optional[AsyncCosmosDBStateStore] = None
+
+    # ------------------------- authentication helpers -------------------------
+    def _create_credential(self):
+        return _cosmos_credential(ClientSecretCredential, DefaultAzureCredential, "CosmosDBStateStore")
+
     # ------------------------- internal helpers -------------------------  
     def _read(self, session_id: str) -> Optional[Dict[str, Any]]:  
         try:  
@@ -180,14 +264,121 @@ class CosmosDBStateStore(abc.MutableMapping):
             )  
         )  
         return res[0] if res else 0  
+
+    # ------------------------- AsyncStateStore API -------------------------
+    @property
+    def aio(self) -> "AsyncCosmosDBStateStore":
+        if self._aio is None:
+            self._aio = AsyncCosmosDBStateStore()
+        return self._aio
+
+    async def aget(self, key: str, default: Any = None) -> Any:
+        return await self.aio.aget(key, default)
+
+    async def aset(self, key: str, value: Any) -> None:
+        await self.aio.aset(key, value)
+
+    async def adelete(self, key: str) -> None:
+        await self.aio.adelete(key)
+
+    async def aget_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        return await self.aio.aget_many(keys)
+
+    async def aset_many(self, items: Mapping[str, Any]) -> None:
+        await self.aio.aset_many(items)
+
+    async def aclose(self) -> None:
+        if self._aio is not None:
+            await self._aio.aclose()
+
+
+class AsyncCosmosDBStateStore:
+    """
+    ``azure.cosmos.aio`` implementation of :class:`AsyncStateStore`, same
+    container and document schema as :class:`CosmosDBStateStore`.
+
+    The client and container are created on first use, inside the caller's
+    event loop.  Pass ``container`` to use an existing (or fake) container.
+
+    Every document is its own (tenant_id, id) partition, so a transactional
+    batch cannot span keys: ``aget_many`` / ``aset_many`` issue their point
+    operations concurrently instead, one round trip of latency in total.
+    """
+
+    def __init__(self, container: Any = None) -> None:
+        if container is None:
+            if AsyncCosmosClient is None:
+                raise RuntimeError("azure-cosmos (with aiohttp) is not installed")
+            self._settings = _cosmos_settings()
+        self.tenant_id: str = os.getenv("DATA_TENANT_ID", "default")
+        self.client = None
+        self._credential = None
+        self._container = container
+        self._lock = asyncio.Lock()
+
+    async def _get_container(self):
+        if self._container is None:
+            async with self._lock:
+                if self._container is None:
+                    endpoint, db_name, container_name = self._settings
+                    self._credential = _cosmos_credential(
+                        AsyncClientSecretCredential, AsyncDefaultAzureCredential, "AsyncCosmosDBStateStore"
+                    )
+                    self.client = AsyncCosmosClient(endpoint, credential=self._credential)
+                    database = await self.client.create_database_if_not_exists(id=db_name)
+                    self._container = await database.create_container_if_not_exists(
+                        id=container_name,
+                        partition_key=_partition_key(),
+                    )
+        return self._container
+
+    async def _read(self, key: str) -> Optional[Dict[str, Any]]:
+        container = await self._get_container()
+        try:
+            return await container.read_item(item=key, partition_key=[self.tenant_id, key])
+        except cosmos_exceptions.CosmosResourceNotFoundError:
+            return None
+
+    async def aget(self, key: str, default: Any = None) -> Any:
+        doc = await self._read(key)
+        return default if doc is None else doc["value"]
+
+    async def aget_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        keys = list(dict.fromkeys(keys))
+        docs = await asyncio.gather(*(self._read(key) for key in keys))
+        return {key: doc["value"] for key, doc in zip(keys, docs) if doc is not None}
+
+    async def aset(self, key: str, value: Any) -> None:
+        container = await self._get_container()
+        await container.upsert_item({"id": key, "tenant_id": self.tenant_id, "value": value})
+
+    async def aset_many(self, items: Mapping[str, Any]) -> None:
+        await asyncio.gather(*(self.aset(key, value) for key, value in items.items()))
+
+    async def adelete(self, key: str) -> None:
+        container = await self._get_container()
+        try:
+            await container.delete_item(item=key, partition_key=[self.tenant_id, key])
+        except cosmos_exceptions.CosmosResourceNotFoundError:
+            pass
+
+    async def aclose(self) -> None:
+        client, self.client = self.client, None
+        credential, self._credential = self._credential, None
+        if client is not None:
+            self._container = None
+            await client.close()
+        if credential is not None and hasattr(credential, "close"):
+            await credential.close()
   
   
 # ---------------------------------------------------------------------------  
 # public factory  
 # ---------------------------------------------------------------------------  
-def get_state_store() -> Dict[str, Any] | CosmosDBStateStore:  
+def get_state_store() -> InMemoryStateStore | CosmosDBStateStore:  
     """  
-    Return a CosmosDBStateStore if Cosmos configuration exists, else a dict.  
+    Return a CosmosDBStateStore if Cosmos configuration exists, else an  
+    InMemoryStateStore (a dict).  Both implement AsyncStateStore.  
     """  
     have_endpoint = os.getenv("COSMOSDB_ENDPOINT") or os.getenv("COSMOS_DB_ENDPOINT")  
     have_key = os.getenv("COSMOSDB_KEY")  
@@ -202,4 +393,4 @@ def get_state_store() -> Dict[str, Any] | CosmosDBStateStore:
         return CosmosDBStateStore()  
   
     logging.info("Cosmos DB config absent → using in-memory dict")  
-    return {}  # fallback  
\ No newline at end of file
+    return InMemoryStateStore()  # fallback  
\ No newline at end of file
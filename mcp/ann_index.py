@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+IVF-flat approximate nearest-neighbour index for the knowledge base.
+
+The exact NumPy scan in ``kb_index`` costs O(n·d) per query.  IVF-flat
+partitions the (L2-normalised) embeddings into ``nlist`` cells with spherical
+k-means; a query scores the ``nlist`` centroids, then only the vectors of the
+``nprobe`` closest cells.  ``nprobe`` is the recall/latency knob: 1 is fastest,
+``nlist`` is an exact scan.
+
+Vectors are stored contiguously, grouped by cell, and persisted as plain
+``.npy`` files in a directory next to the database (``contoso.db.ivf/``) so
+loading is an ``mmap`` rather than a rebuild.  ``meta.json`` records the KB
+version and content identity the index was built from; ``kb_index`` ignores
+a stale index and falls back to the exact scan until it is rebuilt.
+
+Offline usage (from the ``mcp`` directory)::
+
+    python ann_index.py build --db data/contoso.db --nlist 1024
+    python ann_index.py bench --n 1000000 --dim 1536 --nlist 1024 --nprobe 4 8 16
+    python ann_index.py bench --db data/contoso.db --nprobe 1 2 4
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sqlite3
+import statistics
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+META_FILE = "meta.json"
+_ARRAYS = ("centroids", "vectors", "ids", "offsets")
+
+
+def default_path(db_path: str) -> str:
+    """Where the ANN index for ``db_path`` lives."""
+    return f"{db_path}.ivf"
+
+
+def _normalize(x: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(x, axis=1, keepdims=True)
+    np.divide(x, norms, out=x, where=norms > 0)
+    return x
+
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray, chunk: int = 65536) -> np.ndarray:
+    """Nearest centroid (max inner product) for every row, in chunks."""
+    out = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), chunk):
+        out[start:start + chunk] = np.argmax(vectors[start:start + chunk] @ centroids.T, axis=1)
+    return out
+
+
+def spherical_kmeans(
+    data: np.ndarray,
+    nlist: int,
+    *,
+    niter: int = 15,
+    seed: int = 0,
+) -> np.ndarray:
+    """Unit-norm centroids for ``data`` (rows assumed L2-normalised)."""
+    rng = np.random.default_rng(seed)
+    nlist = min(nlist, len(data))
+    centroids = data[rng.choice(len(data), nlist, replace=False)].copy()
+    for _ in range(niter):
+        labels = _assign(data, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, data)
+        counts = np.bincount(labels, minlength=nlist)
+        empty = counts == 0
+        if empty.any():
+            # Re-seed empty cells with random points so every cell is used.
+            sums[empty] = data[rng.choice(len(data), int(empty.sum()), replace=False)]
+        centroids = _normalize(sums.astype(np.float32, copy=False))
+    return centroids
+
+
+@dataclass
+class IVFFlatIndex:
+    centroids: np.ndarray  # (nlist, d)
+    vectors: np.ndarray    # (n, d) grouped by cell
+    ids: np.ndarray        # (n,) document ids, same order as ``vectors``
+    offsets: np.ndarray    # (nlist + 1,) cell boundaries into ``vectors``
+    meta: Dict[str, Any]
+
+    @property
+    def nlist(self) -> int:
+        return len(self.centroids)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    # ------------------------------------------------------------------ #
+    @classmethod
+    def build(
+        cls,
+        vectors: np.ndarray,
+        ids: np.ndarray,
+        *,
+        nlist: Optional[int] = None,
+        niter: int = 15,
+        train_size: Optional[int] = None,
+        seed: int = 0,
+        meta: Optional[Dict[str, Any]] = None,
+    ) -> "IVFFlatIndex":
+        """Train on a sample, then bucket every vector into its cell."""
+        vectors = _normalize(np.ascontiguousarray(vectors, dtype=np.float32).copy())
+        n = len(vectors)
+        if n == 0:
+            raise ValueError("Cannot build an ANN index over zero vectors")
+        nlist = min(nlist or max(1, int(np.sqrt(n))), n)
+        train_size = min(n, train_size or nlist * 64)
+        rng = np.random.default_rng(seed)
+        sample = vectors[rng.choice(n, train_size, replace=False)] if train_size < n else vectors
+        centroids = spherical_kmeans(sample, nlist, niter=niter, seed=seed)
+
+        labels = _assign(vectors, centroids)
+        order = np.argsort(labels, kind="stable")
+        counts = np.bincount(labels, minlength=len(centroids))
+        offsets = np.zeros(len(centroids) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        info = {"nlist": int(len(centroids)), "dim": int(vectors.shape[1]), "count": int(n), "built_at": time.time()}
+        info.update(meta or {})
+        return cls(centroids, vectors[order], np.asarray(ids, dtype=np.int64)[order], offsets, info)
+
+    # ------------------------------------------------------------------ #
+    def search(self, q: np.ndarray, k: int, nprobe: int = 8) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-``k`` by inner product; returns ``(scores, positions)`` best first.
+
+        ``q`` must be L2-normalised.  Positions index ``self.vectors``/``self.ids``.
+        """
+        nprobe = max(1, min(nprobe, self.nlist))
+        cell_scores = self.centroids @ q
+        probe = np.argpartition(-cell_scores, nprobe - 1)[:nprobe] if nprobe < self.nlist else np.arange(self.nlist)
+        scores: List[np.ndarray] = []
+        positions: List[np.ndarray] = []
+        for cell in probe:
+            start, end = int(self.offsets[cell]), int(self.offsets[cell + 1])
+            if end > start:
+                scores.append(self.vectors[start:end] @ q)
+                positions.append(np.arange(start, end))
+        if not scores:
+            return np.empty(0, dtype=np.float32), np.empty(0, dtype=np.int64)
+        all_scores = np.concatenate(scores)
+        all_pos = np.concatenate(positions)
+        k = min(k, len(all_scores))
+        top = np.argpartition(-all_scores, k - 1)[:k] if k < len(all_scores) else np.arange(len(all_scores))
+        top = top[np.argsort(-all_scores[top], kind="stable")]
+        return all_scores[top], all_pos[top]
+
+    # ------------------------------------------------------------------ #
+    def save(self, path: str) -> None:
+        os.makedirs(path, exist_ok=True)
+        for name in _ARRAYS:
+            np.save(os.path.join(path, f"{name}.npy"), getattr(self, name))
+        with open(os.path.join(path, META_FILE), "w", encoding="utf-8") as fh:
+            json.dump(self.meta, fh, indent=2)
+
+    @classmethod
+    def load(cls, path: str, *, mmap: bool = True) -> "IVFFlatIndex":
+        mode = "r" if mmap else None
+        arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mode) for name in _ARRAYS}
+        # Centroids and offsets are tiny and touched on every query.
+        arrays["centroids"] = np.ascontiguousarray(arrays["centroids"])
+        arrays["offsets"] = np.asarray(arrays["offsets"])
+        with open(os.path.join(path, META_FILE), encoding="utf-8") as fh:
+            meta = json.load(fh)
+        return cls(meta=meta, **arrays)
+
+    @staticmethod
+    def read_meta(path: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(os.path.join(path, META_FILE), encoding="utf-8") as fh:
+                return json.load(fh)
+        except (OSError, ValueError):
+            return None
+
+
+# ────────────────────────────  OFFLINE TOOLS  ──────────────────────────
+def build_from_db(db_path: str, out_path: Optional[str] = None, **kwargs: Any) -> IVFFlatIndex:
+    """Build and persist the ANN index for the KB stored in ``db_path``."""
+    from kb_index import KnowledgeBaseIndex, content_identity, ensure_fts, ensure_version_tracking
+
+    db = sqlite3.connect(db_path)
+    try:
+        # Offline and writing next to the database anyway: make sure the KB
+        # version table the index is stamped with exists.
+        ensure_version_tracking(db)
+        ensure_fts(db)
+        snap = KnowledgeBaseIndex().snapshot(db)
+        content = content_identity(db)
+    finally:
+        db.close()
+    meta = {"kb_version": snap.version, "kb_content": content}
+    index = IVFFlatIndex.build(snap.matrix, snap.doc_ids, meta=meta, **kwargs)
+    index.save(out_path or default_path(db_path))
+    return index
+
+
+def _synthetic(n: int, dim: int, clusters: int, noise: float, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim), dtype=np.float32)
+    data = np.empty((n, dim), dtype=np.float32)
+    for start in range(0, n, 65536):
+        end = min(n, start + 65536)
+        data[start:end] = centers[rng.integers(0, clusters, end - start)]
+        data[start:end] += noise * rng.standard_normal((end - start, dim), dtype=np.float32)
+    return _normalize(data)
+
+
+def recall_benchmark(
+    vectors: np.ndarray,
+    index: IVFFlatIndex,
+    queries: np.ndarray,
+    *,
+    k: int,
+    nprobes: List[int],
+) -> List[Dict[str, float]]:
+    """recall@k and latency of ``index`` against an exact scan of ``vectors``."""
+    exact_ids = []
+    exact_ms = []
+    for q in queries:
+        t0 = time.perf_counter()
+        scores = vectors @ q
+        top = np.argpartition(-scores, k - 1)[:k]
+        exact_ms.append((time.perf_counter() - t0) * 1000)
+        exact_ids.append(set(top.tolist()))
+    pos_to_row = index.ids  # ids are row numbers for benchmark data
+    results = []
+    for nprobe in nprobes:
+        hits = 0
+        timings = []
+        for q, truth in zip(queries, exact_ids):
+            t0 = time.perf_counter()
+            _, pos = index.search(q, k, nprobe)
+            timings.append((time.perf_counter() - t0) * 1000)
+            hits += len(truth & set(pos_to_row[pos].tolist()))
+        timings.sort()
+        results.append({
+            "nprobe": nprobe,
+            f"recall@{k}": round(hits / (k * len(queries)), 4),
+            "p50_ms": round(statistics.median(timings), 3),
+            "p95_ms": round(timings[int(0.95 * (len(timings) - 1))], 3),
+            "exact_p50_ms": round(statistics.median(exact_ms), 3),
+        })
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    b = sub.add_parser("build", help="build the ANN index for a database")
+    b.add_argument("--db", default=os.getenv("DB_PATH", "data/contoso.db"))
+    b.add_argument("--out", default=None, help="index directory (default: <db>.ivf)")
+    b.add_argument("--nlist", type=int, default=None, help="number of cells (default: sqrt(n))")
+    b.add_argument("--niter", type=int, default=15)
+    b.add_argument("--train-size", type=int, default=None)
+    b.add_argument("--seed", type=int, default=0)
+
+    r = sub.add_parser("bench", help="recall@k / latency against exact search")
+    r.add_argument("--db", default=None, help="use the KB of this database instead of synthetic data")
+    r.add_argument("--n", type=int, default=200_000)
+    r.add_argument("--dim", type=int, default=1536)
+    r.add_argument("--clusters", type=int, default=2000)
+    r.add_argument("--noise", type=float, default=1.0, help="within-cluster spread of synthetic data")
+    r.add_argument("--nlist", type=int, default=None)
+    r.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16])
+    r.add_argument("--queries", type=int, default=200)
+    r.add_argument("--k", type=int, default=10)
+    r.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.cmd == "build":
+        t0 = time.perf_counter()
+        index = build_from_db(args.db, args.out, nlist=args.nlist, niter=args.niter,
+                              train_size=args.train_size, seed=args.seed)
+        print(f"✅  IVF index with {len(index)} vectors in {index.nlist} cells "
+              f"built in {time.perf_counter() - t0:.1f}s → {args.out or default_path(args.db)}")
+        return
+
+    if args.db:
+        from kb_index import read_embeddings
+
+        db = sqlite3.connect(args.db)
+        vectors = read_embeddings(db)[1]
+        db.close()
+    else:
+        vectors = _synthetic(args.n, args.dim, args.clusters, args.noise, args.seed)
+    t0 = time.perf_counter()
+    index = IVFFlatIndex.build(vectors, np.arange(len(vectors)), nlist=args.nlist, seed=args.seed)
+    build_s = time.perf_counter() - t0
+    rng = np.random.default_rng(args.seed + 1)
+    queries = vectors[rng.choice(len(vectors), min(args.queries, len(vectors)), replace=False)].copy()
+    queries += 0.05 * rng.standard_normal(queries.shape, dtype=np.float32)
+    queries = _normalize(queries)
+    results = recall_benchmark(vectors, index, queries, k=min(args.k, len(vectors)), nprobes=args.nprobe)
+    print(json.dumps({"n": len(vectors), "dim": int(vectors.shape[1]), "nlist": index.nlist,
+                      "build_s": round(build_s, 2), "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
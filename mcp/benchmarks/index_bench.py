@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Before/after benchmark for ``migrate_indexes`` at 100x the scenario data.
+
+``create_db.py`` seeds 250 customers with ~11 invoices and 60 days of usage
+each, 120 orders, 40 security-log events, ...  This script generates the same
+shape of data ``--scale`` times larger (default 100: 25k customers, ~275k
+invoices and payments, 1.5M usage rows), loads it with the *original* index
+set, times the hot tool functions, applies ``migrate_indexes.migrate`` and
+times them again.
+
+Run from the ``mcp`` directory::
+
+    python benchmarks/index_bench.py                 # 100x
+    python benchmarks/index_bench.py --scale 10 --calls 200
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+MCP_DIR = Path(__file__).resolve().parents[1]
+sys.path[:0] = [str(MCP_DIR), str(MCP_DIR / "data")]
+
+import contoso_tools  # noqa: E402
+import migrate_indexes  # noqa: E402
+from create_db import create_tables  # noqa: E402
+from db_pool import close_pools  # noqa: E402
+from migrate_schema import migrate  # noqa: E402
+
+# The indexes create_db.py shipped with before migrate_indexes existed.
+LEGACY_INDEXES = [
+    "CREATE INDEX idx_subs_customer ON Subscriptions(customer_id)",
+    "CREATE INDEX idx_inv_sub       ON Invoices(subscription_id)",
+    "CREATE INDEX idx_pay_inv       ON Payments(invoice_id)",
+    "CREATE INDEX idx_usage_sub     ON DataUsage(subscription_id)",
+    "CREATE INDEX idx_tickets_cust  ON SupportTickets(customer_id)",
+    "CREATE INDEX idx_tickets_sub   ON SupportTickets(subscription_id)",
+    "CREATE INDEX idx_inc_sub       ON ServiceIncidents(subscription_id)",
+]
+
+TODAY = date(2025, 1, 31)
+
+
+def _day(offset: int) -> str:
+    return (TODAY - timedelta(days=offset)).isoformat()
+
+
+def build_db(path: str, scale: int, seed: int = 42) -> Dict[str, int]:
+    """Scenario-shaped random data, ``scale`` times the create_db.py volume."""
+    rng = random.Random(seed)
+    n_customers = 250 * scale
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = OFF")
+    create_tables(conn)
+    for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL").fetchall():
+        conn.execute(f"DROP INDEX {name}")
+    for ddl in LEGACY_INDEXES:
+        conn.execute(ddl)
+
+    with conn:
+        conn.executemany(
+            "INSERT INTO Products(name,description,category,monthly_fee) VALUES (?,?,?,?)",
+            [("Mobile", "", "mobile", 50.0), ("Internet", "", "internet", 60.0),
+             ("Bundle", "", "bundle", 90.0), ("Roaming", "", "addon", 20.0)],
+        )
+        conn.executemany(
+            "INSERT INTO Customers(first_name,last_name,email,loyalty_level) VALUES (?,?,?,?)",
+            ((f"First{i}", f"Last{i}", f"user{i}@example.com", rng.choice(["Bronze", "Silver", "Gold"]))
+             for i in range(n_customers)),
+        )
+        conn.executemany(
+            """INSERT INTO Subscriptions(customer_id,product_id,start_date,end_date,status,service_status)
+               VALUES (?,?,?,?,'active','normal')""",
+            ((cid, rng.randint(1, 4), _day(400), _day(-365)) for cid in range(1, n_customers + 1)),
+        )
+        invoices, payments = [], []
+        for sub_id in range(1, n_customers + 1):
+            for _ in range(rng.randint(8, 14)):
+                amount = round(rng.uniform(40, 130), 2)
+                invoices.append((sub_id, _day(rng.randint(1, 120)), amount, "monthly", _day(0)))
+                status = rng.choices(["successful", "failed", "partial"], [0.75, 0.10, 0.15])[0]
+                payments.append((len(invoices), _day(0), amount if status == "successful" else amount / 2,
+                                 "ach", status))
+        conn.executemany(
+            "INSERT INTO Invoices(subscription_id,invoice_date,amount,description,due_date) VALUES (?,?,?,?,?)",
+            invoices,
+        )
+        conn.executemany(
+            "INSERT INTO Payments(invoice_id,payment_date,amount,method,status) VALUES (?,?,?,?,?)",
+            payments,
+        )
+        conn.executemany(
+            "INSERT INTO DataUsage(subscription_id,usage_date,data_used_mb,voice_minutes,sms_count) VALUES (?,?,?,?,?)",
+            ((sub_id, _day(d), rng.randint(50, 1200), rng.randint(0, 60), rng.randint(0, 40))
+             for sub_id in range(1, n_customers + 1) for d in range(60)),
+        )
+        conn.executemany(
+            """INSERT INTO SupportTickets(customer_id,subscription_id,category,opened_at,status,priority,subject)
+               VALUES (?,?,'billing',?,?,'normal','bench')""",
+            ((rng.randint(1, n_customers), rng.randint(1, n_customers), _day(rng.randint(1, 80)),
+              rng.choice(["open", "pending", "closed"])) for _ in range(120 * scale)),
+        )
+        conn.executemany(
+            "INSERT INTO SecurityLogs(customer_id,event_type,event_timestamp,description) VALUES (?,?,?,'bench')",
+            ((rng.randint(1, n_customers), rng.choice(["login_attempt", "account_locked"]),
+              f"{_day(rng.randint(0, 3))} 12:{rng.randint(0, 59):02d}:00") for _ in range(40 * scale)),
+        )
+        conn.executemany(
+            "INSERT INTO Orders(customer_id,product_id,order_date,amount,order_status) VALUES (?,?,?,?,'delivered')",
+            ((rng.randint(1, n_customers), rng.randint(1, 4), _day(rng.randint(1, 120)),
+              round(rng.uniform(10, 100), 2)) for _ in range(120 * scale)),
+        )
+        conn.executemany(
+            "INSERT INTO ServiceIncidents(subscription_id,incident_date,description,resolution_status) VALUES (?,?,'bench','resolved')",
+            ((rng.randint(1, n_customers), _day(rng.randint(1, 90))) for _ in range(60 * scale)),
+        )
+    migrate(conn)  # derived tables the tools read; not part of the index comparison
+    counts = {t: conn.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0]
+              for t in ("Customers", "Invoices", "Payments", "DataUsage", "SecurityLogs", "Orders")}
+    conn.close()
+    return counts
+
+
+def workloads(n_customers: int) -> Dict[str, Callable[[random.Random], Any]]:
+    ct = contoso_tools
+    return {
+        "get_security_logs": lambda r: ct.get_security_logs_async(r.randint(1, n_customers)),
+        "get_customer_orders": lambda r: ct.get_customer_orders_async(r.randint(1, n_customers)),
+        "unlock_account": lambda r: ct.unlock_account_async(r.randint(1, n_customers)),
+        "get_data_usage(30d)": lambda r: ct.get_data_usage_async(r.randint(1, n_customers), _day(30), _day(0)),
+        "get_billing_summary": lambda r: ct.get_billing_summary_async(r.randint(1, n_customers)),
+        "get_subscription_detail": lambda r: ct.get_subscription_detail_async(r.randint(1, n_customers)),
+        "get_support_tickets(open)": lambda r: ct.get_support_tickets_async(r.randint(1, n_customers), True),
+    }
+
+
+async def measure(n_customers: int, calls: int, seed: int = 1) -> Dict[str, Dict[str, float]]:
+    results = {}
+    for name, make_call in workloads(n_customers).items():
+        # Warm the pool's connections/statement caches on different keys first.
+        warm = random.Random(seed + 1)
+        for _ in range(min(calls, 20)):
+            try:
+                await make_call(warm)
+            except ValueError:
+                pass
+        rng = random.Random(seed)
+        timings: List[float] = []
+        for _ in range(calls):
+            t0 = time.perf_counter()
+            try:
+                await make_call(rng)
+            except ValueError:
+                pass  # e.g. nothing to unlock
+            timings.append((time.perf_counter() - t0) * 1000)
+        timings.sort()
+        results[name] = {
+            "p50_ms": round(statistics.median(timings), 3),
+            "p95_ms": round(timings[int(len(timings) * 0.95) - 1], 3),
+        }
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", type=int, default=100)
+    parser.add_argument("--calls", type=int, default=100, help="calls per tool and phase")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "index_bench.db")
+        t0 = time.perf_counter()
+        counts = build_db(path, args.scale)
+        print(f"built {counts} in {time.perf_counter() - t0:.1f}s")
+        contoso_tools.DB_PATH = path
+        n_customers = counts["Customers"]
+
+        before = asyncio.run(measure(n_customers, args.calls))
+        close_pools()
+        db = sqlite3.connect(path)
+        t0 = time.perf_counter()
+        changes = migrate_indexes.migrate(db)
+        db.close()
+        print(f"migrated in {time.perf_counter() - t0:.1f}s: {changes}")
+        after = asyncio.run(measure(n_customers, args.calls))
+        close_pools()
+
+    print(f"\n{'tool':<28}{'before p50':>12}{'after p50':>12}{'speedup':>10}")
+    for name in before:
+        b, a = before[name]["p50_ms"], after[name]["p50_ms"]
+        print(f"{name:<28}{b:>10.3f}ms{a:>10.3f}ms{b / a if a else float('inf'):>9.1f}x")
+    print(json.dumps({"scale": args.scale, "rows": counts, "before": before, "after": after}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Per-tool CPU cost of turning ``contoso_tools`` results into MCP tool results.
+
+For each read tool the data is fetched once, then the conversion alone is
+timed (``time.process_time``) in two ways:
+
+* ``validated`` – build the Pydantic models and let FastMCP serialise them
+  (JSON text content + ``structuredContent``), as the tools used to
+* ``trusted``   – ``tool_results.trusted_result`` (project the dicts, one
+  ``pydantic_core`` serialisation, ready ``ToolResult``)
+
+Besides the tools' real data it times a synthetic subscription with
+``--invoices`` invoices to show how the gap grows with result size.  Run
+from the ``mcp`` directory::
+
+    python benchmarks/serialization_bench.py --db data/contoso.db --invoices 1000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+MCP_DIR = Path(__file__).resolve().parents[1]
+sys.path[:0] = [str(MCP_DIR), str(MCP_DIR / "data"), str(MCP_DIR / "benchmarks")]
+os.environ.setdefault("DISABLE_AUTH", "true")
+
+import contoso_tools  # noqa: E402
+import mcp_service as svc  # noqa: E402
+from db_pool import close_pools  # noqa: E402
+from migrate_schema import migrate, prepare_database  # noqa: E402
+from fastmcp.tools.tool import ToolResult, _convert_to_content  # noqa: E402
+from subscription_detail_bench import build_db  # noqa: E402
+from tool_results import _adapter, trusted_result  # noqa: E402
+
+
+def validated(tp: Any, data: Any) -> ToolResult:
+    """What FastMCP does with a tool that returns validated models."""
+    result = _adapter(tp).validate_python(data)
+    structured = {"result": result} if isinstance(result, list) else result
+    return ToolResult(content=_convert_to_content(result), structured_content=structured)
+
+
+async def fetch(db: sqlite3.Connection) -> List[Tuple[str, Any, Any]]:
+    """(tool, declared type, data) using real ids from the database."""
+    ct = contoso_tools
+    cid, sid = db.execute("SELECT customer_id, subscription_id FROM Subscriptions LIMIT 1").fetchone()
+    iid = db.execute("SELECT MIN(invoice_id) FROM Invoices").fetchone()[0]
+    end = db.execute("SELECT MAX(usage_date) FROM DataUsage").fetchone()[0] or "2025-01-31"
+    subs = [r[0] for r in db.execute("SELECT subscription_id FROM Subscriptions LIMIT 20")]
+    details = await ct.get_subscription_details_async(subs)
+    return [
+        ("get_all_customers", List[svc.CustomerSummary], await ct.get_all_customers_async()),
+        ("list_customers", svc.CustomerPage, await ct.get_customers_page_async(100)),
+        ("get_customer_detail", svc.CustomerDetail, await ct.get_customer_detail_async(cid)),
+        ("get_subscription_detail", svc.SubscriptionDetail, await ct.get_subscription_detail_async(sid)),
+        ("get_subscription_details(20)", List[svc.SubscriptionDetailResult],
+         [{"subscription_id": i["id"], "subscription": i["result"], "error": i["error"]} for i in details]),
+        ("get_invoice_payments", List[svc.Payment], await ct.get_invoice_payments_async(iid)),
+        ("get_data_usage", List[svc.DataUsageRecord], await ct.get_data_usage_async(sid, "0000-01-01", end)),
+        ("get_promotions", List[svc.Promotion], await ct.get_promotions_async()),
+        ("get_security_logs", List[svc.SecurityLog], await ct.get_security_logs_async(cid)),
+        ("get_support_tickets", List[svc.SupportTicket], await ct.get_support_tickets_async(cid)),
+        ("get_products", List[svc.Product], await ct.get_products_async()),
+    ]
+
+
+def cpu_us(fn: Callable[[], Any], repeat: int) -> float:
+    fn()
+    timings = []
+    for _ in range(repeat):
+        t0 = time.process_time()
+        fn()
+        timings.append((time.process_time() - t0) * 1e6)
+    return round(statistics.median(timings), 1)
+
+
+def compare(cases: List[Tuple[str, Any, Any]], repeat: int) -> List[Dict[str, Any]]:
+    rows = []
+    for name, tp, data in cases:
+        slow = validated(tp, data)
+        fast = trusted_result(tp, data)
+        assert json.loads(fast.content[0].text) == json.loads(slow.content[0].text), name
+        assert fast.structured_content == slow.structured_content, name
+        rows.append({
+            "tool": name,
+            "bytes": len(fast.content[0].text),
+            "validated_us": cpu_us(lambda: validated(tp, data), repeat),
+            "trusted_us": cpu_us(lambda: trusted_result(tp, data), repeat),
+        })
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default=os.getenv("DB_PATH", "data/contoso.db"))
+    parser.add_argument("--invoices", type=int, default=1000, help="invoices on the synthetic subscription")
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        scratch = os.path.join(tmp, "scenario.db")
+        shutil.copyfile(args.db, scratch)
+        prepare_database(scratch)
+        contoso_tools.DB_PATH = scratch
+        with sqlite3.connect(scratch) as db:
+            cases = asyncio.run(fetch(db))
+        close_pools()
+        path = os.path.join(tmp, "serialization_bench.db")
+        build_db(path, args.invoices)
+        with sqlite3.connect(path) as db:
+            migrate(db)
+        contoso_tools.DB_PATH = path
+        big = asyncio.run(contoso_tools.get_subscription_detail_async(1))
+        close_pools()
+    cases.append((f"get_subscription_detail({args.invoices} inv)", svc.SubscriptionDetail, big))
+
+    results = compare(cases, args.repeat)
+    print(f"{'tool':<36}{'bytes':>9}{'validated':>12}{'trusted':>11}{'speedup':>9}")
+    for r in results:
+        v, t = r["validated_us"], r["trusted_us"]
+        print(f"{r['tool']:<36}{r['bytes']:>9}{v:>10.1f}us{t:>9.1f}us{v / t if t else float('inf'):>8.1f}x")
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
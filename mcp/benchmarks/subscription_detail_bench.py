@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Regression benchmark for the subscription-detail loader.
+
+Builds a throw-away database with a single subscription holding N invoices
+(each with one or two payments) and reports, per N, the number of SQL
+statements and the median latency of
+
+* ``legacy``  – the old per-invoice N+1 payment lookup, kept here as a baseline
+* ``current`` – ``contoso_tools._load_subscription_detail`` (constant queries)
+
+Run from the ``mcp`` directory::
+
+    python benchmarks/subscription_detail_bench.py --invoices 10 100 1000 5000
+"""
+
+import argparse
+import json
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+MCP_DIR = Path(__file__).resolve().parents[1]
+sys.path[:0] = [str(MCP_DIR), str(MCP_DIR / "data")]
+
+from contoso_tools import _load_subscription_detail  # noqa: E402
+from create_db import create_tables  # noqa: E402
+from invoice_balances import ensure_invoice_balances  # noqa: E402
+
+
+def build_db(path: str, n_invoices: int, seed: int = 7) -> None:
+    rng = random.Random(seed)
+    with sqlite3.connect(path) as conn:
+        create_tables(conn)
+        ensure_invoice_balances(conn)
+        conn.execute(
+            "INSERT INTO Customers(first_name,last_name,email,loyalty_level) VALUES ('Bench','User','bench@example.com','Gold')"
+        )
+        conn.execute(
+            "INSERT INTO Products(name,description,category,monthly_fee) VALUES ('Bench Plan','bench','mobile',50.0)"
+        )
+        conn.execute(
+            """INSERT INTO Subscriptions(customer_id,product_id,start_date,end_date,status,service_status)
+               VALUES (1,1,'2024-01-01','2025-01-01','active','normal')"""
+        )
+        conn.executemany(
+            "INSERT INTO Invoices(subscription_id,invoice_date,amount,description,due_date) VALUES (1,?,?,?,?)",
+            [("2024-01-01", round(rng.uniform(40, 130), 2), "bench invoice", "2024-01-15") for _ in range(n_invoices)],
+        )
+        payments = []
+        for inv_id in range(1, n_invoices + 1):
+            for _ in range(rng.randint(1, 2)):
+                payments.append((inv_id, "2024-01-10", round(rng.uniform(10, 60), 2), "ach",
+                                 rng.choice(["successful", "failed", "partial"])))
+        conn.executemany(
+            "INSERT INTO Payments(invoice_id,payment_date,amount,method,status) VALUES (?,?,?,?,?)",
+            payments,
+        )
+
+
+def legacy_load(db: sqlite3.Connection, subscription_id: int) -> Dict[str, Any]:
+    """The pre-optimisation implementation (one payments query per invoice)."""
+    sub = db.execute(
+        """SELECT s.*, p.name AS product_name, p.description AS product_description,
+                  p.category, p.monthly_fee
+           FROM Subscriptions s JOIN Products p ON p.product_id = s.product_id
+           WHERE s.subscription_id = ?""",
+        (subscription_id,),
+    ).fetchone()
+    invoices = []
+    for inv in db.execute(
+        "SELECT invoice_id, invoice_date, amount, description, due_date FROM Invoices WHERE subscription_id = ?",
+        (subscription_id,),
+    ).fetchall():
+        pay_rows = db.execute("SELECT * FROM Payments WHERE invoice_id = ?", (inv["invoice_id"],)).fetchall()
+        total_paid = sum(p["amount"] for p in pay_rows if p["status"] == "successful")
+        invoices.append({**dict(inv), "payments": [dict(p) for p in pay_rows],
+                         "outstanding": max(inv["amount"] - total_paid, 0.0)})
+    incidents = db.execute(
+        "SELECT incident_id, incident_date, description, resolution_status FROM ServiceIncidents WHERE subscription_id = ?",
+        (subscription_id,),
+    ).fetchall()
+    return {**dict(sub), "invoices": invoices, "service_incidents": [dict(r) for r in incidents]}
+
+
+def measure(db: sqlite3.Connection, loader: Callable, repeat: int) -> Dict[str, float]:
+    statements: List[str] = []
+    db.set_trace_callback(statements.append)
+    loader(db, 1)
+    db.set_trace_callback(None)
+    timings = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        loader(db, 1)
+        timings.append((time.perf_counter() - t0) * 1000)
+    return {"queries": len(statements), "median_ms": round(statistics.median(timings), 3)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--invoices", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in args.invoices:
+            path = os.path.join(tmp, f"bench_{n}.db")
+            build_db(path, n)
+            db = sqlite3.connect(path)
+            db.row_factory = sqlite3.Row
+            legacy = measure(db, legacy_load, args.repeat)
+            current = measure(db, _load_subscription_detail, args.repeat)
+            db.close()
+            results.append({"invoices": n, "legacy": legacy, "current": current})
+            print(
+                f"invoices={n:>6}  legacy: {legacy['queries']:>6} queries {legacy['median_ms']:>9.3f} ms   "
+                f"current: {current['queries']:>2} queries {current['median_ms']:>9.3f} ms"
+            )
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
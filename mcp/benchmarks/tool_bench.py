@@ -0,0 +1,456 @@
+#!/usr/bin/env python3
+"""
+Latency, throughput and allocation benchmark for every ``mcp_service`` tool.
+
+Tool calls go through a real MCP client, either in-process
+(``--transport inproc``, FastMCP's in-memory transport) or over streamable
+HTTP (``--transport http``), which starts the server on a local port.
+Each run works on a scratch copy of ``--db``.  Pass ``--scale N`` to build
+one with ``data/create_db.py --scale N`` first.
+
+For every ``--concurrency`` level, ``--calls`` calls are made by that many
+concurrent client sessions.  The calls are a seeded random mix of the read
+tools and, with probability ``--write-ratio``, the write tools, all called
+with ids sampled from the database.  ``tool[variant]`` entries are the same
+tool with different arguments (e.g. ``fields`` / ``max_items``).  Reported per tool and overall:
+
+* calls, errors, throughput (calls/s)
+* p50 / p95 / p99 / mean latency (client side, ms)
+* allocations: peak and retained KiB per call, measured with
+  ``tracemalloc`` in a separate in-process pass so it does not skew latency
+
+No Azure access is needed.  ``--embedder stub`` (default) serves KB search
+from deterministic hash-based vectors through the real embedding service.
+``zero`` uses the zero-vector fallback, and ``live`` uses whatever
+credentials are configured.  Results go to ``--out`` as JSON.
+``--compare old.json`` flags tools whose p95 regressed by more than
+``--threshold`` and exits non-zero.  Run from the ``mcp`` directory::
+
+    python benchmarks/tool_bench.py --concurrency 1 8 32 --out bench.json
+    python benchmarks/tool_bench.py --scale 100000 --transport http --compare bench.json
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+MCP_DIR = Path(__file__).resolve().parents[1]
+sys.path[:0] = [str(MCP_DIR)]
+os.environ.setdefault("DISABLE_AUTH", "true")
+
+import numpy as np  # noqa: E402
+
+Args = Dict[str, Any]
+Sampler = Callable[[random.Random, Dict[str, Any]], Args]
+
+# ─────────────────────────────  WORKLOAD  ──────────────────────────────
+READ_TOOLS: Dict[str, Sampler] = {
+    "get_all_customers": lambda r, s: {},
+    "list_customers": lambda r, s: {"limit": 50, "after_id": r.choice(s["customers"])},
+    "export_customers": lambda r, s: {"after_id": r.choice(s["customers"]), "max_rows": 500},
+    "get_customer_detail": lambda r, s: {"customer_id": r.choice(s["customers"])},
+    "get_customer_detail[fields]": lambda r, s: {
+        "customer_id": r.choice(s["customers"]), "fields": ["customer_id", "first_name", "subscriptions"], "max_items": 3,
+    },
+    "get_customer_details": lambda r, s: {"customer_ids": r.sample(s["customers"], min(20, len(s["customers"])))},
+    "get_subscription_detail": lambda r, s: {"subscription_id": r.choice(s["subscriptions"])},
+    "get_subscription_details": lambda r, s: {
+        "subscription_ids": r.sample(s["subscriptions"], min(20, len(s["subscriptions"]))), "max_items": 5,
+    },
+    "get_invoice_payments": lambda r, s: {"invoice_id": r.choice(s["invoices"])},
+    "get_invoices_payments": lambda r, s: {"invoice_ids": r.sample(s["invoices"], min(20, len(s["invoices"])))},
+    "get_data_usage": lambda r, s: {
+        "subscription_id": r.choice(s["subscriptions"]), "start_date": s["usage_start"],
+        "end_date": s["usage_end"], "aggregate": r.random() < 0.5,
+    },
+    "get_data_usage_page": lambda r, s: {
+        "subscription_id": r.choice(s["subscriptions"]), "start_date": s["usage_start"],
+        "end_date": s["usage_end"], "limit": 30,
+    },
+    "get_billing_summary": lambda r, s: {"customer_id": r.choice(s["customers"])},
+    "get_promotions": lambda r, s: {},
+    "get_eligible_promotions": lambda r, s: {"customer_id": r.choice(s["customers"])},
+    "search_knowledge_base": lambda r, s: {
+        "query": r.choice(["roaming charges abroad", "data overage policy", "how do I reset my password",
+                           "slow internet speed", "refund for outage", "upgrade my plan"]),
+        "mode": r.choice(["hybrid", "vector", "lexical"]),
+    },
+    "get_security_logs": lambda r, s: {"customer_id": r.choice(s["customers"])},
+    "get_customer_orders": lambda r, s: {"customer_id": r.choice(s["customers"])},
+    "get_support_tickets": lambda r, s: {"customer_id": r.choice(s["customers"]), "open_only": r.random() < 0.5},
+    "get_products": lambda r, s: {},
+    "get_product_detail": lambda r, s: {"product_id": r.choice(s["products"])},
+}
+
+WRITE_TOOLS: Dict[str, Sampler] = {
+    "pay_invoice": lambda r, s: {"invoice_id": r.choice(s["invoices"]), "amount": 0.01},
+    "create_support_ticket": lambda r, s: {
+        "customer_id": r.choice(s["customers"]), "subscription_id": r.choice(s["subscriptions"]),
+        "category": "billing", "priority": "low", "subject": "benchmark", "description": "tool_bench",
+    },
+    "update_subscription": lambda r, s: {"subscription_id": r.choice(s["subscriptions"]),
+                                         "roaming_enabled": r.randint(0, 1)},
+    "unlock_account": lambda r, s: {"customer_id": r.choice(s["locked_customers"])},
+}
+
+
+def tool_name(label: str) -> str:
+    """``get_customer_detail[fields]`` → ``get_customer_detail`` (argument variants share a tool)."""
+    return label.split("[", 1)[0]
+
+
+def sample_ids(path: str, seed: int, limit: int = 2000) -> Dict[str, Any]:
+    """Random real keys (and the usage date range) to call the tools with."""
+    with sqlite3.connect(path) as db:
+        def ids(sql: str) -> List[int]:
+            return [r[0] for r in db.execute(sql, (seed, limit))]
+
+        start, end = db.execute("SELECT MIN(usage_date), MAX(usage_date) FROM DataUsage").fetchone()
+        return {
+            # ORDER BY a seeded hash: a stable random sample without a full sort in Python.
+            "customers": ids("SELECT customer_id FROM Customers ORDER BY (customer_id * 2654435761 + ?) % 4294967296 LIMIT ?"),
+            "subscriptions": ids("SELECT subscription_id FROM Subscriptions "
+                                 "ORDER BY (subscription_id * 2654435761 + ?) % 4294967296 LIMIT ?"),
+            "invoices": ids("SELECT invoice_id FROM Invoices ORDER BY (invoice_id * 2654435761 + ?) % 4294967296 LIMIT ?"),
+            "products": [r[0] for r in db.execute("SELECT product_id FROM Products")],
+            "locked_customers": [r[0] for r in db.execute(
+                "SELECT DISTINCT customer_id FROM SecurityLogs WHERE event_type = 'account_locked' LIMIT 200")] or [1],
+            "usage_start": start or "2024-01-01",
+            "usage_end": end or "2025-12-31",
+        }
+
+
+def schedule(calls: int, write_ratio: float, seed: int, ids: Dict[str, Any],
+             only: Optional[List[str]] = None) -> List[Tuple[str, Args]]:
+    rng = random.Random(seed)
+    reads = [t for t in READ_TOOLS if not only or t in only]
+    writes = [t for t in WRITE_TOOLS if not only or t in only]
+    plan = []
+    for _ in range(calls):
+        if writes and (not reads or rng.random() < write_ratio):
+            tool = rng.choice(writes)
+            plan.append((tool, WRITE_TOOLS[tool](rng, ids)))
+        else:
+            tool = rng.choice(reads)
+            plan.append((tool, READ_TOOLS[tool](rng, ids)))
+    return plan
+
+
+# ─────────────────────────────  EMBEDDINGS  ────────────────────────────
+class StubEmbeddings:
+    """Offline ``client.embeddings``: deterministic unit vectors from a text hash."""
+
+    def __init__(self, dim: int = 1536):
+        self.dim = dim
+
+    def vector(self, text: str) -> List[float]:
+        seed = int.from_bytes(hashlib.sha256(text.casefold().encode()).digest()[:8], "little")
+        v = np.random.default_rng(seed).standard_normal(self.dim).astype(np.float32)
+        return (v / np.linalg.norm(v)).tolist()
+
+    async def create(self, input: List[str], model: Any = None) -> Any:
+        return SimpleNamespace(data=[SimpleNamespace(index=i, embedding=self.vector(t)) for i, t in enumerate(input)])
+
+
+def use_embedder(kind: str) -> None:
+    import contoso_tools
+
+    service = contoso_tools.embedding_service
+    if kind == "live":
+        return
+    service.client = None if kind == "zero" else SimpleNamespace(embeddings=StubEmbeddings(service.dim))
+    service._disk = None  # keep fake vectors out of the shared on-disk cache
+    service.clear()
+
+
+# ─────────────────────────────  SERVER  ────────────────────────────────
+def load_server(db: str, embedder: str) -> Any:
+    os.environ["DB_PATH"] = db
+    import contoso_tools
+    import mcp_service
+
+    contoso_tools.DB_PATH = db
+    use_embedder(embedder)
+    return mcp_service.mcp
+
+
+def serve(port: int, db: str, embedder: str) -> None:
+    """``--serve``: the server side of ``--transport http``."""
+    import uvicorn
+
+    app = load_server(db, embedder).http_app(transport="http")
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning")
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_http_server(db: str, embedder: str) -> Tuple[subprocess.Popen, str]:
+    port = _free_port()
+    proc = subprocess.Popen(
+        [sys.executable, __file__, "--serve", str(port), "--db", db, "--embedder", embedder],
+        cwd=MCP_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        with socket.socket() as s:
+            if s.connect_ex(("127.0.0.1", port)) == 0:
+                return proc, f"http://127.0.0.1:{port}/mcp"
+        if proc.poll() is not None:
+            break
+        time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError("benchmark HTTP server did not start")
+
+
+# ─────────────────────────────  MEASURE  ───────────────────────────────
+def percentile(sorted_values: List[float], q: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, max(0, int(round(q * len(sorted_values))) - 1))]
+
+
+def summarise(latencies: List[float], errors: int, elapsed: float) -> Dict[str, Any]:
+    values = sorted(latencies)
+    ms = lambda v: None if v is None else round(v * 1000, 3)  # noqa: E731
+    return {
+        "calls": len(values) + errors,
+        "errors": errors,
+        "throughput_rps": round(len(values) / elapsed, 1) if elapsed else None,
+        "p50_ms": ms(percentile(values, 0.50)),
+        "p95_ms": ms(percentile(values, 0.95)),
+        "p99_ms": ms(percentile(values, 0.99)),
+        "mean_ms": ms(sum(values) / len(values)) if values else None,
+    }
+
+
+async def run_level(target: Any, plan: List[Tuple[str, Args]], concurrency: int, warm: List[Tuple[str, Args]]) -> Dict[str, Any]:
+    from contextlib import AsyncExitStack
+
+    from fastmcp import Client
+
+    latencies: Dict[str, List[float]] = {}
+    errors: Dict[str, int] = {}
+    messages: Dict[str, str] = {}
+    work = iter(plan)
+
+    async def session(client: Any) -> None:
+        for tool, args in work:
+            t0 = time.perf_counter()
+            try:
+                result = await client.call_tool(tool_name(tool), args, raise_on_error=False)
+                failed = result.is_error
+                if failed:
+                    messages.setdefault(tool, (result.content[0].text if result.content else "")[:200])
+            except Exception as exc:
+                failed = True
+                messages.setdefault(tool, repr(exc)[:200])
+            elapsed = time.perf_counter() - t0
+            if failed:
+                errors[tool] = errors.get(tool, 0) + 1
+            else:
+                latencies.setdefault(tool, []).append(elapsed)
+
+    async with AsyncExitStack() as stack:
+        # Connect and warm every session first, so the clock only sees tool calls.
+        clients = [await stack.enter_async_context(Client(target)) for _ in range(concurrency)]
+        for i, (tool, args) in enumerate(warm):
+            await clients[i % concurrency].call_tool(tool_name(tool), args, raise_on_error=False)
+        t0 = time.perf_counter()
+        await asyncio.gather(*(session(client) for client in clients))
+        elapsed = time.perf_counter() - t0
+
+    tools = {
+        tool: summarise(latencies.get(tool, []), errors.get(tool, 0), elapsed)
+        for tool in sorted(set(latencies) | set(errors))
+    }
+    for tool, message in messages.items():
+        tools[tool]["first_error"] = message
+    overall = summarise([v for vs in latencies.values() for v in vs], sum(errors.values()), elapsed)
+    return {"concurrency": concurrency, "elapsed_s": round(elapsed, 3), **overall, "tools": tools}
+
+
+async def measure_allocations(target: Any, ids: Dict[str, Any], samples: int, seed: int) -> Dict[str, Any]:
+    """Peak / retained traced memory per call, in-process, one tool at a time."""
+    from fastmcp import Client
+
+    rng = random.Random(seed)
+    results = {}
+    async with Client(target) as client:
+        for tool, sampler in {**READ_TOOLS, **WRITE_TOOLS}.items():
+            calls = [sampler(rng, ids) for _ in range(samples + 1)]
+            await client.call_tool(tool_name(tool), calls[0], raise_on_error=False)  # warm caches
+            peaks, retained = [], []
+            tracemalloc.start()
+            try:
+                for args in calls[1:]:
+                    before = tracemalloc.get_traced_memory()[0]
+                    tracemalloc.reset_peak()
+                    await client.call_tool(tool_name(tool), args, raise_on_error=False)
+                    current, peak = tracemalloc.get_traced_memory()
+                    peaks.append(peak - before)
+                    retained.append(current - before)
+            finally:
+                tracemalloc.stop()
+            peaks.sort()
+            retained.sort()
+            results[tool] = {
+                "peak_kib_p50": round(percentile(peaks, 0.5) / 1024, 1),
+                "peak_kib_max": round(peaks[-1] / 1024, 1),
+                "retained_kib_p50": round(percentile(retained, 0.5) / 1024, 1),
+            }
+    return results
+
+
+# ─────────────────────────────  COMPARE  ───────────────────────────────
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """``tool@concurrency`` entries whose p95 grew by more than ``threshold``x."""
+    old = {(r["concurrency"], t): v for r in baseline["sweep"] for t, v in r["tools"].items()}
+    regressions = []
+    print(f"\n{'tool':<28}{'conc':>5}{'old p95':>11}{'new p95':>11}{'ratio':>8}")
+    for level in current["sweep"]:
+        for tool, new in level["tools"].items():
+            prev = old.get((level["concurrency"], tool))
+            if not prev or not prev["p95_ms"] or not new["p95_ms"]:
+                continue
+            ratio = new["p95_ms"] / prev["p95_ms"]
+            flag = "  ❌" if ratio > threshold else ""
+            print(f"{tool:<28}{level['concurrency']:>5}{prev['p95_ms']:>9.2f}ms{new['p95_ms']:>9.2f}ms{ratio:>7.2f}x{flag}")
+            if ratio > threshold:
+                regressions.append(f"{tool}@{level['concurrency']}")
+    return regressions
+
+
+# ──────────────────────────────  MAIN  ─────────────────────────────────
+def build_scaled_db(customers: int, seed: int, directory: str) -> str:
+    out = os.path.join(directory, f"contoso_scale_{customers}.db")
+    subprocess.run(
+        [sys.executable, "create_db.py", "--scale", str(customers), "--seed", str(seed), "--out", out],
+        cwd=MCP_DIR / "data", check=True,
+    )
+    return out
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=MCP_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default=os.getenv("DB_PATH", str(MCP_DIR / "data" / "contoso.db")))
+    parser.add_argument("--scale", type=int, default=0, help="build a database with this many extra customers")
+    parser.add_argument("--transport", choices=("inproc", "http"), default="inproc")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--calls", type=int, default=1000, help="measured calls per concurrency level")
+    parser.add_argument("--warmup", type=int, default=50)
+    parser.add_argument("--write-ratio", type=float, default=0.1)
+    parser.add_argument("--tools", nargs="*", help="only these tools")
+    parser.add_argument("--alloc-samples", type=int, default=20, help="calls per tool in the allocation pass (0: skip)")
+    parser.add_argument("--embedder", choices=("stub", "zero", "live"), default="stub")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", help="write the JSON results here")
+    parser.add_argument("--compare", help="baseline JSON to compare p95 against")
+    parser.add_argument("--threshold", type=float, default=1.2, help="p95 ratio counted as a regression")
+    parser.add_argument("--verbose", action="store_true", help="keep server logging")
+    parser.add_argument("--serve", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.disable(logging.CRITICAL)
+    if args.serve:
+        serve(args.serve, args.db, args.embedder)
+        return 0
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = build_scaled_db(args.scale, args.seed, tmp) if args.scale else args.db
+        scratch = os.path.join(tmp, "tool_bench.db")
+        shutil.copyfile(source, scratch)
+        from migrate_schema import prepare_database
+
+        prepare_database(scratch)
+        with sqlite3.connect(scratch) as db:
+            customers = db.execute("SELECT COUNT(*) FROM Customers").fetchone()[0]
+        ids = sample_ids(scratch, args.seed)
+        server = None
+        if args.transport == "http":
+            server, target = start_http_server(scratch, args.embedder)
+        else:
+            target = load_server(scratch, args.embedder)
+        try:
+            sweep = []
+            for concurrency in args.concurrency:
+                plan = schedule(args.warmup + args.calls, args.write_ratio, args.seed + concurrency, ids, args.tools)
+                level = asyncio.run(run_level(target, plan[args.warmup:], concurrency, plan[:args.warmup]))
+                print(f"concurrency {concurrency:>4}: {level['throughput_rps']:>8} calls/s  "
+                      f"p50 {level['p50_ms']}ms  p95 {level['p95_ms']}ms  p99 {level['p99_ms']}ms  "
+                      f"errors {level['errors']}")
+                sweep.append(level)
+            allocations = {}
+            if args.alloc_samples:
+                in_process = load_server(scratch, args.embedder) if server else target
+                allocations = asyncio.run(measure_allocations(in_process, ids, args.alloc_samples, args.seed))
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait(10)
+
+    results = {
+        "meta": {
+            "db": args.db if not args.scale else f"create_db.py --scale {args.scale} --seed {args.seed}",
+            "customers": customers,
+            "transport": args.transport,
+            "embedder": args.embedder,
+            "calls": args.calls,
+            "write_ratio": args.write_ratio,
+            "seed": args.seed,
+            "git": _git_revision(),
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "sweep": sweep,
+        "allocations": allocations,
+    }
+    print(f"\n{'tool':<28}" + "".join(f"{'p95@' + str(c):>12}" for c in args.concurrency) + f"{'peak KiB':>10}")
+    for tool in {**READ_TOOLS, **WRITE_TOOLS}:
+        cells = [level["tools"].get(tool, {}).get("p95_ms") for level in sweep]
+        if all(c is None for c in cells):
+            continue
+        peak = allocations.get(tool, {}).get("peak_kib_p50", "")
+        print(f"{tool:<28}" + "".join(f"{'-' if c is None else f'{c:.2f}ms':>12}" for c in cells) + f"{peak:>10}")
+    if args.out:
+        Path(args.out).write_text(json.dumps(results, indent=2))
+        print(f"\n✅  results → {args.out}")
+    if args.compare:
+        regressions = compare(results, json.loads(Path(args.compare).read_text()), args.threshold)
+        if regressions:
+            print(f"\n❌  p95 regressions: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Write throughput of ``pay_invoice`` under concurrent writers.
+
+A scratch copy of the database is hammered with ``--writes`` payments from
+``--concurrency`` concurrent callers in each of ``--processes`` processes
+(like ``serve_workers.py`` workers), in two ways:
+
+* ``per_call`` – every payment is its own transaction on a pooled
+  connection, as the write tools used to do
+* ``group``    – ``contoso_tools.pay_invoice_async`` through the
+  group-commit writer
+
+Reported per mode: writes/s, p50/p99 latency, failures (e.g. "database is
+locked") and, for ``group``, transactions and busy retries.  Afterwards the
+invoice balances are checked against the payments.  Run from the ``mcp``
+directory::
+
+    python benchmarks/write_bench.py --db data/contoso.db --writes 5000 --concurrency 64 --processes 1 4
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List
+
+MCP_DIR = Path(__file__).resolve().parents[1]
+sys.path[:0] = [str(MCP_DIR)]
+
+import contoso_tools  # noqa: E402
+import invoice_balances  # noqa: E402
+from db_pool import close_pools, get_pool, get_writer  # noqa: E402
+from migrate_schema import prepare_database  # noqa: E402
+
+
+def _per_call_payment(db: sqlite3.Connection, invoice_id: int, amount: float) -> float:
+    db.execute(
+        "INSERT INTO Payments(invoice_id, payment_date, amount, method, status) VALUES (?,?,?,?,?)",
+        (invoice_id, datetime.now().strftime("%Y-%m-%d"), amount, "credit_card", "successful"),
+    )
+    db.commit()
+    return db.execute("SELECT outstanding FROM InvoiceBalances WHERE invoice_id = ?", (invoice_id,)).fetchone()[0]
+
+
+async def _hammer(mode: str, path: str, invoice_ids: List[int], writes: int, concurrency: int) -> Dict[str, Any]:
+    contoso_tools.DB_PATH = path
+    latencies: List[float] = []
+    failures: Dict[str, int] = {}
+    pending = iter(range(writes))
+
+    async def one(i: int) -> None:
+        invoice_id = invoice_ids[i % len(invoice_ids)]
+        t0 = time.perf_counter()
+        try:
+            if mode == "group":
+                await contoso_tools.pay_invoice_async(invoice_id, 0.01)
+            else:
+                await get_pool(path).run(_per_call_payment, invoice_id, 0.01)
+        except Exception as exc:
+            failures[str(exc)] = failures.get(str(exc), 0) + 1
+        else:
+            latencies.append(time.perf_counter() - t0)
+
+    async def caller() -> None:
+        for i in pending:
+            await one(i)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(caller() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - t0
+    result = {"elapsed": elapsed, "latencies": latencies, "failures": failures}
+    if mode == "group":
+        writer = get_writer(path)
+        result.update(transactions=writer.transactions, busy_retries=writer.busy_retries)
+    close_pools()
+    return result
+
+
+def _process(mode: str, path: str, invoice_ids: List[int], writes: int, concurrency: int, out: Any) -> None:
+    out.put(asyncio.run(_hammer(mode, path, invoice_ids, writes, concurrency)))
+
+
+def run(mode: str, path: str, writes: int, concurrency: int, processes: int) -> Dict[str, Any]:
+    prepare_database(path)
+    with sqlite3.connect(path) as db:
+        invoice_ids = [r[0] for r in db.execute("SELECT invoice_id FROM Invoices ORDER BY invoice_id LIMIT 200")]
+    ctx = multiprocessing.get_context("spawn")
+    out = ctx.Queue()
+    procs = [
+        ctx.Process(target=_process, args=(mode, path, invoice_ids, writes // processes, concurrency, out))
+        for _ in range(processes)
+    ]
+    t0 = time.perf_counter()
+    for p in procs:
+        p.start()
+    parts = [out.get() for _ in procs]
+    for p in procs:
+        p.join()
+    elapsed = time.perf_counter() - t0
+    latencies = sorted(x for part in parts for x in part["latencies"])
+    failures: Dict[str, int] = {}
+    for part in parts:
+        for message, count in part["failures"].items():
+            failures[message] = failures.get(message, 0) + count
+    row = {
+        "mode": mode,
+        "processes": processes,
+        "ok": len(latencies),
+        "failed": sum(failures.values()),
+        "writes_per_s": round(len(latencies) / max(p["elapsed"] for p in parts)),
+        "p50_ms": round(statistics.median(latencies) * 1000, 2) if latencies else None,
+        "p99_ms": round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 2) if latencies else None,
+        "wall_s": round(elapsed, 2),
+        "failures": failures,
+    }
+    if mode == "group":
+        row["transactions"] = sum(p["transactions"] for p in parts)
+        row["busy_retries"] = sum(p["busy_retries"] for p in parts)
+    with sqlite3.connect(path) as db:
+        row["balance_mismatches"] = len(invoice_balances.mismatches(db))
+    return row
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default=os.getenv("DB_PATH", "data/contoso.db"))
+    parser.add_argument("--writes", type=int, default=5000, help="payments per run (split across processes)")
+    parser.add_argument("--concurrency", type=int, default=64, help="concurrent callers per process")
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--modes", nargs="+", choices=("per_call", "group"), default=["per_call", "group"])
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for processes in args.processes:
+            for mode in args.modes:
+                path = os.path.join(tmp, f"{mode}-{processes}.db")
+                shutil.copyfile(args.db, path)
+                results.append(run(mode, path, args.writes, args.concurrency, processes))
+    print(f"{'mode':<10}{'procs':>6}{'ok':>8}{'failed':>8}{'writes/s':>10}{'p50':>10}{'p99':>10}{'txns':>8}")
+    for r in results:
+        print(f"{r['mode']:<10}{r['processes']:>6}{r['ok']:>8}{r['failed']:>8}{r['writes_per_s']:>10}"
+              f"{r['p50_ms']:>8}ms{r['p99_ms']:>8}ms{r.get('transactions', '-'):>8}")
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,394 +1,945 @@
-"""Contoso Customer Service Utility Module  
-  
-Provides granular async functions for interacting with the Contoso  
-customer database. Designed to be used by both MCP tools and AutoGen  
-agents.  
-"""  
-  
-import os  
-import json  
-import math  
-import sqlite3  
-from typing import List, Optional, Dict, Any  
-from datetime import datetime  
-from dotenv import load_dotenv  
-  
-# Load environment variables  
-load_dotenv()  
-  
-# Database configuration  
-DB_PATH = os.getenv("DB_PATH", "data/contoso.db")  
-  
-  
-def get_db() -> sqlite3.Connection:  
-    """Get a database connection with row factory."""  
-    db = sqlite3.connect(DB_PATH)  
-    db.row_factory = sqlite3.Row  
-    return db  
-  
-  
-# Safe OpenAI import / dummy embedding  
-try:  
-    from openai import AzureOpenAI  
-  
-    _client = AzureOpenAI(  
-        api_key=os.getenv("AZURE_OPENAI_API_KEY"),  
-        api_version=os.getenv("AZURE_OPENAI_API_VERSION"),  
-        azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),  
-    )  
-    _emb_model = os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT")  
-  
-    def get_embedding(text: str) -> List[float]:  
-        """Get embedding vector from Azure OpenAI."""  
-        text = text.replace("\n", " ")  
-        return _client.embeddings.create(input=[text], model=_emb_model).data[0].embedding  
-  
-except Exception:  
-    def get_embedding(text: str) -> List[float]:  
-        """Fallback to zero vector when credentials are missing."""  
-        return [0.0] * 1536  
-  
-  
-def cosine_similarity(vec1, vec2):  
-    """Calculate cosine similarity between two vectors."""  
-    dot = sum(a * b for a, b in zip(vec1, vec2))  
-    norm1 = math.sqrt(sum(a * a for a in vec1))  
-    norm2 = math.sqrt(sum(b * b for b in vec2))  
-    return dot / (norm1 * norm2) if norm1 and norm2 else 0.0  
-  
-  
-# ========================================================================  
-# CUSTOMER FUNCTIONS  
-# ========================================================================  
-  
-async def get_all_customers_async() -> List[Dict[str, Any]]:  
-    db = get_db()  
-    rows = db.execute(  
-        "SELECT customer_id, first_name, last_name, email, loyalty_level FROM Customers"  
-    ).fetchall()  
-    db.close()  
-    return [dict(r) for r in rows]  
-  
-  
-async def get_customer_detail_async(customer_id: int) -> Dict[str, Any]:  
-    db = get_db()  
-    cust = db.execute(  
-        "SELECT * FROM Customers WHERE customer_id = ?", (customer_id,)  
-    ).fetchone()  
-    if not cust:  
-        db.close()  
-        raise ValueError(f"Customer {customer_id} not found")  
-    subs = db.execute(  
-        "SELECT * FROM Subscriptions WHERE customer_id = ?", (customer_id,)  
-    ).fetchall()  
-    db.close()  
-    result = dict(cust)  
-    result['subscriptions'] = [dict(s) for s in subs]  
-    return result  
-  
-  
-async def get_customer_orders_async(customer_id: int) -> List[Dict[str, Any]]:  
-    db = get_db()  
-    rows = db.execute(  
-        """SELECT o.order_id, o.order_date, p.name as product_name,  
-                  o.amount, o.order_status  
-           FROM Orders o  
-           JOIN Products p ON p.product_id = o.product_id  
-           WHERE o.customer_id = ?  
-           ORDER BY o.order_date DESC""",  
-        (customer_id,),  
-    ).fetchall()  
-    db.close()  
-    return [dict(r) for r in rows]  
-  
-  
-# ========================================================================  
-# SUBSCRIPTION FUNCTIONS  
-# ========================================================================  
-  
-async def get_subscription_detail_async(subscription_id: int) -> Dict[str, Any]:  
-    db = get_db()  
-    sub = db.execute(  
-        """SELECT s.*, p.name AS product_name, p.description AS product_description,  
-                  p.category, p.monthly_fee  
-           FROM Subscriptions s  
-           JOIN Products p ON p.product_id = s.product_id  
-           WHERE s.subscription_id = ?""",  
-        (subscription_id,),  
-    ).fetchone()  
-    if not sub:  
-        db.close()  
-        raise ValueError("Subscription not found")  
-  
-    invoices_rows = db.execute(  
-        "SELECT invoice_id, invoice_date, amount, description, due_date "  
-        "FROM Invoices WHERE subscription_id = ?",  
-        (subscription_id,),  
-    ).fetchall()  
-  
-    invoices = []  
-    for inv in invoices_rows:  
-        pay_rows = db.execute(  
-            "SELECT * FROM Payments WHERE invoice_id = ?", (inv["invoice_id"],)  
-        ).fetchall()  
-        total_paid = sum(p["amount"] for p in pay_rows if p["status"] == "successful")  
-        invoice_dict = dict(inv)  
-        invoice_dict['payments'] = [dict(p) for p in pay_rows]  
-        invoice_dict['outstanding'] = max(inv["amount"] - total_paid, 0.0)  
-        invoices.append(invoice_dict)  
-  
-    inc_rows = db.execute(  
-        "SELECT incident_id, incident_date, description, resolution_status "  
-        "FROM ServiceIncidents WHERE subscription_id = ?",  
-        (subscription_id,),  
-    ).fetchall()  
-    db.close()  
-  
-    result = dict(sub)  
-    result['invoices'] = invoices  
-    result['service_incidents'] = [dict(r) for r in inc_rows]  
-    return result  
-  
-  
-async def update_subscription_async(subscription_id: int, updates: Dict[str, Any]) -> Dict[str, Any]:  
-    if not updates:  
-        raise ValueError("No fields supplied")  
-    data = {k: v for k, v in updates.items() if v is not None}  
-    if not data:  
-        raise ValueError("No valid fields to update")  
-  
-    sets = ", ".join(f"{k} = ?" for k in data)  
-    params = list(data.values()) + [subscription_id]  
-  
-    db = get_db()  
-    cur = db.execute(f"UPDATE Subscriptions SET {sets} WHERE subscription_id = ?", params)  
-    db.commit()  
-    db.close()  
-  
-    if cur.rowcount == 0:  
-        raise ValueError("Subscription not found")  
-    return {"subscription_id": subscription_id, "updated_fields": list(data.keys())}  
-  
-  
-async def get_data_usage_async(subscription_id: int, start_date: str, end_date: str, aggregate: bool = False) -> List[Dict[str, Any]] | Dict[str, Any]:  
-    db = get_db()  
-    rows = db.execute(  
-        """SELECT usage_date, data_used_mb, voice_minutes, sms_count  
-           FROM DataUsage  
-           WHERE subscription_id = ?  
-             AND usage_date BETWEEN ? AND ?  
-           ORDER BY usage_date""",  
-        (subscription_id, start_date, end_date),  
-    ).fetchall()  
-    db.close()  
-  
-    if aggregate:  
-        return {  
-            "subscription_id": subscription_id,  
-            "start_date": start_date,  
-            "end_date": end_date,  
-            "total_mb": sum(r["data_used_mb"] for r in rows),  
-            "total_voice_minutes": sum(r["voice_minutes"] for r in rows),  
-            "total_sms": sum(r["sms_count"] for r in rows),  
-        }  
-    return [dict(r) for r in rows]  
-  
-  
-# ========================================================================  
-# BILLING FUNCTIONS  
-# ========================================================================  
-  
-async def get_billing_summary_async(customer_id: int) -> Dict[str, Any]:  
-    db = get_db()  
-    inv_rows = db.execute(  
-        """SELECT inv.invoice_id, inv.amount,  
-                  IFNULL(SUM(pay.amount), 0) AS paid  
-           FROM Invoices inv  
-           LEFT JOIN Payments pay  
-             ON pay.invoice_id = inv.invoice_id AND pay.status='successful'  
-           WHERE inv.subscription_id IN  
-               (SELECT subscription_id FROM Subscriptions WHERE customer_id = ?)  
-           GROUP BY inv.invoice_id""",  
-        (customer_id,),  
-    ).fetchall()  
-    db.close()  
-  
-    outstanding = [  
-        {"invoice_id": r["invoice_id"], "outstanding": max(r["amount"] - r["paid"], 0.0)}  
-        for r in inv_rows  
-    ]  
-    total_due = sum(item["outstanding"] for item in outstanding)  
-    return {"customer_id": customer_id, "total_due": total_due, "invoices": outstanding}  
-  
-  
-async def get_invoice_payments_async(invoice_id: int) -> List[Dict[str, Any]]:  
-    db = get_db()  
-    rows = db.execute("SELECT * FROM Payments WHERE invoice_id = ?", (invoice_id,)).fetchall()  
-    db.close()  
-    return [dict(r) for r in rows]  
-  
-  
-async def pay_invoice_async(invoice_id: int, amount: float, method: str = "credit_card") -> Dict[str, Any]:  
-    today = datetime.now().strftime("%Y-%m-%d")  
-    db = get_db()  
-    db.execute(  
-        "INSERT INTO Payments(invoice_id, payment_date, amount, method, status) VALUES (?,?,?,?,?)",  
-        (invoice_id, today, amount, method, "successful"),  
-    )  
-    inv = db.execute("SELECT amount FROM Invoices WHERE invoice_id = ?", (invoice_id,)).fetchone()  
-    if not inv:  
-        db.close()  
-        raise ValueError("Invoice not found")  
-    paid = db.execute(  
-        "SELECT SUM(amount) as paid FROM Payments WHERE invoice_id = ? AND status='successful'",  
-        (invoice_id,),  
-    ).fetchone()["paid"]  
-    db.commit()  
-    db.close()  
-    return {"invoice_id": invoice_id, "outstanding": max(inv["amount"] - (paid or 0), 0.0)}  
-  
-  
-# ========================================================================  
-# SECURITY FUNCTIONS  
-# ========================================================================  
-  
-async def get_security_logs_async(customer_id: int) -> List[Dict[str, Any]]:  
-    db = get_db()  
-    rows = db.execute(  
-        "SELECT log_id, event_type, event_timestamp, description "  
-        "FROM SecurityLogs WHERE customer_id = ? ORDER BY event_timestamp DESC",  
-        (customer_id,),  
-    ).fetchall()  
-    db.close()  
-    return [dict(r) for r in rows]  
-  
-  
-async def unlock_account_async(customer_id: int) -> Dict[str, str]:  
-    db = get_db()  
-    row = db.execute(  
-        "SELECT 1 FROM SecurityLogs WHERE customer_id = ? AND event_type = 'account_locked' "  
-        "ORDER BY event_timestamp DESC LIMIT 1",  
-        (customer_id,),  
-    ).fetchone()  
-    if not row:  
-        db.close()  
-        raise ValueError("No recent lock event; nothing to do.")  
-    db.execute(  
-        "INSERT INTO SecurityLogs (customer_id, event_type, event_timestamp, description) "  
-        "VALUES (?, 'account_unlocked', ?, 'Unlocked via API')",  
-        (customer_id, datetime.now().strftime("%Y-%m-%d %H:%M:%S")),  
-    )  
-    db.commit()  
-    db.close()  
-    return {"message": "Account unlocked"}  
-  
-  
-# ========================================================================  
-# PRODUCT FUNCTIONS  
-# ========================================================================  
-  
-async def get_products_async(category: Optional[str] = None) -> List[Dict[str, Any]]:  
-    db = get_db()  
-    if category:  
-        rows = db.execute("SELECT * FROM Products WHERE category = ?", (category,)).fetchall()  
-    else:  
-        rows = db.execute("SELECT * FROM Products").fetchall()  
-    db.close()  
-    return [dict(r) for r in rows]  
-  
-  
-async def get_product_detail_async(product_id: int) -> Dict[str, Any]:  
-    db = get_db()  
-    r = db.execute("SELECT * FROM Products WHERE product_id = ?", (product_id,)).fetchone()  
-    db.close()  
-    if not r:  
-        raise ValueError("Product not found")  
-    return dict(r)  
-  
-  
-# ========================================================================  
-# PROMOTION FUNCTIONS  
-# ========================================================================  
-  
-async def get_promotions_async() -> List[Dict[str, Any]]:  
-    db = get_db()  
-    rows = db.execute("SELECT * FROM Promotions").fetchall()  
-    db.close()  
-    return [dict(r) for r in rows]  
-  
-  
-async def get_eligible_promotions_async(customer_id: int) -> List[Dict[str, Any]]:  
-    db = get_db()  
-    cust = db.execute("SELECT loyalty_level FROM Customers WHERE customer_id = ?", (customer_id,)).fetchone()  
-    if not cust:  
-        db.close()  
-        raise ValueError("Customer not found")  
-    loyalty = cust["loyalty_level"]  
-    today = datetime.now().strftime("%Y-%m-%d")  
-    rows = db.execute(  
-        "SELECT * FROM Promotions WHERE start_date <= ? AND end_date >= ?",  
-        (today, today),  
-    ).fetchall()  
-    db.close()  
-  
-    eligible = []  
-    for r in rows:  
-        crit = r["eligibility_criteria"] or ""  
-        if f"loyalty_level = '{loyalty}'" in crit or "loyalty_level" not in crit:  
-            eligible.append(dict(r))  
-    return eligible  
-  
-  
-# ========================================================================  
-# SUPPORT FUNCTIONS  
-# ========================================================================  
-  
-async def get_support_tickets_async(customer_id: int, open_only: bool = False) -> List[Dict[str, Any]]:  
-    db = get_db()  
-    query = "SELECT * FROM SupportTickets WHERE customer_id = ?"  
-    if open_only:  
-        query += " AND status != 'closed'"  
-    rows = db.execute(query, (customer_id,)).fetchall()  
-    db.close()  
-    return [dict(r) for r in rows]  
-  
-  
-async def create_support_ticket_async(customer_id: int, subscription_id: int, category: str, priority: str, subject: str, description: str) -> Dict[str, Any]:  
-    opened = datetime.now().strftime("%Y-%m-%d %H:%M:%S")  
-    db = get_db()  
-    cur = db.execute(  
-        """INSERT INTO SupportTickets  
-           (customer_id, subscription_id, category, opened_at, closed_at,  
-            status, priority, subject, description, cs_agent)  
-           VALUES (?,?,?,?,?,?,?,?,?,?)""",  
-        (customer_id, subscription_id, category, opened, None, "open", priority, subject, description, "AI_Bot"),  
-    )  
-    ticket_id = cur.lastrowid  
-    db.commit()  
-    row = db.execute("SELECT * FROM SupportTickets WHERE ticket_id = ?", (ticket_id,)).fetchone()  
-    db.close()  
-    return dict(row)  
-  
-  
-# ========================================================================  
-# KNOWLEDGE BASE FUNCTIONS  
-# ========================================================================  
-  
-async def search_knowledge_base_async(query: str, topk: int = 3) -> List[Dict[str, Any]]:  
-    query_emb = get_embedding(query)  
-    db = get_db()  
-    rows = db.execute("SELECT title, doc_type, content, topic_embedding FROM KnowledgeDocuments").fetchall()  
-    db.close()  
-  
-    scored = []  
-    for r in rows:  
-        try:  
-            emb = json.loads(r["topic_embedding"])  
-            sim = cosine_similarity(query_emb, emb)  
-            scored.append((sim, r))  
-        except Exception:  
-            continue  
-    scored.sort(reverse=True, key=lambda x: x[0])  
-  
-    best = scored[:topk]  
-    return [{"title": r["title"], "doc_type": r["doc_type"], "content": r["content"]} for _, r in best]  
\ No newline at end of file
+"""Contoso Customer Service Utility Module
+
+Provides granular async functions for interacting with the Contoso
+customer database. Designed to be used by both MCP tools and AutoGen
+agents.
+
+All SQLite work goes through the shared :class:`db_pool.SQLitePool`: each
+``*_async`` function hands a small synchronous ``_query(db)`` closure to
+``run_db`` which executes it on a pooled connection off the event loop.
+Write tools use ``run_write`` instead, which batches concurrent writes into
+one transaction on a single writer connection (:class:`db_pool.GroupCommitWriter`).
+"""
+
+import os
+import math
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import List, Optional, Dict, Any, AsyncIterator, Callable, Iterator, Sequence, Tuple, TypeVar
+from datetime import datetime
+from dotenv import load_dotenv
+
+from db_pool import get_pool, get_writer, open_connection
+from embedding_service import EmbeddingService
+from kb_index import KnowledgeBaseIndex
+from usage_rollups import usage_totals
+
+# Load environment variables
+load_dotenv()
+
+# Database configuration
+DB_PATH = os.getenv("DB_PATH", "data/contoso.db")
+
+T = TypeVar("T")
+
+
+def get_db() -> sqlite3.Connection:
+    """Get a standalone database connection with row factory (sync callers)."""
+    return open_connection(DB_PATH)
+
+
+# Phase timing hooks: callables receiving ``(phase, seconds)`` for every
+# unit of database work (``run_db`` / ``run_write``) and ``"serialize"`` step
+# (``tool_results``).  Database work is split into ``"sql"`` (``fn`` itself,
+# timed on the worker thread) and ``"db_wait"`` (the rest: waiting for a
+# pooled connection, or for the group commit).  ``tool_metrics`` registers
+# one; with none registered the timers are skipped entirely.
+PHASE_HOOKS: List[Callable[[str, float], None]] = []
+
+
+def _report_phase(phase: str, seconds: float) -> None:
+    for hook in PHASE_HOOKS:
+        hook(phase, seconds)
+
+
+@contextmanager
+def timed_phase(phase: str) -> Iterator[None]:
+    if not PHASE_HOOKS:
+        yield
+        return
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        _report_phase(phase, time.perf_counter() - t0)
+
+
+class _TimedCall:
+    """``fn(db, *args)`` that adds up its own run time (busy retries re-run it)."""
+
+    __slots__ = ("fn", "seconds")
+
+    def __init__(self, fn: Callable[..., T]) -> None:
+        self.fn = fn
+        self.seconds = 0.0
+
+    def __call__(self, db: sqlite3.Connection, *args: Any) -> Any:
+        t0 = time.perf_counter()
+        try:
+            return self.fn(db, *args)
+        finally:
+            self.seconds += time.perf_counter() - t0
+
+
+async def _timed_db(submit: Callable[..., Any], fn: Callable[..., T], args: tuple) -> T:
+    if not PHASE_HOOKS:
+        return await submit(fn, *args)
+    call = _TimedCall(fn)
+    t0 = time.perf_counter()
+    try:
+        return await submit(call, *args)
+    finally:
+        sql = call.seconds
+        _report_phase("sql", sql)
+        _report_phase("db_wait", max(0.0, time.perf_counter() - t0 - sql))
+
+
+async def run_db(fn: Callable[..., T], *args: Any) -> T:
+    """Run ``fn(db, *args)`` on a pooled connection without blocking the loop."""
+    return await _timed_db(get_pool(DB_PATH).run, fn, args)
+
+
+async def run_write(fn: Callable[..., T], *args: Any) -> T:
+    """Run the write ``fn(db, *args)`` in the next group commit.
+
+    ``fn`` must not commit; raising rolls back its own changes only.
+    """
+    return await _timed_db(get_writer(DB_PATH).submit, fn, args)
+
+
+# Multi-get tools accept at most this many ids per call.  IN (...) lists are
+# additionally split into chunks so a raised limit never hits SQLite's
+# host-parameter cap.
+MAX_BATCH_IDS = int(os.getenv("MAX_BATCH_IDS", "100"))
+_IN_CHUNK = 500
+
+
+def _unique_ids(ids: Sequence[int]) -> List[int]:
+    """``ids`` de-duplicated in request order; enforces :data:`MAX_BATCH_IDS`."""
+    unique = list(dict.fromkeys(ids))
+    if not unique:
+        raise ValueError("No ids supplied")
+    if len(unique) > MAX_BATCH_IDS:
+        raise ValueError(f"At most {MAX_BATCH_IDS} ids per call ({len(unique)} given)")
+    return unique
+
+
+def _id_chunks(ids: Sequence[int]) -> Iterator[Tuple[str, List[int]]]:
+    """``(placeholders, chunk)`` pairs for ``WHERE x IN ({placeholders})``."""
+    for i in range(0, len(ids), _IN_CHUNK):
+        chunk = list(ids[i:i + _IN_CHUNK])
+        yield ", ".join("?" * len(chunk)), chunk
+
+
+def _batch_results(ids: List[int], found: Dict[int, Any], missing: str) -> List[Dict[str, Any]]:
+    """One ``{"id", "result", "error"}`` entry per requested id, in order."""
+    return [
+        {"id": i, "result": found[i], "error": None} if i in found
+        else {"id": i, "result": None, "error": missing.format(id=i)}
+        for i in ids
+    ]
+
+
+# Detail reads accept a ``fields`` projection (top-level field names) and a
+# ``max_items`` budget per nested list; both are applied in SQL.  A record
+# whose nested list was cut carries ``"truncated": {<list>: <total rows>}``.
+def _projection(
+    fields: Optional[Sequence[str]], columns: Dict[str, str], sections: Tuple[str, ...], key: str
+) -> Tuple[Optional[List[str]], Tuple[str, ...]]:
+    """``fields`` split into SQL column expressions and nested sections to load.
+
+    Returns ``(None, sections)`` when there is no projection.  The key column
+    is always selected.
+    """
+    if fields is None:
+        return None, sections
+    unknown = set(fields) - columns.keys() - set(sections)
+    if unknown:
+        raise ValueError(f"Unknown fields {sorted(unknown)}; choose from {[*columns, *sections]}")
+    wanted = [key] + [f for f in dict.fromkeys(fields) if f in columns and f != key]
+    return [columns[f] for f in wanted], tuple(s for s in sections if s in fields)
+
+
+def _check_budget(max_items: Optional[int]) -> None:
+    # Zero would also drop the rows that tell us a list was cut; leave the
+    # section out of ``fields`` instead.
+    if max_items is not None and max_items < 1:
+        raise ValueError("max_items must be at least 1")
+
+
+def _not_migrated(table: str) -> RuntimeError:
+    # Derived tables are created once by migrate_schema (create_db.py, server
+    # startup); running DDL from a read would race across workers.
+    return RuntimeError(f"{table} missing from {DB_PATH}; run `python migrate_schema.py --db {DB_PATH}`")
+
+
+def _rank_columns(parent: str, date: str, key: str) -> str:
+    """Extra select columns ranking rows newest-first within ``parent``.
+
+    Ids are not issued in date order, so rows rank by ``date`` with ``key``
+    only breaking ties.
+    """
+    return (
+        f", ROW_NUMBER() OVER (PARTITION BY {parent} ORDER BY {date} DESC, {key} DESC) AS _rank"
+        f", COUNT(*) OVER (PARTITION BY {parent}) AS _total"
+    )
+
+
+def _newest_per_parent(sql: str, order: str) -> str:
+    """Rows of ``sql`` (selecting :func:`_rank_columns`) with ``_rank <= ?``."""
+    return f"SELECT * FROM ({sql}) WHERE _rank <= ? ORDER BY {order}"
+
+
+def _take_rank(row: sqlite3.Row, parent: Dict[str, Any], section: str, max_items: Optional[int]) -> Dict[str, Any]:
+    """``row`` as a dict without the rank columns; marks ``parent`` if its ``section`` was cut."""
+    item = dict(row)
+    if max_items is not None:
+        item.pop("_rank")
+        total = item.pop("_total")
+        if total > max_items:
+            parent.setdefault("truncated", {})[section] = total
+    return item
+
+
+# Safe OpenAI import / dummy embedding
+_emb_model = os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT")
+_async_client = None
+try:
+    from openai import AzureOpenAI, AsyncAzureOpenAI
+
+    _client = AzureOpenAI(
+        api_key=os.getenv("AZURE_OPENAI_API_KEY"),
+        api_version=os.getenv("AZURE_OPENAI_API_VERSION"),
+        azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
+    )
+    _async_client = AsyncAzureOpenAI(
+        api_key=os.getenv("AZURE_OPENAI_API_KEY"),
+        api_version=os.getenv("AZURE_OPENAI_API_VERSION"),
+        azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
+    )
+
+    def get_embedding(text: str) -> List[float]:
+        """Get embedding vector from Azure OpenAI."""
+        text = text.replace("\n", " ")
+        return _client.embeddings.create(input=[text], model=_emb_model).data[0].embedding
+
+except Exception:
+    def get_embedding(text: str) -> List[float]:
+        """Fallback to zero vector when credentials are missing."""
+        return [0.0] * 1536
+
+# Non-blocking, cached and batched embeddings for the KB search hot path.
+embedding_service = EmbeddingService(
+    _async_client,
+    _emb_model,
+    cache_size=int(os.getenv("EMBEDDING_CACHE_SIZE", "4096")),
+    disk_path=os.getenv("EMBEDDING_CACHE_PATH") or None,
+    batch_window_ms=float(os.getenv("EMBEDDING_BATCH_WINDOW_MS", "5")),
+    max_batch=int(os.getenv("EMBEDDING_MAX_BATCH", "64")),
+)
+
+
+def cosine_similarity(vec1, vec2):
+    """Calculate cosine similarity between two vectors."""
+    dot = sum(a * b for a, b in zip(vec1, vec2))
+    norm1 = math.sqrt(sum(a * a for a in vec1))
+    norm2 = math.sqrt(sum(b * b for b in vec2))
+    return dot / (norm1 * norm2) if norm1 and norm2 else 0.0
+
+
+# ========================================================================
+# CUSTOMER FUNCTIONS
+# ========================================================================
+
+CUSTOMER_PAGE_SIZE = int(os.getenv("CUSTOMER_PAGE_SIZE", "100"))
+_CUSTOMER_COLUMNS = "customer_id, first_name, last_name, email, loyalty_level"
+
+
+def _customer_filter(loyalty_level: Optional[str], name_contains: Optional[str]) -> Tuple[str, List[Any]]:
+    """WHERE fragments (AND-joined, possibly empty) for the customer listings."""
+    clauses: List[str] = []
+    params: List[Any] = []
+    if loyalty_level:
+        clauses.append("loyalty_level = ?")
+        params.append(loyalty_level)
+    if name_contains:
+        clauses.append("(first_name LIKE ? ESCAPE '\\' OR last_name LIKE ? ESCAPE '\\')")
+        pattern = "%" + name_contains.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        params += [pattern, pattern]
+    return " AND ".join(clauses), params
+
+
+def _customers_page(
+    db: sqlite3.Connection,
+    limit: Optional[int],
+    after_id: Optional[int],
+    loyalty_level: Optional[str],
+    name_contains: Optional[str],
+) -> List[Dict[str, Any]]:
+    """Keyset page of customers ordered by ``customer_id`` (all rows when ``limit`` is None)."""
+    where, params = _customer_filter(loyalty_level, name_contains)
+    clauses = ["customer_id > ?"] + ([where] if where else [])
+    params = [after_id or 0] + params
+    sql = f"SELECT {_CUSTOMER_COLUMNS} FROM Customers WHERE {' AND '.join(clauses)} ORDER BY customer_id"
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(limit)
+    return [dict(r) for r in db.execute(sql, params)]
+
+
+async def get_all_customers_async(
+    limit: Optional[int] = None,
+    after_id: Optional[int] = None,
+    loyalty_level: Optional[str] = None,
+    name_contains: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    return await run_db(_customers_page, limit, after_id, loyalty_level, name_contains)
+
+
+async def count_customers_async(
+    loyalty_level: Optional[str] = None,
+    name_contains: Optional[str] = None,
+    after_id: Optional[int] = None,
+) -> int:
+    """Number of matching customers (only those with ``customer_id > after_id`` if given)."""
+    where, params = _customer_filter(loyalty_level, name_contains)
+    if after_id is not None:
+        where = " AND ".join(filter(None, [where, "customer_id > ?"]))
+        params = [*params, after_id]
+
+    def _query(db: sqlite3.Connection) -> int:
+        sql = "SELECT COUNT(*) FROM Customers" + (f" WHERE {where}" if where else "")
+        return db.execute(sql, params).fetchone()[0]
+
+    return await run_db(_query)
+
+
+async def get_customers_page_async(
+    limit: int = CUSTOMER_PAGE_SIZE,
+    after_id: Optional[int] = None,
+    loyalty_level: Optional[str] = None,
+    name_contains: Optional[str] = None,
+    include_total: bool = False,
+) -> Dict[str, Any]:
+    """One keyset page of customers plus the cursor for the next one.
+
+    ``next_after_id`` is ``None`` on the last page.  ``total`` (the number of
+    matching customers, counted server-side) is only computed on request.
+    """
+    limit = max(1, min(limit, 1000))
+    rows = await get_all_customers_async(limit, after_id, loyalty_level, name_contains)
+    total = await count_customers_async(loyalty_level, name_contains) if include_total else None
+    return {
+        "customers": rows,
+        "next_after_id": rows[-1]["customer_id"] if len(rows) == limit else None,
+        "total": total,
+    }
+
+
+async def iter_customers_async(
+    page_size: int = CUSTOMER_PAGE_SIZE,
+    loyalty_level: Optional[str] = None,
+    name_contains: Optional[str] = None,
+    after_id: Optional[int] = None,
+) -> AsyncIterator[List[Dict[str, Any]]]:
+    """Stream matching customers page by page with bounded memory."""
+    while True:
+        page = await get_customers_page_async(page_size, after_id, loyalty_level, name_contains)
+        if page["customers"]:
+            yield page["customers"]
+        after_id = page["next_after_id"]
+        if after_id is None:
+            return
+
+
+_CUSTOMER_DETAIL_COLUMNS = {
+    c: c for c in ("customer_id", "first_name", "last_name", "email", "phone", "address", "loyalty_level")
+}
+CUSTOMER_DETAIL_SECTIONS = ("subscriptions",)
+
+
+def _load_customer_details(
+    db: sqlite3.Connection,
+    customer_ids: Sequence[int],
+    fields: Optional[Sequence[str]] = None,
+    max_items: Optional[int] = None,
+) -> Dict[int, Dict[str, Any]]:
+    """Customers (with their subscriptions) by id; two queries per id chunk.
+
+    ``max_items`` keeps each customer's newest subscriptions.
+    """
+    columns, sections = _projection(fields, _CUSTOMER_DETAIL_COLUMNS, CUSTOMER_DETAIL_SECTIONS, "customer_id")
+    select = ", ".join(columns) if columns else "*"
+    rank = _rank_columns("customer_id", "start_date", "subscription_id") if max_items is not None else ""
+    customers: Dict[int, Dict[str, Any]] = {}
+    for marks, chunk in _id_chunks(customer_ids):
+        for c in db.execute(f"SELECT {select} FROM Customers WHERE customer_id IN ({marks})", chunk):
+            customers[c["customer_id"]] = dict(c)
+        if "subscriptions" not in sections:
+            continue
+        for cust in customers.values():
+            cust.setdefault("subscriptions", [])
+        sql = f"SELECT *{rank} FROM Subscriptions WHERE customer_id IN ({marks})"
+        params: List[Any] = list(chunk)
+        if max_items is not None:
+            sql = _newest_per_parent(sql, "customer_id, subscription_id")
+            params.append(max_items)
+        for s in db.execute(sql, params):
+            cust = customers.get(s["customer_id"])
+            if cust is not None:
+                cust["subscriptions"].append(_take_rank(s, cust, "subscriptions", max_items))
+    return customers
+
+
+async def get_customer_detail_async(
+    customer_id: int, fields: Optional[Sequence[str]] = None, max_items: Optional[int] = None
+) -> Dict[str, Any]:
+    _check_budget(max_items)
+    found = await run_db(_load_customer_details, [customer_id], fields, max_items)
+    if customer_id not in found:
+        raise ValueError(f"Customer {customer_id} not found")
+    return found[customer_id]
+
+
+async def get_customer_details_async(
+    customer_ids: Sequence[int], fields: Optional[Sequence[str]] = None, max_items: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    """Multi-get of customer profiles; unknown ids are reported per item."""
+    ids = _unique_ids(customer_ids)
+    _check_budget(max_items)
+    found = await run_db(_load_customer_details, ids, fields, max_items)
+    return _batch_results(ids, found, "Customer {id} not found")
+
+
+async def get_customer_orders_async(customer_id: int) -> List[Dict[str, Any]]:
+    def _query(db: sqlite3.Connection) -> List[Dict[str, Any]]:
+        rows = db.execute(
+            """SELECT o.order_id, o.order_date, p.name as product_name,
+                      o.amount, o.order_status
+               FROM Orders o
+               JOIN Products p ON p.product_id = o.product_id
+               WHERE o.customer_id = ?
+               ORDER BY o.order_date DESC""",
+            (customer_id,),
+        ).fetchall()
+        return [dict(r) for r in rows]
+
+    return await run_db(_query)
+
+
+# ========================================================================
+# SUBSCRIPTION FUNCTIONS
+# ========================================================================
+
+# Invoice rows with their outstanding balance.  ``{where}`` must filter on
+# ``inv`` (and may add joins before the WHERE clause).  Balances are read
+# from the trigger-maintained ``InvoiceBalances`` table (one primary-key
+# lookup per invoice).  ``{rank}`` is empty unless only the newest invoices
+# per subscription are wanted.
+_INVOICE_BALANCE_SQL = """
+    SELECT inv.invoice_id, inv.subscription_id, inv.invoice_date, inv.amount, inv.description, inv.due_date,
+           CAST(bal.outstanding AS REAL) AS outstanding{rank}
+    FROM Invoices inv
+    JOIN InvoiceBalances bal ON bal.invoice_id = inv.invoice_id
+    {where}
+    ORDER BY inv.invoice_id
+"""
+
+def _invoice_rows(
+    db: sqlite3.Connection, where: str, params: tuple, max_per_subscription: Optional[int] = None
+) -> List[sqlite3.Row]:
+    """Invoice rows with balances from ``InvoiceBalances`` (see ``migrate_schema``).
+
+    With ``max_per_subscription`` only the newest invoices of each
+    subscription are returned, with ``_rank``/``_total`` columns.
+    """
+    if max_per_subscription is not None:
+        rank = _rank_columns("inv.subscription_id", "inv.invoice_date", "inv.invoice_id")
+        params = (*params, max_per_subscription)
+    else:
+        rank = ""
+
+    def fetch(template: str) -> List[sqlite3.Row]:
+        sql = template.format(where=where, rank=rank)
+        if rank:
+            sql = _newest_per_parent(sql, "invoice_id")
+        return db.execute(sql, params).fetchall()
+
+    try:
+        return fetch(_INVOICE_BALANCE_SQL)
+    except sqlite3.OperationalError as exc:
+        if "InvoiceBalances" not in str(exc):
+            raise
+        raise _not_migrated("InvoiceBalances") from exc
+
+
+_SUBSCRIPTION_DETAIL_COLUMNS = {
+    **{c: f"s.{c}" for c in (
+        "subscription_id", "customer_id", "product_id", "start_date", "end_date", "status",
+        "roaming_enabled", "service_status", "speed_tier", "data_cap_gb", "autopay_enabled",
+    )},
+    "product_name": "p.name AS product_name",
+    "product_description": "p.description AS product_description",
+    "category": "p.category",
+    "monthly_fee": "p.monthly_fee",
+}
+SUBSCRIPTION_DETAIL_SECTIONS = ("invoices", "service_incidents")
+
+
+def _load_subscription_details(
+    db: sqlite3.Connection,
+    subscription_ids: Sequence[int],
+    fields: Optional[Sequence[str]] = None,
+    max_items: Optional[int] = None,
+) -> Dict[int, Dict[str, Any]]:
+    """Subscriptions + invoices (with payments) + incidents by id.
+
+    Four queries per id chunk, independent of the number of subscriptions
+    or invoices: each child table is read once with ``IN (...)`` and the
+    rows are grouped onto their parents in a single pass.  Sections left
+    out of ``fields`` are not queried; ``max_items`` keeps the newest
+    invoices, payments per invoice and incidents.
+    """
+    columns, sections = _projection(
+        fields, _SUBSCRIPTION_DETAIL_COLUMNS, SUBSCRIPTION_DETAIL_SECTIONS, "subscription_id"
+    )
+    if columns is None:
+        select = """s.*, p.name AS product_name, p.description AS product_description,
+                    p.category, p.monthly_fee"""
+        source = "Subscriptions s JOIN Products p ON p.product_id = s.product_id"
+    else:
+        select = ", ".join(columns)
+        source = "Subscriptions s"
+        if any(c.startswith("p.") for c in columns):
+            source += " JOIN Products p ON p.product_id = s.product_id"
+
+    subs: Dict[int, Dict[str, Any]] = {}
+    for marks, chunk in _id_chunks(subscription_ids):
+        for s in db.execute(f"SELECT {select} FROM {source} WHERE s.subscription_id IN ({marks})", chunk):
+            subs[s["subscription_id"]] = {**dict(s), **{name: [] for name in sections}}
+
+        if "invoices" in sections:
+            invoices: Dict[int, Dict[str, Any]] = {}
+            for r in _invoice_rows(db, f"WHERE inv.subscription_id IN ({marks})", tuple(chunk), max_items):
+                sub = subs.get(r["subscription_id"])
+                if sub is not None:
+                    inv = _take_rank(r, sub, "invoices", max_items)
+                    del inv["subscription_id"]
+                    inv["payments"] = []
+                    invoices[inv["invoice_id"]] = inv
+                    sub["invoices"].append(inv)
+            params: List[Any] = list(chunk)
+            if max_items is None:
+                rank = kept = ""
+            else:
+                # Only payments of the invoices that survived the cut.
+                rank = _rank_columns("pay.invoice_id", "pay.payment_date", "pay.payment_id")
+                kept = f"""AND pay.invoice_id IN (
+                           SELECT invoice_id FROM (
+                               SELECT invoice_id{_rank_columns("subscription_id", "invoice_date", "invoice_id")}
+                               FROM Invoices WHERE subscription_id IN ({marks})
+                           ) WHERE _rank <= ?)"""
+                params += [*chunk, max_items]
+            sql = f"""SELECT pay.*{rank}
+                      FROM Payments pay
+                      JOIN Invoices inv ON inv.invoice_id = pay.invoice_id
+                      WHERE inv.subscription_id IN ({marks}) {kept}
+                      ORDER BY pay.invoice_id, pay.payment_id"""
+            if max_items is not None:
+                sql = _newest_per_parent(sql, "invoice_id, payment_id")
+                params.append(max_items)
+            for p in db.execute(sql, params):
+                inv = invoices.get(p["invoice_id"])
+                if inv is not None:
+                    inv["payments"].append(_take_rank(p, inv, "payments", max_items))
+
+        if "service_incidents" in sections:
+            sql = (
+                "SELECT subscription_id, incident_id, incident_date, description, resolution_status"
+                f"{_rank_columns('subscription_id', 'incident_date', 'incident_id') if max_items is not None else ''} "
+                f"FROM ServiceIncidents WHERE subscription_id IN ({marks})"
+            )
+            params = list(chunk)
+            if max_items is not None:
+                sql = _newest_per_parent(sql, "subscription_id, incident_id")
+                params.append(max_items)
+            for i in db.execute(sql, params):
+                sub = subs.get(i["subscription_id"])
+                if sub is not None:
+                    inc = _take_rank(i, sub, "service_incidents", max_items)
+                    del inc["subscription_id"]
+                    sub["service_incidents"].append(inc)
+    return subs
+
+
+def _load_subscription_detail(
+    db: sqlite3.Connection,
+    subscription_id: int,
+    fields: Optional[Sequence[str]] = None,
+    max_items: Optional[int] = None,
+) -> Dict[str, Any]:
+    found = _load_subscription_details(db, [subscription_id], fields, max_items)
+    if subscription_id not in found:
+        raise ValueError("Subscription not found")
+    return found[subscription_id]
+
+
+async def get_subscription_detail_async(
+    subscription_id: int, fields: Optional[Sequence[str]] = None, max_items: Optional[int] = None
+) -> Dict[str, Any]:
+    _check_budget(max_items)
+    return await run_db(_load_subscription_detail, subscription_id, fields, max_items)
+
+
+async def get_subscription_details_async(
+    subscription_ids: Sequence[int], fields: Optional[Sequence[str]] = None, max_items: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    """Multi-get of subscription views; unknown ids are reported per item."""
+    ids = _unique_ids(subscription_ids)
+    _check_budget(max_items)
+    found = await run_db(_load_subscription_details, ids, fields, max_items)
+    return _batch_results(ids, found, "Subscription {id} not found")
+
+
+async def update_subscription_async(subscription_id: int, updates: Dict[str, Any]) -> Dict[str, Any]:
+    if not updates:
+        raise ValueError("No fields supplied")
+    data = {k: v for k, v in updates.items() if v is not None}
+    if not data:
+        raise ValueError("No valid fields to update")
+
+    sets = ", ".join(f"{k} = ?" for k in data)
+    params = list(data.values()) + [subscription_id]
+
+    def _query(db: sqlite3.Connection) -> int:
+        return db.execute(f"UPDATE Subscriptions SET {sets} WHERE subscription_id = ?", params).rowcount
+
+    if await run_write(_query) == 0:
+        raise ValueError("Subscription not found")
+    return {"subscription_id": subscription_id, "updated_fields": list(data.keys())}
+
+
+def _usage_totals(db: sqlite3.Connection, subscription_id: int, start_date: str, end_date: str) -> Dict[str, Any]:
+    """Window totals from the usage rollups (see ``migrate_schema``)."""
+    try:
+        return usage_totals(db, subscription_id, start_date, end_date)
+    except sqlite3.OperationalError as exc:
+        if "no such table: DataUsage" not in str(exc):
+            raise
+        raise _not_migrated("DataUsageMonthly/DataUsageWeekly") from exc
+
+
+async def get_data_usage_async(subscription_id: int, start_date: str, end_date: str, aggregate: bool = False) -> List[Dict[str, Any]] | Dict[str, Any]:
+    if aggregate:
+        totals = await run_db(_usage_totals, subscription_id, start_date, end_date)
+        return {
+            "subscription_id": subscription_id,
+            "start_date": start_date,
+            "end_date": end_date,
+            "total_mb": totals["total_mb"],
+            "total_voice_minutes": totals["total_voice_minutes"],
+            "total_sms": totals["total_sms"],
+        }
+
+    def _query(db: sqlite3.Connection) -> List[Dict[str, Any]]:
+        rows = db.execute(
+            """SELECT usage_date, data_used_mb, voice_minutes, sms_count
+               FROM DataUsage
+               WHERE subscription_id = ?
+                 AND usage_date BETWEEN ? AND ?
+               ORDER BY usage_date""",
+            (subscription_id, start_date, end_date),
+        ).fetchall()
+        return [dict(r) for r in rows]
+
+    return await run_db(_query)
+
+
+DATA_USAGE_PAGE_SIZE = int(os.getenv("DATA_USAGE_PAGE_SIZE", "500"))
+
+
+def _usage_cursor(cursor: Optional[str]) -> Optional[Tuple[str, int]]:
+    """Decode a ``"<usage_date>:<usage_id>"`` keyset cursor."""
+    if not cursor:
+        return None
+    usage_date, _, usage_id = cursor.rpartition(":")
+    if not usage_date or not usage_id.isdigit():
+        raise ValueError(f"Invalid cursor {cursor!r}")
+    return usage_date, int(usage_id)
+
+
+async def get_data_usage_page_async(
+    subscription_id: int,
+    start_date: str,
+    end_date: str,
+    limit: int = DATA_USAGE_PAGE_SIZE,
+    cursor: Optional[str] = None,
+) -> Dict[str, Any]:
+    """One keyset page of daily usage, ordered by ``(usage_date, usage_id)``.
+
+    ``next_cursor`` is ``None`` on the last page; pass it back unchanged to
+    continue.  Each page is a single index range seek, however deep.
+    """
+    limit = max(1, min(limit, 10_000))
+    after = _usage_cursor(cursor)
+
+    def _query(db: sqlite3.Connection) -> List[sqlite3.Row]:
+        if after is None:
+            return db.execute(
+                """SELECT usage_id, usage_date, data_used_mb, voice_minutes, sms_count
+                   FROM DataUsage
+                   WHERE subscription_id = ? AND usage_date BETWEEN ? AND ?
+                   ORDER BY usage_date, usage_id
+                   LIMIT ?""",
+                (subscription_id, start_date, end_date, limit),
+            ).fetchall()
+        after_date, after_id = after
+        return db.execute(
+            """SELECT usage_id, usage_date, data_used_mb, voice_minutes, sms_count
+               FROM DataUsage
+               WHERE subscription_id = ? AND usage_date BETWEEN ? AND ?
+                 AND usage_date >= ? AND (usage_date > ? OR usage_id > ?)
+               ORDER BY usage_date, usage_id
+               LIMIT ?""",
+            (subscription_id, start_date, end_date, after_date, after_date, after_id, limit),
+        ).fetchall()
+
+    rows = await run_db(_query)
+    next_cursor = f"{rows[-1]['usage_date']}:{rows[-1]['usage_id']}" if len(rows) == limit else None
+    return {
+        "subscription_id": subscription_id,
+        "records": [
+            {k: r[k] for k in ("usage_date", "data_used_mb", "voice_minutes", "sms_count")} for r in rows
+        ],
+        "next_cursor": next_cursor,
+    }
+
+
+async def iter_data_usage_async(
+    subscription_id: int,
+    start_date: str,
+    end_date: str,
+    page_size: int = DATA_USAGE_PAGE_SIZE,
+) -> AsyncIterator[List[Dict[str, Any]]]:
+    """Stream daily usage page by page with bounded memory."""
+    cursor = None
+    while True:
+        page = await get_data_usage_page_async(subscription_id, start_date, end_date, page_size, cursor)
+        if page["records"]:
+            yield page["records"]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return
+
+
+# ========================================================================
+# BILLING FUNCTIONS
+# ========================================================================
+
+async def get_billing_summary_async(customer_id: int) -> Dict[str, Any]:
+    def _query(db: sqlite3.Connection) -> List[Dict[str, Any]]:
+        rows = _invoice_rows(
+            db,
+            "JOIN Subscriptions s ON s.subscription_id = inv.subscription_id WHERE s.customer_id = ?",
+            (customer_id,),
+        )
+        return [{"invoice_id": r["invoice_id"], "outstanding": r["outstanding"]} for r in rows]
+
+    outstanding = await run_db(_query)
+    total_due = sum((item["outstanding"] for item in outstanding), 0.0)
+    return {"customer_id": customer_id, "total_due": total_due, "invoices": outstanding}
+
+
+async def get_invoice_payments_async(invoice_id: int) -> List[Dict[str, Any]]:
+    def _query(db: sqlite3.Connection) -> List[Dict[str, Any]]:
+        rows = db.execute("SELECT * FROM Payments WHERE invoice_id = ?", (invoice_id,)).fetchall()
+        return [dict(r) for r in rows]
+
+    return await run_db(_query)
+
+
+def _load_invoice_payments(db: sqlite3.Connection, invoice_ids: Sequence[int]) -> Dict[int, List[Dict[str, Any]]]:
+    """Payments grouped by invoice; only existing invoices get an entry."""
+    payments: Dict[int, List[Dict[str, Any]]] = {}
+    for marks, chunk in _id_chunks(invoice_ids):
+        for (invoice_id,) in db.execute(f"SELECT invoice_id FROM Invoices WHERE invoice_id IN ({marks})", chunk):
+            payments[invoice_id] = []
+        for p in db.execute(f"SELECT * FROM Payments WHERE invoice_id IN ({marks})", chunk):
+            if p["invoice_id"] in payments:
+                payments[p["invoice_id"]].append(dict(p))
+    return payments
+
+
+async def get_invoices_payments_async(invoice_ids: Sequence[int]) -> List[Dict[str, Any]]:
+    """Multi-get of invoice payment lists; unknown invoices are reported per item."""
+    ids = _unique_ids(invoice_ids)
+    found = await run_db(_load_invoice_payments, ids)
+    return _batch_results(ids, found, "Invoice {id} not found")
+
+
+async def pay_invoice_async(invoice_id: int, amount: float, method: str = "credit_card") -> Dict[str, Any]:
+    today = datetime.now().strftime("%Y-%m-%d")
+
+    def _query(db: sqlite3.Connection) -> Dict[str, Any]:
+        db.execute(
+            "INSERT INTO Payments(invoice_id, payment_date, amount, method, status) VALUES (?,?,?,?,?)",
+            (invoice_id, today, amount, method, "successful"),
+        )
+        # The insert trigger has already refreshed this invoice's balance.
+        rows = _invoice_rows(db, "WHERE inv.invoice_id = ?", (invoice_id,))
+        if not rows:
+            raise ValueError("Invoice not found")
+        return {"invoice_id": invoice_id, "outstanding": rows[0]["outstanding"]}
+
+    return await run_write(_query)
+
+
+# ========================================================================
+# SECURITY FUNCTIONS
+# ========================================================================
+
+async def get_security_logs_async(customer_id: int) -> List[Dict[str, Any]]:
+    def _query(db: sqlite3.Connection) -> List[Dict[str, Any]]:
+        rows = db.execute(
+            "SELECT log_id, event_type, event_timestamp, description "
+            "FROM SecurityLogs WHERE customer_id = ? ORDER BY event_timestamp DESC",
+            (customer_id,),
+        ).fetchall()
+        return [dict(r) for r in rows]
+
+    return await run_db(_query)
+
+
+async def unlock_account_async(customer_id: int) -> Dict[str, str]:
+    def _query(db: sqlite3.Connection) -> Dict[str, str]:
+        row = db.execute(
+            "SELECT 1 FROM SecurityLogs WHERE customer_id = ? AND event_type = 'account_locked' "
+            "ORDER BY event_timestamp DESC LIMIT 1",
+            (customer_id,),
+        ).fetchone()
+        if not row:
+            raise ValueError("No recent lock event; nothing to do.")
+        db.execute(
+            "INSERT INTO SecurityLogs (customer_id, event_type, event_timestamp, description) "
+            "VALUES (?, 'account_unlocked', ?, 'Unlocked via API')",
+            (customer_id, datetime.now().strftime("%Y-%m-%d %H:%M:%S")),
+        )
+        return {"message": "Account unlocked"}
+
+    return await run_write(_query)
+
+
+# ========================================================================
+# PRODUCT FUNCTIONS
+# ========================================================================
+
+async def get_products_async(category: Optional[str] = None) -> List[Dict[str, Any]]:
+    def _query(db: sqlite3.Connection) -> List[Dict[str, Any]]:
+        if category:
+            rows = db.execute("SELECT * FROM Products WHERE category = ?", (category,)).fetchall()
+        else:
+            rows = db.execute("SELECT * FROM Products").fetchall()
+        return [dict(r) for r in rows]
+
+    return await run_db(_query)
+
+
+async def get_product_detail_async(product_id: int) -> Dict[str, Any]:
+    def _query(db: sqlite3.Connection) -> Optional[sqlite3.Row]:
+        return db.execute("SELECT * FROM Products WHERE product_id = ?", (product_id,)).fetchone()
+
+    r = await run_db(_query)
+    if not r:
+        raise ValueError("Product not found")
+    return dict(r)
+
+
+# ========================================================================
+# PROMOTION FUNCTIONS
+# ========================================================================
+
+async def get_promotions_async() -> List[Dict[str, Any]]:
+    def _query(db: sqlite3.Connection) -> List[Dict[str, Any]]:
+        rows = db.execute("SELECT * FROM Promotions").fetchall()
+        return [dict(r) for r in rows]
+
+    return await run_db(_query)
+
+
+async def get_eligible_promotions_async(customer_id: int) -> List[Dict[str, Any]]:
+    today = datetime.now().strftime("%Y-%m-%d")
+
+    def _query(db: sqlite3.Connection) -> tuple:
+        cust = db.execute("SELECT loyalty_level FROM Customers WHERE customer_id = ?", (customer_id,)).fetchone()
+        if not cust:
+            raise ValueError("Customer not found")
+        rows = db.execute(
+            "SELECT * FROM Promotions WHERE start_date <= ? AND end_date >= ?",
+            (today, today),
+        ).fetchall()
+        return cust["loyalty_level"], rows
+
+    loyalty, rows = await run_db(_query)
+
+    eligible = []
+    for r in rows:
+        crit = r["eligibility_criteria"] or ""
+        if f"loyalty_level = '{loyalty}'" in crit or "loyalty_level" not in crit:
+            eligible.append(dict(r))
+    return eligible
+
+
+# ========================================================================
+# SUPPORT FUNCTIONS
+# ========================================================================
+
+async def get_support_tickets_async(customer_id: int, open_only: bool = False) -> List[Dict[str, Any]]:
+    query = "SELECT * FROM SupportTickets WHERE customer_id = ?"
+    if open_only:
+        query += " AND status != 'closed'"
+
+    def _query(db: sqlite3.Connection) -> List[Dict[str, Any]]:
+        rows = db.execute(query, (customer_id,)).fetchall()
+        return [dict(r) for r in rows]
+
+    return await run_db(_query)
+
+
+async def create_support_ticket_async(customer_id: int, subscription_id: int, category: str, priority: str, subject: str, description: str) -> Dict[str, Any]:
+    opened = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    def _query(db: sqlite3.Connection) -> Dict[str, Any]:
+        cur = db.execute(
+            """INSERT INTO SupportTickets
+               (customer_id, subscription_id, category, opened_at, closed_at,
+                status, priority, subject, description, cs_agent)
+               VALUES (?,?,?,?,?,?,?,?,?,?)""",
+            (customer_id, subscription_id, category, opened, None, "open", priority, subject, description, "AI_Bot"),
+        )
+        row = db.execute("SELECT * FROM SupportTickets WHERE ticket_id = ?", (cur.lastrowid,)).fetchone()
+        return dict(row)
+
+    return await run_write(_query)
+
+
+# ========================================================================
+# KNOWLEDGE BASE FUNCTIONS
+# ========================================================================
+
+# Embeddings are loaded once into a normalised float32 matrix and reloaded
+# whenever KnowledgeDocuments changes; an FTS5 table adds BM25 retrieval.
+KB_SEARCH_MODE = os.getenv("KB_SEARCH_MODE", "hybrid")
+_kb_index = KnowledgeBaseIndex(
+    candidates=int(os.getenv("KB_HYBRID_CANDIDATES", "100")),
+    prefilter=os.getenv("KB_HYBRID_PREFILTER", "true").lower() in ("true", "1", "yes", "on"),
+    # Optional IVF index built offline with `python ann_index.py build`.
+    ann_path=os.getenv("KB_ANN_PATH", f"{DB_PATH}.ivf"),
+    nprobe=int(os.getenv("KB_ANN_NPROBE", "8")),
+)
+
+
+async def search_knowledge_base_async(query: str, topk: int = 3, mode: Optional[str] = None) -> List[Dict[str, Any]]:
+    mode = mode or KB_SEARCH_MODE
+    query_emb = None if mode == "lexical" else await embedding_service.embed(query)
+    return await run_db(_kb_index.search, query_emb, topk, query, mode)
@@ -9,12 +9,21 @@ Major changes vs v1
 ───────────────────  
 • deterministic RNG  (random.seed / Faker.seed)  for identical re‑runs  
 • indexes on all FK columns  → faster joins for the agent  
+• composite / covering indexes for every hot tool query (see ../query_plan_audit.py)  
 • write_md_block()  now prints Challenge + Solution  
 • richer scenario data (partial/failed payments, usage that exceeds caps, etc.)  
 • optional Azure OpenAI embeddings – falls back to zero‑vector if creds missing  
+• KB embeddings stored as binary float32 BLOBs instead of JSON text  
+• KB embeddings requested in batches instead of one call per document  
+• --scale N  load‑testing mode: N extra bulk customers with proportional  
+  subscriptions / invoices / payments / usage, deterministic per --seed and  
+  --base-date, optionally generated in parallel (--jobs); see scale_data.py  
+  
+    python create_db.py                                   # contoso.db  
+    python create_db.py --scale 1000000 --jobs 8          # contoso_scale.db  
 """  
   
-import os, random, json, math, sqlite3, contextlib  
+import os, sys, random, json, math, sqlite3, contextlib, struct, argparse, time, shutil  
 from datetime import datetime, timedelta  
 from pathlib import Path  
 from faker import Faker  
@@ -35,22 +44,35 @@ def try_import_openai():
   
 AzureOpenAI = try_import_openai()  
   
-def get_embedding(text: str):  
-    """Return embedding list[float]; dummy zeros when Azure creds unavailable."""  
+def get_embeddings(texts, batch_size: int = 256):  
+    """Return one embedding list[float] per text, in as few API calls as possible;  
+    dummy zeros when Azure creds unavailable."""  
     if (  
         AzureOpenAI is None  
         or not os.getenv("AZURE_OPENAI_API_KEY")  
         or not os.getenv("AZURE_OPENAI_ENDPOINT")  
     ):  
-        return [0.0] * 1536                                   # gpt‑4‑class size  
+        return [[0.0] * 1536 for _ in texts]                  # gpt‑4‑class size  
     client = AzureOpenAI(  
         api_key=os.getenv("AZURE_OPENAI_API_KEY"),  
         api_version=os.getenv("AZURE_OPENAI_API_VERSION"),  
         azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),  
     )  
     model = os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT")  
-    text = text.replace("\n", " ")  
-    return client.embeddings.create(input=[text], model=model).data[0].embedding  
+    texts = [t.replace("\n", " ") for t in texts]  
+    vectors = []  
+    for i in range(0, len(texts), batch_size):  
+        data = client.embeddings.create(input=texts[i:i + batch_size], model=model).data  
+        vectors.extend(d.embedding for d in sorted(data, key=lambda d: d.index))  
+    return vectors  
+  
+def get_embedding(text: str):  
+    """Return embedding list[float]; dummy zeros when Azure creds unavailable."""  
+    return get_embeddings([text])[0]  
+  
+def embedding_to_blob(vec) -> bytes:  
+    """Pack an embedding as little-endian float32 (see ../embedding_codec.py)."""  
+    return struct.pack(f"<{len(vec)}f", *vec)  
   
 # ─────────────────────────────  GLOBALS  ─────────────────────────────────  
 DB_NAME   = "contoso.db"  
@@ -59,13 +81,14 @@ BASE_DATE = datetime.now()
 ##############################################################################  
 #                              TABLE DDL                                     #  
 ##############################################################################  
-def create_tables(conn: sqlite3.Connection):  
+def create_tables(conn: sqlite3.Connection, indexes: bool = True):  
     c = conn.cursor()  
   
     # Drop in reverse dependency order just to be safe  
     tables = [  
-        "KnowledgeDocuments", "ServiceIncidents", "DataUsage", "SupportTickets",  
-        "Orders", "SecurityLogs", "Promotions", "Payments", "Invoices",  
+        "KnowledgeIndexVersion", "KnowledgeDocumentsFTS", "KnowledgeDocuments", "ServiceIncidents",  
+        "DataUsageMonthly", "DataUsageWeekly", "DataUsage", "SupportTickets",  
+        "Orders", "SecurityLogs", "Promotions", "InvoiceBalances", "Payments", "Invoices",  
         "Subscriptions", "Products", "Customers"  
     ]  
     for t in tables:  
@@ -232,25 +255,44 @@ def create_tables(conn: sqlite3.Connection):
             title           TEXT,  
             doc_type        TEXT,  
             content         TEXT,  
-            topic_embedding TEXT  
+            topic_embedding TEXT,             -- legacy JSON; see migrate_embeddings.py  
+            embedding        BLOB,            -- little-endian float32 (or int8)  
+            embedding_dtype  TEXT,  
+            embedding_scale  REAL,  
+            embedding_offset REAL  
         )  
     """)  
   
-    # ────────────────────────── Indexes for fast lookup ─────────────────  
-    idx_cmds = [  
-        "CREATE INDEX idx_subs_customer    ON Subscriptions(customer_id)",  
-        "CREATE INDEX idx_inv_sub          ON Invoices(subscription_id)",  
-        "CREATE INDEX idx_pay_inv          ON Payments(invoice_id)",  
-        "CREATE INDEX idx_usage_sub        ON DataUsage(subscription_id)",  
-        "CREATE INDEX idx_tickets_cust     ON SupportTickets(customer_id)",  
-        "CREATE INDEX idx_tickets_sub      ON SupportTickets(subscription_id)",  
-        "CREATE INDEX idx_inc_sub          ON ServiceIncidents(subscription_id)",  
-    ]  
-    for cmd in idx_cmds:  
-        c.execute(cmd)  
+    if indexes:  
+        create_indexes(conn)  
+    conn.commit()  
+  
   
+# ────────────────────────── Indexes for fast lookup ─────────────────────  
+INDEX_DDL = [  
+    # Keep in sync with ../migrate_indexes.py (upgrades existing DBs)  
+    "CREATE INDEX idx_subs_customer      ON Subscriptions(customer_id)",  
+    "CREATE INDEX idx_inv_sub            ON Invoices(subscription_id)",  
+    "CREATE INDEX idx_pay_inv_status     ON Payments(invoice_id, status, amount)",  
+    "CREATE INDEX idx_usage_sub_date     ON DataUsage(subscription_id, usage_date, data_used_mb, voice_minutes, sms_count)",  
+    "CREATE INDEX idx_tickets_cust_status ON SupportTickets(customer_id, status)",  
+    "CREATE INDEX idx_tickets_sub        ON SupportTickets(subscription_id)",  
+    "CREATE INDEX idx_inc_sub            ON ServiceIncidents(subscription_id)",  
+    "CREATE INDEX idx_seclogs_cust_time  ON SecurityLogs(customer_id, event_timestamp)",  
+    "CREATE INDEX idx_seclogs_cust_event ON SecurityLogs(customer_id, event_type, event_timestamp)",  
+    "CREATE INDEX idx_orders_cust_date   ON Orders(customer_id, order_date)",  
+    "CREATE INDEX idx_products_category  ON Products(category)",  
+    "CREATE INDEX idx_customers_loyalty  ON Customers(loyalty_level)",  
+]  
+  
+  
+def create_indexes(conn: sqlite3.Connection):  
+    """Secondary indexes; bulk loads (--scale) build them after inserting."""  
+    for cmd in INDEX_DDL:  
+        conn.execute(cmd)  
     conn.commit()  
   
+  
 ##############################################################################  
 #                              DATA SEEDING                                  #  
 ##############################################################################  
@@ -1081,26 +1123,94 @@ def populate_data(conn: sqlite3.Connection, markdown_file="customer_scenarios.md
     # ========================= 3. KNOWLEDGE BASE ===========================  
     with open("kb.json", "r", encoding="utf-8") as jf:  
         kb_docs = json.load(jf)  
-    for doc in kb_docs:  
-        c.execute(  
-            """INSERT INTO KnowledgeDocuments(title,doc_type,content,topic_embedding)  
-               VALUES (?,?,?,?)""",  
+    vectors = get_embeddings([doc["document_title"] for doc in kb_docs])  
+    c.executemany(  
+        """INSERT INTO KnowledgeDocuments(title,doc_type,content,embedding,embedding_dtype)  
+           VALUES (?,?,?,?,?)""",  
+        [  
             (  
                 doc["document_title"],  
                 doc["doc_type"],  
                 doc["document_content"],  
-                json.dumps(get_embedding(doc["document_title"])),  
-            ),  
-        )  
+                embedding_to_blob(vec),  
+                "float32",  
+            )  
+            for doc, vec in zip(kb_docs, vectors)  
+        ],  
+    )  
   
     conn.commit()  
   
   
 ##############################################################################  
+def drop_ann_index(db_path: str):  
+    """Remove the <db>.ivf ANN index built from the previous contents (see mcp/ann_index.py)."""  
+    shutil.rmtree(f"{db_path}.ivf", ignore_errors=True)  
+  
+  
+def derive_tables(db_path: str):  
+    """Derived tables + WAL (mcp/migrate_schema.py), so the server never runs DDL."""  
+    mcp_dir = str(Path(__file__).resolve().parents[1])  
+    if mcp_dir not in sys.path:  
+        sys.path.append(mcp_dir)  
+    from migrate_schema import prepare_database  
+  
+    prepare_database(db_path)  
+  
+  
+##############################################################################  
+def build_scaled(args):  
+    """--scale: regular data plus args.scale bulk customers (see scale_data.py)."""  
+    import scale_data  
+  
+    global BASE_DATE  
+    BASE_DATE = args.base_date  
+    random.seed(args.seed)  
+    fake.seed_instance(args.seed)  
+    out = Path(args.out)  
+    out.unlink(missing_ok=True)  
+    drop_ann_index(str(out))  
+    t0 = time.perf_counter()  
+    with contextlib.closing(scale_data.bulk_connection(str(out))) as conn:  
+        create_tables(conn, indexes=False)  
+        populate_data(conn, markdown_file=str(out.with_suffix(".md")))  
+        spec = scale_data.ScaleSpec(  
+            customers=args.scale, seed=args.seed, base_date=args.base_date,  
+            chunk_size=args.chunk_size, invoices=args.invoices, usage_days=args.usage_days,  
+        )  
+        scale_data.add_scale_data(conn, spec, jobs=args.jobs)  
+    scale_data.finalize(str(out), INDEX_DDL)  
+    with contextlib.closing(sqlite3.connect(str(out))) as conn:  
+        counts = {t: conn.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0]  
+                  for t in ("Customers", "Subscriptions", "Invoices", "Payments", "DataUsage")}  
+    print(f"✅  {out} generated in {time.perf_counter() - t0:.0f}s: "  
+          + ", ".join(f"{n:,} {t}" for t, n in counts.items()))  
+  
+  
 def main():  
-    with contextlib.closing(sqlite3.connect(DB_NAME)) as conn:  
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)  
+    parser.add_argument("--scale", type=int, default=0,  
+                        help="add this many bulk customers (load-testing database)")  
+    parser.add_argument("--out", help=f"database file (default {DB_NAME}; contoso_scale.db with --scale)")  
+    parser.add_argument("--seed", type=int, default=SEED)  
+    parser.add_argument("--base-date", type=lambda v: datetime.strptime(v, "%Y-%m-%d"),  
+                        default=BASE_DATE.replace(hour=0, minute=0, second=0, microsecond=0),  
+                        help="'today' of the --scale data, YYYY-MM-DD (default: today)")  
+    parser.add_argument("--jobs", type=int, default=1, help="--scale generator processes")  
+    parser.add_argument("--chunk-size", type=int, default=5000, help="--scale customers per transaction")  
+    parser.add_argument("--invoices", type=int, default=11, help="--scale invoices per subscription (±3)")  
+    parser.add_argument("--usage-days", type=int, default=60, help="--scale usage days per subscription")  
+    args = parser.parse_args()  
+  
+    if args.scale > 0:  
+        args.out = args.out or "contoso_scale.db"  
+        build_scaled(args)  
+        return  
+    drop_ann_index(args.out or DB_NAME)  
+    with contextlib.closing(sqlite3.connect(args.out or DB_NAME)) as conn:  
         create_tables(conn)  
         populate_data(conn)  
+    derive_tables(args.out or DB_NAME)  
     print("✅  contoso.db generated and customer_scenarios.md exported.")  
   
   
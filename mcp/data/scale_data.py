@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+"""
+Bulk synthetic customers for load testing (``create_db.py --scale N``).
+
+Adds ``N`` customers on top of the regular 250 + scenario data, with the
+same proportions as the small database: 1–3 subscriptions per customer,
+``--invoices`` (±3) invoices per subscription with one payment each,
+``--usage-days`` days of usage per subscription, and tickets, orders,
+security events and incidents at the small database's rates.
+
+* Customers are generated in chunks of ``--chunk-size``.  Each chunk draws
+  from its own RNG seeded with ``(seed, chunk)``, and names, addresses and
+  sentences come from Faker pools built once per seed.  The output
+  therefore depends only on the seed, the base date and the sizes, never on
+  ``--jobs``.
+* Rows are streamed through ``executemany`` in one transaction per chunk,
+  with journaling and syncing switched off for the load.  Indexes, derived
+  tables (invoice balances, usage roll-ups, KB full-text index) and
+  ``ANALYZE`` are built once, after all rows are in.
+* With ``--jobs > 1`` chunks are generated in worker processes, each into
+  its own shard database.  The parent attaches the shards in chunk order
+  and copies them in with ``INSERT … SELECT``, shifting subscription and
+  invoice ids.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import multiprocessing
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+from faker import Faker
+
+BULK_PRAGMAS = [
+    "PRAGMA journal_mode = OFF",
+    "PRAGMA synchronous = OFF",
+    "PRAGMA locking_mode = EXCLUSIVE",
+    "PRAGMA temp_store = MEMORY",
+    f"PRAGMA cache_size = -{int(os.getenv('SCALE_CACHE_MB', '256')) * 1024}",
+]
+
+LOYALTY = (["Bronze", "Silver", "Gold"], [0.5, 0.35, 0.15])
+SUBS_PER_CUSTOMER = ([1, 2, 3], [0.75, 0.20, 0.05])
+SPEED_TIERS = ["50Mbps", "100Mbps", "300Mbps", "1Gbps"]
+SERVICE_STATUS = (["normal", "slow", "offline"], [0.8, 0.15, 0.05])
+DATA_CAPS = [10, 20, 50, 100, None]
+PAYMENT_METHODS = ["credit_card", "ach", "paypal", "apple_pay"]
+TICKET_CATEGORIES = ["billing", "technical", "account", "call_drop", "sms_issue"]
+TICKET_PRIORITIES = ["low", "normal", "high", "urgent"]
+TICKET_STATUS = ["open", "pending", "closed"]
+ORDER_STATUS = ["delivered", "completed", "pending", "returned"]
+EVENT_TYPES = ["login_attempt", "account_locked"]
+# Per-customer / per-subscription rates of the small (250 customer) database.
+TICKETS_PER_CUSTOMER = 0.48
+ORDERS_PER_CUSTOMER = 0.48
+SECURITY_EVENTS_PER_CUSTOMER = 0.16
+INCIDENTS_PER_SUBSCRIPTION = 0.24
+
+
+@dataclass(frozen=True)
+class ScaleSpec:
+    customers: int
+    seed: int
+    base_date: datetime
+    chunk_size: int = 5000
+    invoices: int = 11
+    usage_days: int = 60
+
+
+@dataclass(frozen=True)
+class Pools:
+    first: List[str]
+    last: List[str]
+    streets: List[str]
+    cities: List[str]
+    sentences: List[str]
+    texts: List[str]
+
+
+def build_pools(seed: int) -> Pools:
+    """Faker output sampled once; per-row Faker calls dominate at scale."""
+    fake = Faker()
+    fake.seed_instance(seed)
+    return Pools(
+        first=[fake.first_name() for _ in range(2000)],
+        last=[fake.last_name() for _ in range(2000)],
+        streets=[fake.street_address() for _ in range(2000)],
+        cities=[f"{fake.city()}, {fake.state_abbr()} {fake.zipcode()}" for _ in range(500)],
+        sentences=[fake.sentence(nb_words=8) for _ in range(1000)],
+        texts=[fake.text(max_nb_chars=120) for _ in range(500)],
+    )
+
+
+# ────────────────────────────  ONE CHUNK  ──────────────────────────────
+def generate_chunk(
+    conn: sqlite3.Connection,
+    spec: ScaleSpec,
+    pools: Pools,
+    product_ids: Sequence[int],
+    chunk: int,
+    first_customer_id: int,
+    count: int,
+    sub_offset: int,
+    invoice_offset: int,
+) -> Tuple[int, int]:
+    """Insert ``count`` customers and their rows; returns (subscriptions, invoices).
+
+    Subscription and invoice ids are ``offset + 1, offset + 2, …`` in
+    generation order, so a shard generated with zero offsets can be shifted
+    on merge and match a sequential run exactly.
+    """
+    rng = random.Random(f"{spec.seed}:{chunk}")
+    # day(n): the date n days before the base date (negative: after it).
+    past = max(spec.usage_days, 460)
+    dates = [(spec.base_date - timedelta(days=d)).strftime("%Y-%m-%d") for d in range(-400, past)]
+
+    def day(days_ago: int) -> str:
+        return dates[days_ago + 400]
+
+    def stamp(minutes_ago: int) -> str:
+        return (spec.base_date - timedelta(minutes=minutes_ago)).strftime("%Y-%m-%d %H:%M:%S")
+
+    customers, subs, invoices, payments, tickets, orders, logs, incidents = [], [], [], [], [], [], [], []
+    usage_subs: List[int] = []
+    sub_id, invoice_id = sub_offset, invoice_offset
+    for cid in range(first_customer_id, first_customer_id + count):
+        first, last = rng.choice(pools.first), rng.choice(pools.last)
+        customers.append((
+            cid, first, last, f"{first}.{last}.{cid}@example.com".lower(),
+            f"555-{rng.randrange(10_000_000):07d}",
+            f"{rng.choice(pools.streets)}, {rng.choice(pools.cities)}",
+            rng.choices(*LOYALTY)[0],
+        ))
+        own_subs = []
+        for _ in range(rng.choices(*SUBS_PER_CUSTOMER)[0]):
+            sub_id += 1
+            own_subs.append(sub_id)
+            usage_subs.append(sub_id)
+            start = rng.randint(60, 450)
+            subs.append((
+                sub_id, cid, rng.choice(product_ids), day(start), day(start - 365),
+                "active" if rng.random() < 0.88 else "inactive", rng.randint(0, 1),
+                rng.choices(*SERVICE_STATUS)[0], rng.choice(SPEED_TIERS), rng.choice(DATA_CAPS), rng.randint(0, 1),
+            ))
+            for _ in range(rng.randint(max(1, spec.invoices - 3), spec.invoices + 3)):
+                invoice_id += 1
+                issued = rng.randint(15, 120)
+                amount = round(rng.uniform(40, 130), 2)
+                due = issued - 14
+                invoices.append((invoice_id, sub_id, day(issued), amount, rng.choice(pools.sentences), day(due)))
+                roll = rng.random()
+                if roll < 0.75:
+                    status, paid = "successful", amount
+                elif roll < 0.85:
+                    status, paid = "failed", 0
+                else:
+                    status, paid = "partial", round(amount * rng.uniform(0.2, 0.8), 2)
+                paid_on = day(due - rng.randint(0, min(10, due)))
+                payments.append((invoice_id, paid_on, paid, rng.choice(PAYMENT_METHODS), status))
+            if rng.random() < INCIDENTS_PER_SUBSCRIPTION:
+                incidents.append((sub_id, day(rng.randint(1, 90)), rng.choice(pools.sentences),
+                                  rng.choice(["investigating", "resolved"])))
+        if rng.random() < TICKETS_PER_CUSTOMER:
+            opened = rng.randint(60, 120_000)
+            status = rng.choice(TICKET_STATUS)
+            tickets.append((
+                cid, rng.choice(own_subs), rng.choice(TICKET_CATEGORIES), stamp(opened),
+                stamp(max(0, opened - rng.randint(60, 2880))) if status == "closed" else None, status,
+                rng.choice(TICKET_PRIORITIES), rng.choice(pools.sentences), rng.choice(pools.texts),
+                rng.choice(pools.first),
+            ))
+        if rng.random() < ORDERS_PER_CUSTOMER:
+            orders.append((cid, rng.choice(product_ids), day(rng.randint(1, 120)),
+                           round(rng.uniform(10, 100), 2), rng.choice(ORDER_STATUS)))
+        if rng.random() < SECURITY_EVENTS_PER_CUSTOMER:
+            logs.append((cid, rng.choice(EVENT_TYPES), stamp(rng.randint(1, 3000)), rng.choice(pools.sentences)))
+
+    def usage() -> Iterator[tuple]:
+        # The largest table: streamed, never materialised.
+        for sid in usage_subs:
+            for d in range(spec.usage_days):
+                yield sid, day(d), rng.randint(50, 1200), rng.randint(0, 60), rng.randint(0, 40)
+
+    with conn:
+        conn.executemany("INSERT INTO Customers(customer_id,first_name,last_name,email,phone,address,loyalty_level) "
+                         "VALUES (?,?,?,?,?,?,?)", customers)
+        conn.executemany("INSERT INTO Subscriptions(subscription_id,customer_id,product_id,start_date,end_date,status,"
+                         "roaming_enabled,service_status,speed_tier,data_cap_gb,autopay_enabled) "
+                         "VALUES (?,?,?,?,?,?,?,?,?,?,?)", subs)
+        conn.executemany("INSERT INTO Invoices(invoice_id,subscription_id,invoice_date,amount,description,due_date) "
+                         "VALUES (?,?,?,?,?,?)", invoices)
+        conn.executemany("INSERT INTO Payments(invoice_id,payment_date,amount,method,status) VALUES (?,?,?,?,?)",
+                         payments)
+        conn.executemany("INSERT INTO DataUsage(subscription_id,usage_date,data_used_mb,voice_minutes,sms_count) "
+                         "VALUES (?,?,?,?,?)", usage())
+        conn.executemany("INSERT INTO SupportTickets(customer_id,subscription_id,category,opened_at,closed_at,status,"
+                         "priority,subject,description,cs_agent) VALUES (?,?,?,?,?,?,?,?,?,?)", tickets)
+        conn.executemany("INSERT INTO Orders(customer_id,product_id,order_date,amount,order_status) VALUES (?,?,?,?,?)",
+                         orders)
+        conn.executemany("INSERT INTO SecurityLogs(customer_id,event_type,event_timestamp,description) VALUES (?,?,?,?)",
+                         logs)
+        conn.executemany("INSERT INTO ServiceIncidents(subscription_id,incident_date,description,resolution_status) "
+                         "VALUES (?,?,?,?)", incidents)
+    return sub_id - sub_offset, invoice_id - invoice_offset
+
+
+# ──────────────────────────  PARALLEL SHARDS  ──────────────────────────
+# (table, column list with {sub}/{inv} shifts); surrogate keys are reassigned.
+_MERGE = [
+    ("Customers", "customer_id, first_name, last_name, email, phone, address, loyalty_level", None),
+    ("Subscriptions", "subscription_id + {sub}, customer_id, product_id, start_date, end_date, status, "
+                      "roaming_enabled, service_status, speed_tier, data_cap_gb, autopay_enabled", "subscription_id"),
+    ("Invoices", "invoice_id + {inv}, subscription_id + {sub}, invoice_date, amount, description, due_date",
+     "invoice_id"),
+    ("Payments", "invoice_id + {inv}, payment_date, amount, method, status", "payment_id"),
+    ("DataUsage", "subscription_id + {sub}, usage_date, data_used_mb, voice_minutes, sms_count", "usage_id"),
+    ("SupportTickets", "customer_id, subscription_id + {sub}, category, opened_at, closed_at, status, priority, "
+                       "subject, description, cs_agent", "ticket_id"),
+    ("Orders", "customer_id, product_id, order_date, amount, order_status", "order_id"),
+    ("SecurityLogs", "customer_id, event_type, event_timestamp, description", "log_id"),
+    ("ServiceIncidents", "subscription_id + {sub}, incident_date, description, resolution_status", "incident_id"),
+]
+
+
+def _target_columns(select: str) -> str:
+    return ", ".join(part.split("+")[0].strip() for part in select.split(", "))
+
+
+def _shard_worker(task: Tuple[ScaleSpec, List[int], int, int, int, str]) -> Tuple[int, str, int, int]:
+    from create_db import create_tables
+
+    spec, product_ids, chunk, first_customer_id, count, directory = task
+    path = os.path.join(directory, f"shard-{chunk:06d}.db")
+    with contextlib.closing(sqlite3.connect(path)) as conn:
+        for pragma in BULK_PRAGMAS:
+            conn.execute(pragma)
+        create_tables(conn, indexes=False)
+        n_subs, n_invs = generate_chunk(conn, spec, _pools(spec.seed), product_ids, chunk, first_customer_id, count, 0, 0)
+    return chunk, path, n_subs, n_invs
+
+
+_POOLS: Dict[int, Pools] = {}
+
+
+def _pools(seed: int) -> Pools:
+    if seed not in _POOLS:
+        _POOLS[seed] = build_pools(seed)
+    return _POOLS[seed]
+
+
+def merge_shard(conn: sqlite3.Connection, path: str, sub_offset: int, invoice_offset: int) -> None:
+    conn.execute("ATTACH DATABASE ? AS shard", (path,))
+    try:
+        with conn:
+            for table, select, order in _MERGE:
+                select = select.format(sub=sub_offset, inv=invoice_offset)
+                conn.execute(
+                    f"INSERT INTO main.{table}({_target_columns(select)}) SELECT {select} FROM shard.{table}"
+                    + (f" ORDER BY {order}" if order else "")
+                )
+    finally:
+        conn.execute("DETACH DATABASE shard")
+
+
+# ─────────────────────────────  DRIVER  ────────────────────────────────
+def _max_id(conn: sqlite3.Connection, table: str, column: str) -> int:
+    return conn.execute(f"SELECT IFNULL(MAX({column}), 0) FROM {table}").fetchone()[0]
+
+
+def add_scale_data(conn: sqlite3.Connection, spec: ScaleSpec, jobs: int = 1, log=print) -> None:
+    """Append ``spec.customers`` synthetic customers to an index-free database."""
+    product_ids = [r[0] for r in conn.execute("SELECT product_id FROM Products ORDER BY product_id")]
+    next_customer = _max_id(conn, "Customers", "customer_id") + 1
+    sub_offset = _max_id(conn, "Subscriptions", "subscription_id")
+    invoice_offset = _max_id(conn, "Invoices", "invoice_id")
+    chunks = [
+        (chunk, next_customer + start, min(spec.chunk_size, spec.customers - start))
+        for chunk, start in enumerate(range(0, spec.customers, spec.chunk_size))
+    ]
+    t0 = time.perf_counter()
+    if jobs <= 1:
+        pools = _pools(spec.seed)
+        for chunk, first_id, count in chunks:
+            n_subs, n_invs = generate_chunk(conn, spec, pools, product_ids, chunk, first_id, count,
+                                            sub_offset, invoice_offset)
+            sub_offset, invoice_offset = sub_offset + n_subs, invoice_offset + n_invs
+            log(f"   chunk {chunk + 1}/{len(chunks)}  {first_id + count - next_customer:,} customers  "
+                f"{time.perf_counter() - t0:.1f}s")
+        return
+    with tempfile.TemporaryDirectory(dir=os.getenv("SCALE_SHARD_DIR")) as tmp:
+        tasks = [(spec, product_ids, chunk, first_id, count, tmp) for chunk, first_id, count in chunks]
+        with multiprocessing.get_context("spawn").Pool(jobs) as pool:
+            # imap keeps chunk order, so merging overlaps with generation
+            # and ids come out exactly as in a sequential run.
+            for chunk, path, n_subs, n_invs in pool.imap(_shard_worker, tasks):
+                merge_shard(conn, path, sub_offset, invoice_offset)
+                os.remove(path)
+                sub_offset, invoice_offset = sub_offset + n_subs, invoice_offset + n_invs
+                log(f"   chunk {chunk + 1}/{len(chunks)} merged  {time.perf_counter() - t0:.1f}s")
+
+
+def finalize(path: str, index_ddl: Sequence[str], log=print) -> None:
+    """Indexes, derived tables and statistics after the bulk load; WAL for serving."""
+    mcp_dir = str(Path(__file__).resolve().parents[1])
+    if mcp_dir not in sys.path:
+        sys.path.append(mcp_dir)
+    from migrate_schema import migrate
+
+    with contextlib.closing(sqlite3.connect(path)) as conn:
+        conn.execute("PRAGMA synchronous = OFF")
+        conn.execute(f"PRAGMA cache_size = -{int(os.getenv('SCALE_CACHE_MB', '256')) * 1024}")
+        t0 = time.perf_counter()
+        with conn:
+            for ddl in index_ddl:
+                conn.execute(ddl)
+        log(f"   indexes built in {time.perf_counter() - t0:.1f}s")
+        t0 = time.perf_counter()
+        migrate(conn)
+        conn.execute("ANALYZE")
+        conn.execute("PRAGMA journal_mode = WAL")
+        log(f"   derived tables + ANALYZE in {time.perf_counter() - t0:.1f}s")
+
+
+def bulk_connection(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path)
+    for pragma in BULK_PRAGMAS:
+        conn.execute(pragma)
+    return conn
@@ -0,0 +1,412 @@
+"""Pooled, non-blocking SQLite access for the Contoso tools.
+
+Every tool in ``contoso_tools`` used to open a brand-new ``sqlite3``
+connection and run its queries directly on the event loop.  This module
+replaces that with a small pool:
+
+* a bounded ``ThreadPoolExecutor`` runs all blocking SQLite work off the
+  event loop;
+* each worker thread owns one long-lived connection (so the pool size is the
+  executor size) configured with a busy timeout and a per-connection
+  prepared-statement cache (WAL is switched on once by ``migrate_schema``);
+* callers hand the pool a plain function ``fn(db, *args)`` which runs on a
+  worker with its connection.  A failed unit of work is rolled back before
+  the connection is reused.
+
+Writes go through :class:`GroupCommitWriter` instead: one writer thread per
+database drains a queue of write functions and runs every request waiting
+at that moment in a single ``BEGIN IMMEDIATE`` transaction (group commit).
+Each request runs under its own savepoint, so a failing request is rolled
+back and reported to its caller alone.  Callers get their own result only
+after the shared ``COMMIT``.  A busy database (another process writing) is
+retried with back-off for up to ``DB_WRITE_RETRY_SECONDS``; a caller waits
+at most ``DB_WRITE_TIMEOUT_SECONDS`` for its commit.
+
+Usage::
+
+    pool = SQLitePool("data/contoso.db", size=8)
+    rows = await pool.run(lambda db: db.execute("SELECT 1").fetchall())
+
+    writer = get_writer("data/contoso.db")
+    row_id = await writer.submit(lambda db: db.execute("INSERT ...").lastrowid)
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "8"))
+DEFAULT_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+DEFAULT_STATEMENT_CACHE = int(os.getenv("DB_STATEMENT_CACHE", "256"))
+DEFAULT_WRITE_BATCH = int(os.getenv("DB_WRITE_BATCH", "256"))
+DEFAULT_WRITE_LINGER_MS = float(os.getenv("DB_WRITE_LINGER_MS", "0"))
+DEFAULT_WRITE_RETRY_SECONDS = float(os.getenv("DB_WRITE_RETRY_SECONDS", "30"))
+DEFAULT_WRITE_TIMEOUT_SECONDS = float(os.getenv("DB_WRITE_TIMEOUT_SECONDS", "60"))
+
+
+def configure_connection(db: sqlite3.Connection, busy_timeout_ms: int = DEFAULT_BUSY_TIMEOUT_MS) -> sqlite3.Connection:
+    """Apply the pragmas every Contoso connection should run with."""
+    db.row_factory = sqlite3.Row
+    db.execute(f"PRAGMA busy_timeout = {int(busy_timeout_ms)}")
+    # WAL (readers proceed while a writer holds the lock) is persistent in
+    # the DB file and set once by migrate_schema.prepare_database, not here:
+    # switching it writes to the database.
+    db.execute("PRAGMA synchronous = NORMAL")
+    db.execute("PRAGMA temp_store = MEMORY")
+    return db
+
+
+def open_connection(
+    path: str,
+    *,
+    busy_timeout_ms: int = DEFAULT_BUSY_TIMEOUT_MS,
+    cached_statements: int = DEFAULT_STATEMENT_CACHE,
+    check_same_thread: bool = True,
+) -> sqlite3.Connection:
+    """Open a configured connection (busy timeout, statement cache)."""
+    db = sqlite3.connect(
+        path,
+        timeout=busy_timeout_ms / 1000.0,
+        cached_statements=cached_statements,
+        check_same_thread=check_same_thread,
+    )
+    return configure_connection(db, busy_timeout_ms)
+
+
+class SQLitePool:
+    """Fixed-size pool of SQLite connections served by worker threads."""
+
+    def __init__(
+        self,
+        path: str,
+        *,
+        size: int = DEFAULT_POOL_SIZE,
+        busy_timeout_ms: int = DEFAULT_BUSY_TIMEOUT_MS,
+        cached_statements: int = DEFAULT_STATEMENT_CACHE,
+    ):
+        if size < 1:
+            raise ValueError("Pool size must be at least 1")
+        self.path = path
+        self.size = size
+        self.busy_timeout_ms = busy_timeout_ms
+        self.cached_statements = cached_statements
+        self._executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix="contoso-db")
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        self._closed = False
+
+    # ------------------------------------------------------------------ #
+    def _thread_connection(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = open_connection(
+                self.path,
+                busy_timeout_ms=self.busy_timeout_ms,
+                cached_statements=self.cached_statements,
+                check_same_thread=False,
+            )
+            self._local.db = db
+            with self._lock:
+                self._connections.append(db)
+        return db
+
+    def _call(self, fn: Callable[..., T], args: tuple, kwargs: Dict[str, Any]) -> T:
+        db = self._thread_connection()
+        try:
+            return fn(db, *args, **kwargs)
+        finally:
+            # Never hand a half-finished transaction to the next caller.
+            if db.in_transaction:
+                db.rollback()
+
+    # ------------------------------------------------------------------ #
+    async def run(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Run ``fn(db, *args, **kwargs)`` on a pooled connection off the loop."""
+        if self._closed:
+            raise RuntimeError("SQLitePool is closed")
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._call, fn, args, kwargs)
+
+    def run_sync(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Blocking variant of :meth:`run` for scripts and non-async callers."""
+        if self._closed:
+            raise RuntimeError("SQLitePool is closed")
+        return self._executor.submit(self._call, fn, args, kwargs).result()
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Dedicated configured connection for synchronous callers."""
+        db = open_connection(
+            self.path,
+            busy_timeout_ms=self.busy_timeout_ms,
+            cached_statements=self.cached_statements,
+        )
+        try:
+            yield db
+        finally:
+            db.close()
+
+    def close(self) -> None:
+        """Shut down the workers and close every pooled connection."""
+        if self._closed:
+            return
+        self._closed = True
+        self._executor.shutdown(wait=True)
+        with self._lock:
+            for db in self._connections:
+                try:
+                    db.close()
+                except sqlite3.Error:
+                    pass
+            self._connections.clear()
+
+
+# ────────────────────────────  GROUP COMMIT  ───────────────────────────
+def _is_busy(exc: BaseException) -> bool:
+    message = str(exc).lower()
+    return isinstance(exc, sqlite3.OperationalError) and ("locked" in message or "busy" in message)
+
+
+class _WriteRequest:
+    __slots__ = ("fn", "args", "loop", "future")
+
+    def __init__(self, fn: Callable[..., Any], args: tuple, loop: asyncio.AbstractEventLoop, future: asyncio.Future):
+        self.fn, self.args, self.loop, self.future = fn, args, loop, future
+
+
+class GroupCommitWriter:
+    """Single writer thread that commits concurrent write requests together.
+
+    ``fn(db, *args)`` must not commit or roll back itself; raising rolls back
+    that request only.  ``batch_size`` bounds how many requests share one
+    transaction (and so how long any of them waits for the commit);
+    ``linger_ms`` optionally holds a transaction open for more requests.
+
+    The connection is opened here, so an unusable database fails the
+    constructor.  If the writer thread dies anyway, queued and later requests
+    fail with its error instead of waiting.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        *,
+        batch_size: int = DEFAULT_WRITE_BATCH,
+        linger_ms: float = DEFAULT_WRITE_LINGER_MS,
+        retry_seconds: float = DEFAULT_WRITE_RETRY_SECONDS,
+        busy_timeout_ms: int = DEFAULT_BUSY_TIMEOUT_MS,
+        timeout_seconds: float = DEFAULT_WRITE_TIMEOUT_SECONDS,
+    ):
+        if batch_size < 1:
+            raise ValueError("Write batch size must be at least 1")
+        self.path = path
+        self.batch_size = batch_size
+        self.linger = linger_ms / 1000.0
+        self.retry_seconds = retry_seconds
+        self.busy_timeout_ms = busy_timeout_ms
+        self.timeout_seconds = timeout_seconds
+        self._db = open_connection(path, busy_timeout_ms=busy_timeout_ms, check_same_thread=False)
+        self._db.isolation_level = None  # explicit BEGIN / SAVEPOINT / COMMIT below
+        self._queue: "queue.Queue[Optional[_WriteRequest]]" = queue.Queue()
+        self._closed = False
+        self._failure: Optional[BaseException] = None
+        self.transactions = 0
+        self.requests = 0
+        self.busy_retries = 0
+        self._thread = threading.Thread(target=self._run, name="contoso-db-writer", daemon=True)
+        self._thread.start()
+
+    # ------------------------------------------------------------------ #
+    async def submit(self, fn: Callable[..., T], *args: Any) -> T:
+        """Queue ``fn(db, *args)``; returns its result once committed.
+
+        Raises ``TimeoutError`` after ``timeout_seconds``; the request is then
+        dropped if it has not started, but may still commit if it has.
+        """
+        if self._failure is not None:
+            raise RuntimeError("GroupCommitWriter stopped") from self._failure
+        if self._closed:
+            raise RuntimeError("GroupCommitWriter is closed")
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._queue.put(_WriteRequest(fn, args, loop, future))
+        if self._failure is not None:  # the thread died while we queued
+            self._fail_queued()
+        try:
+            return await asyncio.wait_for(future, self.timeout_seconds)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"Write not committed within {self.timeout_seconds:g}s") from None
+
+    def close(self) -> None:
+        """Commit what is queued, then stop the writer thread."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+
+    # ------------------------------------------------------------------ #
+    @property
+    def alive(self) -> bool:
+        return self._failure is None and self._thread.is_alive()
+
+    def _run(self) -> None:
+        db = self._db
+        batch: List[_WriteRequest] = []
+        try:
+            while True:
+                batch, stop = self._next_batch()
+                if batch:
+                    self._commit(db, batch)
+                batch = []
+                if stop:
+                    return
+        except BaseException as exc:
+            logger.exception("Group-commit writer for %s stopped", self.path)
+            self._failure = exc
+            for request in batch:
+                _deliver(request, False, _stopped(exc))
+            self._fail_queued()
+        finally:
+            db.close()
+
+    def _fail_queued(self) -> None:
+        while True:
+            try:
+                request = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if request is not None:
+                _deliver(request, False, _stopped(self._failure))
+
+    def _next_batch(self) -> Tuple[List[_WriteRequest], bool]:
+        """Block for one request, then take whatever else is already queued."""
+        first = self._queue.get()
+        if first is None:
+            return [], True
+        batch = [first]
+        deadline = time.monotonic() + self.linger
+        while len(batch) < self.batch_size:
+            try:
+                timeout = deadline - time.monotonic()
+                item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _commit(self, db: sqlite3.Connection, batch: List[_WriteRequest]) -> None:
+        batch = [r for r in batch if not r.future.cancelled()]
+        deadline = time.monotonic() + self.retry_seconds
+        delay = 0.001
+        while True:
+            try:
+                db.execute("BEGIN IMMEDIATE")
+                outcomes = [self._apply(db, r) for r in batch]
+                db.execute("COMMIT")
+                break
+            except sqlite3.Error as exc:
+                if db.in_transaction:
+                    db.execute("ROLLBACK")
+                if not _is_busy(exc) or time.monotonic() + delay > deadline:
+                    logger.warning("Write transaction of %d request(s) failed: %s", len(batch), exc)
+                    outcomes = [(False, exc)] * len(batch)
+                    break
+                # Another process holds the write lock past our busy timeout:
+                # back off and re-run the whole batch.
+                self.busy_retries += 1
+                time.sleep(delay)
+                delay = min(delay * 2, 0.1)
+        self.transactions += 1
+        self.requests += len(batch)
+        for request, (ok, value) in zip(batch, outcomes):
+            _deliver(request, ok, value)
+
+    @staticmethod
+    def _apply(db: sqlite3.Connection, request: _WriteRequest) -> Tuple[bool, Any]:
+        db.execute("SAVEPOINT request")
+        try:
+            result = request.fn(db, *request.args)
+        except Exception as exc:
+            if _is_busy(exc):
+                raise  # retry the whole batch
+            db.execute("ROLLBACK TO request")
+            db.execute("RELEASE request")
+            return False, exc
+        db.execute("RELEASE request")
+        return True, result
+
+
+def _deliver(request: _WriteRequest, ok: bool, value: Any) -> None:
+    try:
+        request.loop.call_soon_threadsafe(_resolve, request.future, ok, value)
+    except RuntimeError:  # the caller's event loop is gone
+        pass
+
+
+def _stopped(cause: Optional[BaseException]) -> RuntimeError:
+    error = RuntimeError(f"GroupCommitWriter stopped: {cause}")
+    error.__cause__ = cause
+    return error
+
+
+def _resolve(future: asyncio.Future, ok: bool, value: Any) -> None:
+    if future.done():  # caller gave up
+        return
+    if ok:
+        future.set_result(value)
+    else:
+        future.set_exception(value)
+
+
+# ────────────────────────────  SHARED POOL  ────────────────────────────
+_pools: Dict[str, SQLitePool] = {}
+_writers: Dict[str, GroupCommitWriter] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(path: str, size: Optional[int] = None) -> SQLitePool:
+    """Process-wide pool for ``path`` (created on first use)."""
+    with _pools_lock:
+        pool = _pools.get(path)
+        if pool is None or pool._closed:
+            pool = SQLitePool(path, size=size or DEFAULT_POOL_SIZE)
+            _pools[path] = pool
+        return pool
+
+
+def get_writer(path: str) -> GroupCommitWriter:
+    """Process-wide group-commit writer for ``path`` (created on first use)."""
+    with _pools_lock:
+        writer = _writers.get(path)
+        if writer is None or writer._closed or not writer.alive:
+            writer = GroupCommitWriter(path)
+            _writers[path] = writer
+        return writer
+
+
+def close_pools() -> None:
+    """Close every shared pool and writer (e.g. on server shutdown)."""
+    with _pools_lock:
+        for writer in _writers.values():
+            writer.close()
+        _writers.clear()
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
@@ -0,0 +1,83 @@
+"""Binary encoding for KB embeddings.
+
+``KnowledgeDocuments.embedding`` stores vectors as raw little-endian bytes
+instead of JSON text:
+
+* ``float32`` – 4 bytes per dimension, decoded with a zero-copy
+  ``numpy.frombuffer``;
+* ``int8``    – 1 byte per dimension, affine-quantised per vector with
+  ``value = q * embedding_scale + embedding_offset``.
+
+The companion columns ``embedding_dtype``, ``embedding_scale`` and
+``embedding_offset`` describe how to decode each row.
+"""
+
+from __future__ import annotations
+
+import json
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+
+FLOAT32 = "float32"
+INT8 = "int8"
+DTYPES = (FLOAT32, INT8)
+
+_LE_FLOAT32 = np.dtype("<f4")
+
+# Columns added to KnowledgeDocuments (name, SQL type).
+EMBEDDING_COLUMNS = [
+    ("embedding", "BLOB"),
+    ("embedding_dtype", "TEXT"),
+    ("embedding_scale", "REAL"),
+    ("embedding_offset", "REAL"),
+]
+
+
+def encode(vector: Sequence[float], dtype: str = FLOAT32) -> Tuple[bytes, str, Optional[float], Optional[float]]:
+    """Return ``(blob, dtype, scale, offset)`` ready to bind to the KB columns."""
+    vec = np.asarray(vector, dtype=np.float32)
+    if dtype == FLOAT32:
+        return vec.astype(_LE_FLOAT32, copy=False).tobytes(), FLOAT32, None, None
+    if dtype == INT8:
+        lo, hi = (float(vec.min()), float(vec.max())) if vec.size else (0.0, 0.0)
+        offset = (hi + lo) / 2.0
+        scale = (hi - lo) / 254.0
+        if scale == 0.0:
+            return np.zeros(vec.shape, dtype=np.int8).tobytes(), INT8, 0.0, offset
+        q = np.clip(np.rint((vec - offset) / scale), -127, 127).astype(np.int8)
+        return q.tobytes(), INT8, scale, offset
+    raise ValueError(f"Unsupported embedding dtype: {dtype!r}")
+
+
+def decode(
+    blob: bytes,
+    dtype: Optional[str] = FLOAT32,
+    scale: Optional[float] = None,
+    offset: Optional[float] = None,
+) -> np.ndarray:
+    """Decode a stored embedding to a float32 vector.
+
+    ``float32`` blobs are returned as a read-only view over ``blob`` (no copy).
+    """
+    if dtype in (None, FLOAT32):
+        return np.frombuffer(blob, dtype=_LE_FLOAT32)
+    if dtype == INT8:
+        q = np.frombuffer(blob, dtype=np.int8)
+        return q.astype(np.float32) * np.float32(scale or 0.0) + np.float32(offset or 0.0)
+    raise ValueError(f"Unsupported embedding dtype: {dtype!r}")
+
+
+def decode_row(
+    blob: Optional[bytes],
+    dtype: Optional[str],
+    scale: Optional[float],
+    offset: Optional[float],
+    legacy_json: Optional[str] = None,
+) -> Optional[np.ndarray]:
+    """Decode the binary column, falling back to the legacy JSON text column."""
+    if blob is not None:
+        return decode(blob, dtype, scale, offset)
+    if legacy_json:
+        return np.asarray(json.loads(legacy_json), dtype=np.float32)
+    return None
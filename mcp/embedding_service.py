@@ -0,0 +1,219 @@
+"""Async, cached and batched query embeddings.
+
+``contoso_tools.get_embedding`` makes a blocking Azure OpenAI call per KB
+search.  :class:`EmbeddingService` replaces it on the hot path with:
+
+* a bounded in-memory LRU keyed by ``(model, normalised text)``, plus an
+  optional on-disk SQLite tier that survives restarts;
+* in-flight coalescing – concurrent requests for the same key share a
+  single upstream call;
+* micro-batching – distinct keys that arrive within a short window are sent
+  together in one ``embeddings.create(input=[...])`` request.
+
+Without a client (missing credentials) it returns the same zero vector as
+the synchronous fallback.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from embedding_codec import decode, encode
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_DIM = 1536
+
+_Key = Tuple[str, str]
+
+
+def normalize_text(text: str) -> str:
+    """Cache key text: whitespace collapsed, case folded."""
+    return " ".join(text.split()).casefold()
+
+
+class _DiskCache:
+    """SQLite-backed second tier (``EmbeddingCache`` table)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode = WAL")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS EmbeddingCache(
+                   model    TEXT NOT NULL,
+                   text_key TEXT NOT NULL,
+                   vector   BLOB NOT NULL,
+                   PRIMARY KEY (model, text_key)
+               )"""
+        )
+        self._db.commit()
+
+    def get(self, key: _Key) -> Optional[np.ndarray]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT vector FROM EmbeddingCache WHERE model = ? AND text_key = ?", key
+            ).fetchone()
+        return decode(row[0]) if row else None
+
+    def put(self, key: _Key, vector: np.ndarray) -> None:
+        blob = encode(vector)[0]
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO EmbeddingCache(model, text_key, vector) VALUES (?,?,?)",
+                (*key, blob),
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+class EmbeddingService:
+    """Embeds query strings through a shared cache and request batcher."""
+
+    def __init__(
+        self,
+        client: Any = None,
+        model: Optional[str] = None,
+        *,
+        dim: int = EMBEDDING_DIM,
+        cache_size: int = 4096,
+        disk_path: Optional[str] = None,
+        batch_window_ms: float = 5.0,
+        max_batch: int = 64,
+    ):
+        self.client = client
+        self.model = model or ""
+        self.dim = dim
+        self.cache_size = cache_size
+        self.batch_window = batch_window_ms / 1000.0
+        self.max_batch = max(1, max_batch)
+        self._lru: "OrderedDict[_Key, np.ndarray]" = OrderedDict()
+        self._disk = _DiskCache(disk_path) if disk_path else None
+        self._inflight: Dict[_Key, asyncio.Task] = {}
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+        self._zero = np.zeros(dim, dtype=np.float32)
+        self._zero.flags.writeable = False
+        self.stats = {"hits": 0, "disk_hits": 0, "coalesced": 0, "requests": 0, "batches": 0}
+
+    # ------------------------------------------------------------------ #
+    async def embed(self, text: str) -> np.ndarray:
+        """Embedding for ``text`` as a read-only float32 vector."""
+        if self.client is None:
+            return self._zero
+        key = (self.model, normalize_text(text))
+
+        cached = self._lru.get(key)
+        if cached is not None:
+            self._lru.move_to_end(key)
+            self.stats["hits"] += 1
+            return cached
+
+        task = self._inflight.get(key)
+        if task is None:
+            # Detached, so a cancelled caller (e.g. a client disconnect) never
+            # cancels the lookup that coalesced callers are waiting on.
+            task = asyncio.get_running_loop().create_task(self._fetch(key, text))
+            self._inflight[key] = task
+            self._tasks.add(task)
+            task.add_done_callback(lambda t, key=key: self._fetched(key, t))
+        else:
+            self.stats["coalesced"] += 1
+        return await asyncio.shield(task)
+
+    async def _fetch(self, key: _Key, text: str) -> np.ndarray:
+        vector = await self._disk_get(key)
+        if vector is None:
+            vector = await self._request(text.replace("\n", " "))
+            await self._disk_put(key, vector)
+        else:
+            self.stats["disk_hits"] += 1
+        self._remember(key, vector)
+        return vector
+
+    def _fetched(self, key: _Key, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # mark retrieved when every caller gave up
+
+    async def embed_many(self, texts: List[str]) -> List[np.ndarray]:
+        return list(await asyncio.gather(*(self.embed(t) for t in texts)))
+
+    def clear(self) -> None:
+        self._lru.clear()
+
+    # ------------------------------------------------------------------ #
+    def _remember(self, key: _Key, vector: np.ndarray) -> None:
+        self._lru[key] = vector
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.cache_size:
+            self._lru.popitem(last=False)
+
+    async def _disk_get(self, key: _Key) -> Optional[np.ndarray]:
+        if self._disk is None:
+            return None
+        return await asyncio.to_thread(self._disk.get, key)
+
+    async def _disk_put(self, key: _Key, vector: np.ndarray) -> None:
+        if self._disk is None:
+            return
+        try:
+            await asyncio.to_thread(self._disk.put, key, vector)
+        except sqlite3.Error as exc:
+            logger.warning("Embedding disk cache write failed: %s", exc)
+
+    # ----------------------------  batching  -------------------------- #
+    async def _request(self, text: str) -> np.ndarray:
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self._pending.append((text, fut))
+        self.stats["requests"] += 1
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.batch_window, self._flush)
+        return await fut
+
+    def _flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.get_running_loop().create_task(self._send(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        self.stats["batches"] += 1
+        try:
+            resp = await self.client.embeddings.create(input=[t for t, _ in batch], model=self.model)
+            data = sorted(resp.data, key=lambda d: d.index)
+            if len(data) != len(batch):
+                raise RuntimeError(f"Embedding API returned {len(data)} vectors for {len(batch)} inputs")
+            for (_, fut), item in zip(batch, data):
+                vector = np.asarray(item.embedding, dtype=np.float32)
+                vector.flags.writeable = False
+                if not fut.done():
+                    fut.set_result(vector)
+        except Exception as exc:
+            for _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(exc)
+
+    def close(self) -> None:
+        if self._disk is not None:
+            self._disk.close()
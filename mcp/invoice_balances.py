@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Materialised invoice balances kept current by SQLite triggers.
+
+Billing tools used to aggregate ``Invoices LEFT JOIN Payments`` on every
+call.  ``InvoiceBalances`` holds one row per invoice with the invoice amount,
+the sum of its successful payments and the derived ``outstanding`` amount,
+so reading a balance is a primary-key lookup.
+
+Triggers on ``Invoices`` (insert, amount change, delete) and ``Payments``
+(insert, update, delete) keep the table exact: whenever a payment changes,
+the affected invoice's ``paid`` is re-summed from its own payments through
+the ``(invoice_id, status, amount)`` covering index, so there is no drift
+from repeated floating-point increments.
+
+``migrate_schema`` creates and back-fills the table (``create_db.py`` and
+server startup run it; the tools never do); it can also be built or verified
+offline::
+
+    python invoice_balances.py --db data/contoso.db            # create + back-fill
+    python invoice_balances.py --db data/contoso.db --check    # compare with a full re-aggregation
+"""
+
+import argparse
+import logging
+import os
+import sqlite3
+import sys
+from typing import List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# ``paid`` for one invoice, re-summed from its successful payments.
+_PAID = (
+    "(SELECT IFNULL(SUM(p.amount), 0.0) FROM Payments p "
+    "WHERE p.invoice_id = {id} AND p.status = 'successful')"
+)
+
+
+def _refresh(id_expr: str) -> str:
+    return f"UPDATE InvoiceBalances SET paid = {_PAID.format(id=id_expr)} WHERE invoice_id = {id_expr};"
+
+
+_BALANCE_DDL = [
+    """CREATE TABLE IF NOT EXISTS InvoiceBalances(
+           invoice_id  INTEGER PRIMARY KEY,
+           amount      REAL,
+           paid        REAL NOT NULL DEFAULT 0.0,
+           outstanding REAL GENERATED ALWAYS AS (MAX(amount - paid, 0.0)) VIRTUAL
+       )""",
+    # Invoices
+    """CREATE TRIGGER IF NOT EXISTS trg_balance_inv_ins AFTER INSERT ON Invoices BEGIN
+           INSERT OR REPLACE INTO InvoiceBalances(invoice_id, amount, paid)
+           VALUES (new.invoice_id, new.amount, 0.0);
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_balance_inv_upd AFTER UPDATE OF amount ON Invoices BEGIN
+           UPDATE InvoiceBalances SET amount = new.amount WHERE invoice_id = new.invoice_id;
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_balance_inv_del AFTER DELETE ON Invoices BEGIN
+           DELETE FROM InvoiceBalances WHERE invoice_id = old.invoice_id;
+       END""",
+    # Payments
+    f"""CREATE TRIGGER IF NOT EXISTS trg_balance_pay_ins AFTER INSERT ON Payments
+       WHEN new.status = 'successful' BEGIN
+           {_refresh("new.invoice_id")}
+       END""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_balance_pay_upd AFTER UPDATE OF invoice_id, amount, status ON Payments
+       WHEN old.status = 'successful' OR new.status = 'successful' BEGIN
+           {_refresh("old.invoice_id")}
+           {_refresh("new.invoice_id")}
+       END""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_balance_pay_del AFTER DELETE ON Payments
+       WHEN old.status = 'successful' BEGIN
+           {_refresh("old.invoice_id")}
+       END""",
+]
+
+_BACKFILL = f"""
+    INSERT OR REPLACE INTO InvoiceBalances(invoice_id, amount, paid)
+    SELECT inv.invoice_id, inv.amount, {_PAID.format(id="inv.invoice_id")}
+    FROM Invoices inv
+"""
+
+
+def has_invoice_balances(db: sqlite3.Connection) -> bool:
+    return db.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'InvoiceBalances'"
+    ).fetchone() is not None
+
+
+def ensure_invoice_balances(db: sqlite3.Connection) -> bool:
+    """Create (and on first creation back-fill) the balances table + triggers.
+
+    When called inside an open transaction the DDL joins it, so it commits
+    or rolls back together with the caller's write.  Returns False when the
+    table is missing and cannot be created (read-only database).
+    """
+    if has_invoice_balances(db):
+        return True
+    owns_transaction = not db.in_transaction
+    try:
+        for ddl in _BALANCE_DDL:
+            db.execute(ddl)
+        db.execute(_BACKFILL)
+        if owns_transaction:
+            db.commit()
+        return True
+    except sqlite3.OperationalError as exc:
+        if owns_transaction:
+            db.rollback()
+        logger.warning("Invoice balances unavailable (%s)", exc)
+        return False
+
+
+def rebuild(db: sqlite3.Connection) -> int:
+    """Recompute every balance from scratch; returns the number of invoices."""
+    with db:
+        db.execute("DELETE FROM InvoiceBalances")
+        return db.execute(_BACKFILL).rowcount
+
+
+def mismatches(db: sqlite3.Connection, tolerance: float = 1e-9) -> List[Tuple]:
+    """Invoices whose stored balance differs from a full re-aggregation."""
+    return db.execute(
+        f"""SELECT inv.invoice_id, bal.outstanding,
+                   MAX(inv.amount - {_PAID.format(id="inv.invoice_id")}, 0.0) AS expected
+            FROM Invoices inv
+            LEFT JOIN InvoiceBalances bal ON bal.invoice_id = inv.invoice_id
+            WHERE bal.invoice_id IS NULL OR ABS(bal.outstanding - expected) > ?
+            UNION ALL
+            SELECT bal.invoice_id, bal.outstanding, NULL
+            FROM InvoiceBalances bal
+            WHERE NOT EXISTS (SELECT 1 FROM Invoices inv WHERE inv.invoice_id = bal.invoice_id)""",
+        (tolerance,),
+    ).fetchall()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default=os.getenv("DB_PATH", "data/contoso.db"))
+    parser.add_argument("--check", action="store_true", help="verify balances against the payments")
+    parser.add_argument("--rebuild", action="store_true", help="recompute every balance")
+    args = parser.parse_args()
+
+    db = sqlite3.connect(args.db)
+    try:
+        if not ensure_invoice_balances(db):
+            return 1
+        if args.rebuild:
+            print(f"✅  {rebuild(db)} invoice balances rebuilt")
+        if args.check:
+            bad = mismatches(db)
+            print(f"{'❌' if bad else '✅'}  {len(bad)} invoice balances out of date")
+            for row in bad[:20]:
+                print(f"      invoice {row[0]}: stored {row[1]} expected {row[2]}")
+            return 1 if bad else 0
+        count = db.execute("SELECT COUNT(*) FROM InvoiceBalances").fetchone()[0]
+        print(f"✅  InvoiceBalances ready ({count} invoices)")
+        return 0
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
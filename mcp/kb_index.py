@@ -0,0 +1,414 @@
+"""In-memory vector index over ``KnowledgeDocuments``.
+
+``search_knowledge_base_async`` used to read every KB row per query, JSON
+decode each 1536-float embedding and score it with a pure-Python loop.
+:class:`KnowledgeBaseIndex` instead keeps one contiguous, L2-normalised
+``float32`` matrix of all embeddings, so a query is a single matrix-vector
+product followed by an ``argpartition`` top-k.  Embeddings are read from the
+binary ``embedding`` column (see ``embedding_codec``), falling back to the
+legacy JSON ``topic_embedding`` text.
+
+The matrix is (re)built lazily.  A tiny version table maintained by triggers
+on ``KnowledgeDocuments`` tells the index when the table changed, so the
+freshness check per query is one primary-key read.  The version table and
+the FTS index below are created by ``migrate_schema`` (at server startup),
+never on the request path.
+
+An FTS5 table over title + content (kept in sync by triggers) adds lexical
+retrieval.  ``mode="hybrid"`` fuses BM25 and cosine rankings with reciprocal
+rank fusion; with ``prefilter`` the vector stage only scores the lexical
+candidates.  ``mode="lexical"`` skips vectors entirely.  On SQLite builds
+without FTS5 only vector search is available; hybrid queries fall back to it.
+
+For very large corpora an IVF-flat index built offline by ``ann_index``
+(``<db>.ivf/``) replaces the full scan when it matches the current KB
+version and content (see :func:`content_identity`); ``nprobe`` trades
+recall for latency.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ann_index import IVFFlatIndex
+from embedding_codec import decode_row
+
+logger = logging.getLogger(__name__)
+
+_VERSION_DDL = [
+    """CREATE TABLE IF NOT EXISTS KnowledgeIndexVersion(
+           id      INTEGER PRIMARY KEY CHECK (id = 1),
+           version INTEGER NOT NULL
+       )""",
+    "INSERT OR IGNORE INTO KnowledgeIndexVersion(id, version) VALUES (1, 0)",
+    """CREATE TRIGGER IF NOT EXISTS trg_kb_version_ins AFTER INSERT ON KnowledgeDocuments
+       BEGIN UPDATE KnowledgeIndexVersion SET version = version + 1 WHERE id = 1; END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_kb_version_upd AFTER UPDATE ON KnowledgeDocuments
+       BEGIN UPDATE KnowledgeIndexVersion SET version = version + 1 WHERE id = 1; END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_kb_version_del AFTER DELETE ON KnowledgeDocuments
+       BEGIN UPDATE KnowledgeIndexVersion SET version = version + 1 WHERE id = 1; END""",
+]
+
+
+def ensure_version_tracking(db: sqlite3.Connection) -> bool:
+    """Create the KB version table + triggers.  Returns False on read-only DBs."""
+    try:
+        for ddl in _VERSION_DDL:
+            db.execute(ddl)
+        db.commit()
+        return True
+    except sqlite3.OperationalError as exc:
+        db.rollback()
+        logger.warning("KB change tracking unavailable (%s); KB search needs it", exc)
+        return False
+
+
+_FTS_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS KnowledgeDocumentsFTS USING fts5(
+           title, content, content='KnowledgeDocuments', content_rowid='document_id',
+           tokenize='porter unicode61'
+       )""",
+    """CREATE TRIGGER IF NOT EXISTS trg_kb_fts_ins AFTER INSERT ON KnowledgeDocuments BEGIN
+           INSERT INTO KnowledgeDocumentsFTS(rowid, title, content)
+           VALUES (new.document_id, new.title, new.content);
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_kb_fts_del AFTER DELETE ON KnowledgeDocuments BEGIN
+           INSERT INTO KnowledgeDocumentsFTS(KnowledgeDocumentsFTS, rowid, title, content)
+           VALUES ('delete', old.document_id, old.title, old.content);
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_kb_fts_upd AFTER UPDATE OF title, content ON KnowledgeDocuments BEGIN
+           INSERT INTO KnowledgeDocumentsFTS(KnowledgeDocumentsFTS, rowid, title, content)
+           VALUES ('delete', old.document_id, old.title, old.content);
+           INSERT INTO KnowledgeDocumentsFTS(rowid, title, content)
+           VALUES (new.document_id, new.title, new.content);
+       END""",
+]
+
+
+def ensure_fts(db: sqlite3.Connection) -> bool:
+    """Create (and on first creation populate) the KB full-text index."""
+    exists = db.execute(
+        "SELECT 1 FROM sqlite_master WHERE name = 'KnowledgeDocumentsFTS'"
+    ).fetchone()
+    if exists:
+        return True
+    try:
+        for ddl in _FTS_DDL:
+            db.execute(ddl)
+        db.execute("INSERT INTO KnowledgeDocumentsFTS(KnowledgeDocumentsFTS) VALUES ('rebuild')")
+        db.commit()
+        return True
+    except sqlite3.OperationalError as exc:
+        db.rollback()
+        logger.warning("KB full-text index unavailable (%s); KB search needs it", exc)
+        return False
+
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def content_identity(db: sqlite3.Connection) -> List[Any]:
+    """Cheap fingerprint of the KB rows: count, id range/sum and embedding bytes.
+
+    The version counter restarts at 0 whenever the table is recreated, so an
+    ANN index built from an older database could otherwise look current.
+    """
+    cols = {r[1] for r in db.execute("PRAGMA table_info(KnowledgeDocuments)")}
+    blob = "TOTAL(LENGTH(embedding))" if "embedding" in cols else "0"
+    row = db.execute(
+        f"SELECT COUNT(*), MIN(document_id), MAX(document_id), TOTAL(document_id), {blob}, "
+        "TOTAL(LENGTH(topic_embedding)) FROM KnowledgeDocuments"
+    ).fetchone()
+    return list(row)
+
+
+def fts_query(text: str) -> str:
+    """Turn free text into a safe FTS5 OR-query of quoted terms."""
+    terms = dict.fromkeys(t.lower() for t in _TOKEN_RE.findall(text or ""))
+    return " OR ".join(f'"{t}"' for t in terms)
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[int]], k: int = 60) -> List[Tuple[float, int]]:
+    """Fuse ranked id lists; ``[(score, id), ...]`` best first (ties keep first-seen order)."""
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(((s, d) for d, s in scores.items()), key=lambda x: -x[0])
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """L2-normalise each row in place; all-zero rows stay zero (score 0)."""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    np.divide(matrix, norms, out=matrix, where=norms > 0)
+    return matrix
+
+
+def read_embeddings(db: sqlite3.Connection) -> Tuple[np.ndarray, np.ndarray]:
+    """``(document_ids, L2-normalised float32 matrix)`` of every decodable KB embedding."""
+    cols = {r[1] for r in db.execute("PRAGMA table_info(KnowledgeDocuments)")}
+    binary = "embedding, embedding_dtype, embedding_scale, embedding_offset" if "embedding" in cols else "NULL, NULL, NULL, NULL"
+    doc_ids: List[int] = []
+    vectors: List[np.ndarray] = []
+    dim = None
+    for r in db.execute(f"SELECT document_id, {binary}, topic_embedding FROM KnowledgeDocuments ORDER BY document_id"):
+        try:
+            emb = decode_row(*r[1:])
+        except Exception:
+            continue
+        if emb is None:
+            continue
+        if dim is None:
+            dim = emb.shape[0]
+        if emb.shape[0] != dim:
+            logger.warning("Skipping KB document %s: embedding dim %d != %d", r[0], emb.shape[0], dim)
+            continue
+        doc_ids.append(r[0])
+        vectors.append(emb)
+    matrix = np.stack(vectors).astype(np.float32, copy=False) if vectors else np.empty((0, 0), dtype=np.float32)
+    return np.asarray(doc_ids, dtype=np.int64), normalize_rows(matrix)
+
+
+@dataclass(frozen=True)
+class _Snapshot:
+    version: Any
+    doc_ids: np.ndarray
+    matrix: np.ndarray  # (n_docs, dim) float32, rows L2-normalised
+    sorted_pos: np.ndarray  # row positions ordered by document_id
+    sorted_ids: np.ndarray  # doc_ids[sorted_pos]
+    ann: Optional[IVFFlatIndex] = None
+
+    @classmethod
+    def of(cls, version: Any, doc_ids: np.ndarray, matrix: np.ndarray, ann: Optional[IVFFlatIndex] = None) -> "_Snapshot":
+        order = np.argsort(doc_ids, kind="stable")
+        return cls(version, doc_ids, matrix, order, doc_ids[order], ann)
+
+
+class KnowledgeBaseIndex:
+    """Exact cosine top-k over the ``KnowledgeDocuments`` embeddings."""
+
+    def __init__(
+        self,
+        *,
+        candidates: int = 100,
+        prefilter: bool = True,
+        rrf_k: int = 60,
+        ann_path: Optional[str] = None,
+        nprobe: int = 8,
+    ) -> None:
+        self.candidates = candidates
+        self.prefilter = prefilter
+        self.rrf_k = rrf_k
+        self.ann_path = ann_path
+        self.nprobe = nprobe
+        self._snapshot: Optional[_Snapshot] = None
+        self._checked = False
+        self._has_fts = False
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------ #
+    def _check_schema(self, db: sqlite3.Connection) -> None:
+        """The version table and FTS index come from ``migrate_schema``; no DDL here.
+
+        Only the version table is required: ``ensure_fts`` leaves the FTS
+        index out on SQLite builds without FTS5.
+        """
+        if self._checked:
+            return
+        names = {r[0] for r in db.execute(
+            "SELECT name FROM sqlite_master WHERE name IN ('KnowledgeIndexVersion', 'KnowledgeDocumentsFTS')"
+        )}
+        if "KnowledgeIndexVersion" not in names:
+            raise RuntimeError("KnowledgeIndexVersion missing from the database; run `python migrate_schema.py`")
+        self._has_fts = "KnowledgeDocumentsFTS" in names
+        if not self._has_fts:
+            logger.warning("KnowledgeDocumentsFTS missing; lexical KB search is unavailable, hybrid uses vectors only")
+        self._checked = True
+
+    def _current_version(self, db: sqlite3.Connection) -> Any:
+        self._check_schema(db)
+        return db.execute("SELECT version FROM KnowledgeIndexVersion WHERE id = 1").fetchone()[0]
+
+    def _build(self, db: sqlite3.Connection, version: Any) -> _Snapshot:
+        return _Snapshot.of(version, *read_embeddings(db))
+
+    def _load_ann(self, db: sqlite3.Connection, version: Any) -> Optional[_Snapshot]:
+        """Snapshot backed by the on-disk IVF index, if it matches ``version`` and the KB content."""
+        if not self.ann_path or not os.path.isdir(self.ann_path):
+            return None
+        meta = IVFFlatIndex.read_meta(self.ann_path)
+        if (
+            meta is None
+            or meta.get("kb_version") != json.loads(json.dumps(version))
+            or meta.get("kb_content") != content_identity(db)
+        ):
+            logger.warning("ANN index at %s is stale; using exact search until it is rebuilt", self.ann_path)
+            return None
+        ann = IVFFlatIndex.load(self.ann_path)
+        return _Snapshot.of(version, np.asarray(ann.ids), ann.vectors, ann)
+
+    def snapshot(self, db: sqlite3.Connection) -> _Snapshot:
+        """Return an up-to-date snapshot, rebuilding it if the table changed."""
+        version = self._current_version(db)
+        snap = self._snapshot
+        if snap is not None and snap.version == version:
+            return snap
+        with self._lock:
+            snap = self._snapshot
+            if snap is None or snap.version != version:
+                snap = self._load_ann(db, version) or self._build(db, version)
+                self._snapshot = snap
+                logger.info("KB index loaded: %d documents%s", len(snap.doc_ids), " (IVF)" if snap.ann else "")
+        return snap
+
+    def invalidate(self) -> None:
+        self._snapshot = None
+
+    # ------------------------------------------------------------------ #
+    @staticmethod
+    def _query_vector(snap: _Snapshot, query_emb: Optional[Sequence[float]]) -> Optional[np.ndarray]:
+        """Normalised query, or None when it cannot rank anything (zero/mismatched)."""
+        if query_emb is None:
+            return None
+        q = np.asarray(query_emb, dtype=np.float32)
+        q_norm = float(np.linalg.norm(q))
+        if q_norm == 0.0 or snap.matrix.ndim != 2 or q.shape[0] != snap.matrix.shape[1]:
+            return None
+        return q / q_norm
+
+    def _rank_rows(self, snap: _Snapshot, q: np.ndarray, k: int, rows: Optional[np.ndarray] = None) -> List[Tuple[float, int]]:
+        """Cosine top-k over all rows (IVF when available), or only over ``rows``."""
+        if rows is None and snap.ann is not None:
+            scores, pos = snap.ann.search(q, k, self.nprobe)
+            return [(float(s), int(snap.doc_ids[p])) for s, p in zip(scores, pos)]
+        if rows is None:
+            rows = np.arange(len(snap.doc_ids))
+            scores = snap.matrix @ q
+        else:
+            scores = snap.matrix[rows] @ q
+        n = len(scores)
+        k = min(k, n)
+        if k <= 0:
+            return []
+        idx = np.argpartition(-scores, k - 1)[:k] if k < n else np.arange(n)
+        idx = idx[np.lexsort((rows[idx], -scores[idx]))]
+        return [(float(scores[i]), int(snap.doc_ids[rows[i]])) for i in idx]
+
+    @staticmethod
+    def _rows_for(snap: _Snapshot, doc_ids: Sequence[int]) -> np.ndarray:
+        """Matrix rows of ``doc_ids`` (ids without an embedding are dropped)."""
+        ids = np.asarray(doc_ids, dtype=np.int64)
+        sorted_ids = snap.sorted_ids
+        at = np.searchsorted(sorted_ids, ids)
+        found = at < len(sorted_ids)
+        at, ids = at[found], ids[found]
+        at = at[sorted_ids[at] == ids]
+        return snap.sorted_pos[at]
+
+    def top_k(self, db: sqlite3.Connection, query_emb: Sequence[float], topk: int) -> List[Tuple[float, int]]:
+        """``[(score, document_id), ...]`` best first."""
+        snap = self.snapshot(db)
+        n = len(snap.doc_ids)
+        if n == 0 or topk <= 0:
+            return []
+        q = self._query_vector(snap, query_emb)
+        if q is None:
+            # Every score is 0 – keep table order, like a stable sort would.
+            return [(0.0, int(d)) for d in snap.sorted_ids[:topk]]
+        return self._rank_rows(snap, q, topk)
+
+    def lexical_top_k(self, db: sqlite3.Connection, query_text: str, limit: int) -> List[int]:
+        """Document ids ranked by BM25 (best first)."""
+        self._check_schema(db)
+        if not self._has_fts:
+            raise RuntimeError(
+                "KnowledgeDocumentsFTS missing from the database (SQLite without FTS5?); "
+                "run `python migrate_schema.py` or use mode='vector'"
+            )
+        match = fts_query(query_text)
+        if not match:
+            return []
+        return [
+            r[0]
+            for r in db.execute(
+                "SELECT rowid FROM KnowledgeDocumentsFTS WHERE KnowledgeDocumentsFTS MATCH ? "
+                "ORDER BY rank LIMIT ?",
+                (match, limit),
+            )
+        ]
+
+    def hybrid_top_k(
+        self,
+        db: sqlite3.Connection,
+        query_emb: Optional[Sequence[float]],
+        query_text: str,
+        topk: int,
+    ) -> List[Tuple[float, int]]:
+        """BM25 + cosine rankings fused with RRF; ``[(score, document_id), ...]``."""
+        if topk <= 0:
+            return []
+        # With no embedded documents (e.g. NULL embeddings) the vector stage
+        # ranks nothing and the lexical ranking is used alone.
+        snap = self.snapshot(db)
+        if not self._has_fts:
+            return self.top_k(db, query_emb, topk)
+        limit = max(self.candidates, topk)
+        lexical = self.lexical_top_k(db, query_text, limit)
+        q = self._query_vector(snap, query_emb)
+
+        vector: List[int] = []
+        if q is not None:
+            if self.prefilter and len(lexical) >= topk:
+                ranked = self._rank_rows(snap, q, limit, self._rows_for(snap, lexical))
+            else:
+                ranked = self._rank_rows(snap, q, limit)
+            vector = [doc_id for _, doc_id in ranked]
+
+        if not lexical and not vector:
+            return self.top_k(db, None, topk)
+        return reciprocal_rank_fusion([lexical, vector], self.rrf_k)[:topk]
+
+    def search(
+        self,
+        db: sqlite3.Connection,
+        query_emb: Optional[Sequence[float]],
+        topk: int = 3,
+        query_text: str = "",
+        mode: str = "vector",
+    ) -> List[Dict[str, Any]]:
+        """Top-k documents as ``{"title", "doc_type", "content"}`` dicts.
+
+        ``mode`` is ``"vector"`` (cosine only), ``"lexical"`` (BM25 only) or
+        ``"hybrid"`` (reciprocal rank fusion of both).
+        """
+        if mode == "vector":
+            hits = self.top_k(db, query_emb, topk)
+        elif mode == "hybrid":
+            hits = self.hybrid_top_k(db, query_emb, query_text, topk)
+        elif mode == "lexical":
+            hits = [(0.0, d) for d in self.lexical_top_k(db, query_text, topk)]
+        else:
+            raise ValueError(f"Unknown KB search mode: {mode!r}")
+        if not hits:
+            return []
+        ids = [doc_id for _, doc_id in hits]
+        rows = db.execute(
+            f"SELECT document_id, title, doc_type, content FROM KnowledgeDocuments "
+            f"WHERE document_id IN ({','.join('?' * len(ids))})",
+            ids,
+        ).fetchall()
+        by_id = {r[0]: r for r in rows}
+        return [
+            {"title": by_id[i][1], "doc_type": by_id[i][2], "content": by_id[i][3]}
+            for i in ids
+            if i in by_id
+        ]
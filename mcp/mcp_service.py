@@ -1,16 +1,17 @@
 from fastmcp import FastMCP  
 from fastmcp.server.middleware import Middleware, MiddlewareContext  # added
 from typing import Annotated, List, Optional, Dict, Any  
-from pydantic import BaseModel  
+from pydantic import BaseModel, model_serializer  
 import sqlite3, os, asyncio, logging, time  
+from functools import lru_cache
 from datetime import datetime  
 from dotenv import load_dotenv  
 from fastmcp.server.middleware import Middleware, MiddlewareContext 
 from fastmcp.server.dependencies import get_access_token 
+from fastmcp.server.context import Context
 from fastmcp.exceptions import ToolError
 # from fastmcp.server.auth import TokenVerifier, AccessToken  
 from fastmcp.server.auth.auth import RemoteAuthProvider  
-from fastmcp.server.auth.providers.jwt import JWTVerifier  
 from fastmcp.server.auth import AccessToken, TokenVerifier
 from starlette.requests import Request 
 from starlette.responses import JSONResponse
@@ -20,6 +21,9 @@ from fastmcp.utilities.logging import get_logger
 
 # Import common tools
 from contoso_tools import *
+from token_cache import CachingJWTVerifier
+from tool_results import trusted_result
+from tool_metrics import install as install_metrics
 
 logger = get_logger("auth.debug")  
 
@@ -146,6 +150,10 @@ PUBLIC_BASE_URL = os.getenv("PUBLIC_BASE_URL", "http://localhost:8000")  # set t
   
 issuer = f"https://login.microsoftonline.com/{AAD_TENANT}/v2.0" if AAD_TENANT else None  
 jwks_uri = f"https://login.microsoftonline.com/{AAD_TENANT}/discovery/v2.0/keys" if AAD_TENANT else None  
+# A local JWKS file (see token_cache.py keygen) stands in for Entra ID in tests;  
+# it needs no tenant.  JWT_ISSUER overrides the advertised authorization server.  
+jwks_uri = os.getenv("JWKS_FILE") or jwks_uri  
+issuer = os.getenv("JWT_ISSUER") or issuer  
   
 token_verifier = None  
 if not DISABLE_AUTH:  
@@ -157,9 +165,10 @@ if not DISABLE_AUTH:
             default_claims={"roles": ["query", "security"]},  # Include roles for middleware
             base_url=PUBLIC_BASE_URL,
         )
-    elif jwks_uri and issuer:
-        # Use real JWT verification
-        token_verifier = JWTVerifier(  
+    elif jwks_uri:
+        # Use real JWT verification; keys and verified tokens are cached.
+        # The issuer is only advertised, not checked, so JWKS_FILE works alone.
+        token_verifier = CachingJWTVerifier(  
             jwks_uri=jwks_uri,  
             # issuer=issuer,  
             audience=None,  # set if you need audience checking  
@@ -167,14 +176,17 @@ if not DISABLE_AUTH:
         )  
   
 auth = None  
-if token_verifier and not DISABLE_AUTH:  
+if token_verifier and not DISABLE_AUTH and issuer:  
     # This publishes resource metadata and makes 401 responses carry WWW-Authenticate  
     auth = RemoteAuthProvider(  
         token_verifier=token_verifier,  
-        authorization_servers=[issuer] if issuer else [],  # tells clients where auth actually happens  
+        authorization_servers=[issuer],  # tells clients where auth actually happens  
         base_url=PUBLIC_BASE_URL,  # used to build resource metadata URLs
         resource_name="Contoso Customer API",  
     )  
+elif token_verifier and not DISABLE_AUTH:  
+    # No issuer to advertise (e.g. JWKS_FILE alone): verify tokens without resource metadata  
+    auth = token_verifier  
   
 mcp = FastMCP(  
     name="Contoso Customer API as Tools",  
@@ -197,15 +209,32 @@ class CustomerSummary(BaseModel):
     loyalty_level: str  
   
   
-class CustomerDetail(BaseModel):  
+class CustomerPage(BaseModel):  
+    customers: List[CustomerSummary]  
+    next_after_id: Optional[int]  
+    total: Optional[int] = None  
+  
+  
+class ProjectedModel(BaseModel):  
+    """Serialises only the fields that were set, so a ``fields`` projection
+    leaves the other keys out of the payload instead of sending nulls."""
+
+    @model_serializer(mode="wrap")  
+    def _set_fields_only(self, handler):  
+        data = handler(self)
+        return {k: v for k, v in data.items() if k in self.model_fields_set}
+  
+  
+class CustomerDetail(ProjectedModel):  
     customer_id: int  
-    first_name: str  
-    last_name: str  
-    email: str  
-    phone: Optional[str]  
-    address: Optional[str]  
-    loyalty_level: str  
-    subscriptions: List[dict]  
+    first_name: Optional[str] = None  
+    last_name: Optional[str] = None  
+    email: Optional[str] = None  
+    phone: Optional[str] = None  
+    address: Optional[str] = None  
+    loyalty_level: Optional[str] = None  
+    subscriptions: Optional[List[dict]] = None  
+    truncated: Optional[Dict[str, int]] = None  
   
   
 class Payment(BaseModel):  
@@ -216,7 +245,7 @@ class Payment(BaseModel):
     status: str  
   
   
-class Invoice(BaseModel):  
+class Invoice(ProjectedModel):  
     invoice_id: int  
     invoice_date: str  
     amount: float  
@@ -224,6 +253,7 @@ class Invoice(BaseModel):
     due_date: str  
     payments: List[Payment]  
     outstanding: float  
+    truncated: Optional[Dict[str, int]] = None  
   
   
 class ServiceIncident(BaseModel):  
@@ -233,23 +263,45 @@ class ServiceIncident(BaseModel):
     resolution_status: str  
   
   
-class SubscriptionDetail(BaseModel):  
+class SubscriptionDetail(ProjectedModel):  
     subscription_id: int  
-    product_id: int  
-    start_date: str  
-    end_date: str  
-    status: str  
-    roaming_enabled: int  
-    service_status: str  
-    speed_tier: Optional[str]  
-    data_cap_gb: Optional[int]  
-    autopay_enabled: int  
-    product_name: str  
-    product_description: Optional[str]  
-    category: Optional[str]  
-    monthly_fee: Optional[float]  
-    invoices: List[Invoice]  
-    service_incidents: List[ServiceIncident]  
+    customer_id: Optional[int] = None  
+    product_id: Optional[int] = None  
+    start_date: Optional[str] = None  
+    end_date: Optional[str] = None  
+    status: Optional[str] = None  
+    roaming_enabled: Optional[int] = None  
+    service_status: Optional[str] = None  
+    speed_tier: Optional[str] = None  
+    data_cap_gb: Optional[int] = None  
+    autopay_enabled: Optional[int] = None  
+    product_name: Optional[str] = None  
+    product_description: Optional[str] = None  
+    category: Optional[str] = None  
+    monthly_fee: Optional[float] = None  
+    invoices: Optional[List[Invoice]] = None  
+    service_incidents: Optional[List[ServiceIncident]] = None  
+    truncated: Optional[Dict[str, int]] = None  
+  
+  
+# Multi-get results: one entry per requested id, either the record or the
+# reason it could not be returned.
+class CustomerDetailResult(BaseModel):  
+    customer_id: int  
+    customer: Optional[CustomerDetail] = None  
+    error: Optional[str] = None  
+  
+  
+class SubscriptionDetailResult(BaseModel):  
+    subscription_id: int  
+    subscription: Optional[SubscriptionDetail] = None  
+    error: Optional[str] = None  
+  
+  
+class InvoicePaymentsResult(BaseModel):  
+    invoice_id: int  
+    payments: Optional[List[Payment]] = None  
+    error: Optional[str] = None  
   
   
 class Promotion(BaseModel):  
@@ -291,6 +343,12 @@ class DataUsageRecord(BaseModel):
     sms_count: int  
   
   
+class DataUsagePage(BaseModel):  
+    subscription_id: int  
+    records: List[DataUsageRecord]  
+    next_cursor: Optional[str]  
+  
+  
 class SupportTicket(BaseModel):  
     ticket_id: int  
     subscription_id: int  
@@ -314,6 +372,16 @@ ALLOWED_TENANTS = {t.strip() for t in os.getenv("ALLOWED_TENANTS", (AAD_TENANT o
 RESTRICTED_TOOLS_REQUIRING_ACCOUNT_SCOPE = {"unlock_account"}  
   
   
+@lru_cache(maxsize=1024)  
+def _hidden_tools(roles: frozenset) -> frozenset:  
+    """Tools a caller with ``roles`` may neither see nor call (computed once per role set)."""
+    if SECURITY_ROLE in roles:  
+        return frozenset()  
+    return frozenset(RESTRICTED_TOOLS_REQUIRING_ACCOUNT_SCOPE)  
+  
+  
+def _caller_hidden_tools(token: AccessToken) -> frozenset:  
+    return _hidden_tools(frozenset(token.claims.get("roles") or ()))  
   
   
 class AuthZMiddleware(Middleware):  
@@ -330,18 +398,10 @@ class AuthZMiddleware(Middleware):
         token = get_access_token()  
         if token is None:  
             return tools  
-        roles = token.claims["roles"]
-
-        # If the caller has security role, show everything.  
-        if SECURITY_ROLE in roles:  
+        hidden = _caller_hidden_tools(token)  
+        if not hidden:  
             return tools  
-  
-        # Otherwise, hide tools that require account scope.  
-        filtered = [  
-            t for t in tools  
-            if t.key not in RESTRICTED_TOOLS_REQUIRING_ACCOUNT_SCOPE  
-        ]  
-        return filtered  
+        return [t for t in tools if t.key not in hidden]  
   
     async def on_call_tool(self, context: MiddlewareContext, call_next):  
         # If authentication is disabled, allow all tool calls
@@ -354,23 +414,18 @@ class AuthZMiddleware(Middleware):
         if token is None:  
             # pass
             raise ToolError("Authentication required")  
-        roles = token.claims["roles"]
         tool_name = context.message.name  
   
-        # If the caller has account-management scope, allow all tools.  
-        if SECURITY_ROLE in roles:    
-            return await call_next(context)  
-  
-        # If they don't have account-management scope, block restricted tools.  
-        if tool_name in RESTRICTED_TOOLS_REQUIRING_ACCOUNT_SCOPE:  
+        # Restricted tools need the security role; everything else is allowed
+        # (including billing-only callers).
+        if tool_name in _caller_hidden_tools(token):  
             raise ToolError(  
                 f"Insufficient authorization to call '{tool_name}'. "  
                 f"Requires '{SECURITY_ROLE}'."  
             )  
-  
-        # All other tools are allowed (including billing-only callers).  
         return await call_next(context) 
-# Register middleware
+# Register middleware (metrics first so denied calls are counted too)
+install_metrics(mcp)
 mcp.add_middleware(AuthZMiddleware())
 
 
@@ -415,15 +470,61 @@ async def _protected_resource_metadata(request: Request):
 @mcp.tool(description="List all customers with basic info")  
 async def get_all_customers() -> List[CustomerSummary]:  
     data = await get_all_customers_async()
-    return [CustomerSummary(**r) for r in data]
+    return trusted_result(List[CustomerSummary], data)
+  
+  
+@mcp.tool(  
+    description="List customers one page at a time (ordered by customer_id), optionally filtered "  
+    "by loyalty level or a name substring. Pass next_after_id back as after_id for the next page."  
+)  
+async def list_customers(  
+    limit: Annotated[int, "Page size (max 1000)"] = CUSTOMER_PAGE_SIZE,  
+    after_id: Annotated[Optional[int], "Return customers with customer_id greater than this"] = None,  
+    loyalty_level: Annotated[Optional[str], "Only this loyalty level (Bronze, Silver, Gold)"] = None,  
+    name_contains: Annotated[Optional[str], "Substring of first or last name"] = None,  
+    include_total: Annotated[bool, "Also return the number of matching customers"] = False,  
+) -> CustomerPage:  
+    page = await get_customers_page_async(limit, after_id, loyalty_level, name_contains, include_total)
+    return trusted_result(CustomerPage, page)
+  
+  
+@mcp.tool(  
+    description="Bulk export of matching customers with progress notifications. Returns at most "  
+    "max_rows customers; continue from next_after_id if it is not null."  
+)  
+async def export_customers(  
+    ctx: Context,  
+    loyalty_level: Annotated[Optional[str], "Only this loyalty level (Bronze, Silver, Gold)"] = None,  
+    name_contains: Annotated[Optional[str], "Substring of first or last name"] = None,  
+    after_id: Annotated[Optional[int], "Resume after this customer_id"] = None,  
+    max_rows: Annotated[int, "Maximum customers to return in this call"] = 10_000,  
+) -> CustomerPage:  
+    if max_rows < 1:
+        raise ValueError("max_rows must be at least 1")
+    total = await count_customers_async(loyalty_level, name_contains, after_id)
+    customers: List[Dict[str, Any]] = []
+    next_after_id = None
+    async for rows in iter_customers_async(CUSTOMER_PAGE_SIZE, loyalty_level, name_contains, after_id):
+        customers.extend(rows[:max_rows - len(customers)])
+        await ctx.report_progress(len(customers), total)
+        if len(customers) >= max_rows:
+            next_after_id = customers[-1]["customer_id"]
+            break
+    return trusted_result(CustomerPage, {"customers": customers, "next_after_id": next_after_id, "total": total})
+  
+  
+_FIELDS_HELP = "Only return these top-level fields (the id is always included); omit for all"  
+_MAX_ITEMS_HELP = "Keep at most this many newest entries in each nested list; cut lists are reported in 'truncated'"  
   
   
 @mcp.tool(description="Get a full customer profile including their subscriptions")  
 async def get_customer_detail(  
     customer_id: Annotated[int, "Customer identifier value"],  
+    fields: Annotated[Optional[List[str]], _FIELDS_HELP] = None,  
+    max_items: Annotated[Optional[int], _MAX_ITEMS_HELP] = None,  
 ) -> CustomerDetail:  
-    data = await get_customer_detail_async(customer_id)
-    return CustomerDetail(**data)  
+    data = await get_customer_detail_async(customer_id, fields, max_items)
+    return trusted_result(CustomerDetail, data)
   
   
 @mcp.tool(  
@@ -433,18 +534,11 @@ async def get_customer_detail(
 )  
 async def get_subscription_detail(  
     subscription_id: Annotated[int, "Subscription identifier value"],  
+    fields: Annotated[Optional[List[str]], _FIELDS_HELP] = None,  
+    max_items: Annotated[Optional[int], _MAX_ITEMS_HELP] = None,  
 ) -> SubscriptionDetail:  
-    data = await get_subscription_detail_async(subscription_id)
-
-    # Convert nested data to Pydantic models
-    invoices = []
-    for inv_data in data['invoices']:
-        payments = [Payment(**p) for p in inv_data['payments']]
-        invoices.append(Invoice(**{**inv_data, 'payments': payments}))
-    
-    service_incidents = [ServiceIncident(**si) for si in data['service_incidents']]
-    
-    return SubscriptionDetail(**{**data, 'invoices': invoices, 'service_incidents': service_incidents})  
+    data = await get_subscription_detail_async(subscription_id, fields, max_items)
+    return trusted_result(SubscriptionDetail, data)
   
   
 @mcp.tool(description="Return invoice‑level payments list")  
@@ -452,7 +546,53 @@ async def get_invoice_payments(
     invoice_id: Annotated[int, "Invoice identifier value"],  
 ) -> List[Payment]:  
     data = await get_invoice_payments_async(invoice_id)
-    return [Payment(**r) for r in data]
+    return trusted_result(List[Payment], data)
+  
+  
+@mcp.tool(  
+    description="Get several customer profiles (with subscriptions) in one call. "  
+    "Returns one entry per id; unknown ids carry an error instead of a customer."  
+)  
+async def get_customer_details(  
+    customer_ids: Annotated[List[int], "Customer identifier values (at most 100)"],  
+    fields: Annotated[Optional[List[str]], _FIELDS_HELP] = None,  
+    max_items: Annotated[Optional[int], _MAX_ITEMS_HELP] = None,  
+) -> List[CustomerDetailResult]:  
+    items = await get_customer_details_async(customer_ids, fields, max_items)
+    return trusted_result(  
+        List[CustomerDetailResult],  
+        [{"customer_id": i["id"], "customer": i["result"], "error": i["error"]} for i in items],  
+    )
+  
+  
+@mcp.tool(  
+    description="Detailed views (invoices with payments + service incidents) of several "  
+    "subscriptions in one call. Unknown ids carry an error instead of a subscription."  
+)  
+async def get_subscription_details(  
+    subscription_ids: Annotated[List[int], "Subscription identifier values (at most 100)"],  
+    fields: Annotated[Optional[List[str]], _FIELDS_HELP] = None,  
+    max_items: Annotated[Optional[int], _MAX_ITEMS_HELP] = None,  
+) -> List[SubscriptionDetailResult]:  
+    items = await get_subscription_details_async(subscription_ids, fields, max_items)
+    return trusted_result(  
+        List[SubscriptionDetailResult],  
+        [{"subscription_id": i["id"], "subscription": i["result"], "error": i["error"]} for i in items],  
+    )
+  
+  
+@mcp.tool(  
+    description="Payments of several invoices in one call. Unknown invoices carry an error "  
+    "instead of a payments list."  
+)  
+async def get_invoices_payments(  
+    invoice_ids: Annotated[List[int], "Invoice identifier values (at most 100)"],  
+) -> List[InvoicePaymentsResult]:  
+    items = await get_invoices_payments_async(invoice_ids)
+    return trusted_result(  
+        List[InvoicePaymentsResult],  
+        [{"invoice_id": i["id"], "payments": i["result"], "error": i["error"]} for i in items],  
+    )
   
   
 @mcp.tool(description="Record a payment for a given invoice and get new outstanding balance")  
@@ -474,13 +614,28 @@ async def get_data_usage(
     result = await get_data_usage_async(subscription_id, start_date, end_date, aggregate)
     if aggregate:
         return result
-    return [DataUsageRecord(**r) for r in result]
+    return trusted_result(List[DataUsageRecord], result)
+  
+  
+@mcp.tool(  
+    description="Page through daily data‑usage records for long date ranges. "  
+    "Pass the returned next_cursor back to get the following page; it is null on the last page."  
+)  
+async def get_data_usage_page(  
+    subscription_id: Annotated[int, "Subscription identifier value"],  
+    start_date: Annotated[str, "Inclusive start date (YYYY-MM-DD)"],  
+    end_date: Annotated[str, "Inclusive end date (YYYY-MM-DD)"],  
+    limit: Annotated[int, "Maximum records per page"] = 500,  
+    cursor: Annotated[Optional[str], "next_cursor from the previous page"] = None,  
+) -> DataUsagePage:  
+    page = await get_data_usage_page_async(subscription_id, start_date, end_date, limit, cursor)
+    return trusted_result(DataUsagePage, page)
   
   
 @mcp.tool(description="List every active promotion (no filtering)")  
 async def get_promotions() -> List[Promotion]:  
     data = await get_promotions_async()
-    return [Promotion(**r) for r in data]
+    return trusted_result(List[Promotion], data)
   
   
 @mcp.tool(  
@@ -491,7 +646,7 @@ async def get_eligible_promotions(
     customer_id: Annotated[int, "Customer identifier value"],  
 ) -> List[Promotion]:  
     data = await get_eligible_promotions_async(customer_id)
-    return [Promotion(**r) for r in data]  
+    return trusted_result(List[Promotion], data)  
   
   
 # ─── Knowledge Base Search ───────────────────────────────────────────────  
@@ -499,9 +654,10 @@ async def get_eligible_promotions(
 async def search_knowledge_base(  
     query: Annotated[str, "Natural language query"],  
     topk: Annotated[int, "Number of top documents to return"] = 3,  
+    mode: Annotated[Optional[str], "Ranking mode: 'hybrid' (default), 'vector' or 'lexical'"] = None,  
 ) -> List[KBDoc]:  
-    data = await search_knowledge_base_async(query, topk)
-    return [KBDoc(**r) for r in data]
+    data = await search_knowledge_base_async(query, topk, mode)
+    return trusted_result(List[KBDoc], data)
   
   
 # ─── Security Logs ───────────────────────────────────────────────────────  
@@ -510,7 +666,7 @@ async def get_security_logs(
     customer_id: Annotated[int, "Customer identifier value"],  
 ) -> List[SecurityLog]:  
     data = await get_security_logs_async(customer_id)
-    return [SecurityLog(**r) for r in data]
+    return trusted_result(List[SecurityLog], data)
   
   
 # ─── Orders ──────────────────────────────────────────────────────────────  
@@ -519,7 +675,7 @@ async def get_customer_orders(
     customer_id: Annotated[int, "Customer identifier value"],  
 ) -> List[Order]:  
     data = await get_customer_orders_async(customer_id)
-    return [Order(**r) for r in data]
+    return trusted_result(List[Order], data)
   
   
 # ─── Support Tickets ────────────────────────────────────────────────────  
@@ -529,7 +685,7 @@ async def get_support_tickets(
     open_only: Annotated[bool, "Filter to open tickets"] = False,  
 ) -> List[SupportTicket]:  
     data = await get_support_tickets_async(customer_id, open_only)
-    return [SupportTicket(**r) for r in data]
+    return trusted_result(List[SupportTicket], data)
   
   
 @mcp.tool(description="Create a new support ticket for a customer")  
@@ -559,7 +715,7 @@ async def get_products(
     category: Annotated[Optional[str], "Optional category filter"] = None,  
 ) -> List[Product]:  
     data = await get_products_async(category)
-    return [Product(**r) for r in data]
+    return trusted_result(List[Product], data)
   
   
 @mcp.tool(description="Return a single product by ID")  
@@ -629,4 +785,7 @@ async def get_billing_summary(
 #                                RUN SERVER                                  #  
 ##############################################################################  
 if __name__ == "__main__":  
+    from migrate_schema import prepare_database
+
+    prepare_database(DB_PATH)  # derived tables + WAL once, before serving
     asyncio.run(mcp.run_http_async(host="0.0.0.0", port=8000))  
\ No newline at end of file
@@ -18,11 +18,12 @@ from contoso_tools import (
     unlock_account_async, get_security_logs_async,  
     get_promotions_async, get_eligible_promotions_async,   
     get_products_async, get_product_detail_async,
-    get_all_customers_async, get_customer_detail_async, get_customer_orders_async,
+    get_customers_page_async, get_customer_detail_async, get_customer_orders_async,
     get_subscription_detail_async, update_subscription_async, get_data_usage_async,
     get_support_tickets_async, create_support_ticket_async,
     search_knowledge_base_async
 )
+from tool_metrics import install as install_metrics
 
 # ========================================================================
 # AUTOGEN WRAPPER FUNCTIONS
@@ -30,16 +31,23 @@ from contoso_tools import (
 # These functions wrap the async functions from contoso_tools to work with AutoGen
 # --- Additional customer service / billing-related wrappers ---  
   
-async def get_all_customers() -> str:  
-    """List all customers with basic info."""  
+async def get_all_customers(limit: int = 50, after_id: Optional[int] = None, loyalty_level: Optional[str] = None) -> str:  
+    """List customers with basic info, one page at a time (pass the returned after_id to continue)."""  
     try:  
-        customers = await get_all_customers_async()  
+        # Count the matches once, on the first page; later pages skip the COUNT(*)
+        page = await get_customers_page_async(limit, after_id, loyalty_level, include_total=after_id is None)  
+        customers = page["customers"]  
         if not customers:  
             return "No customers found."  
-        result = "Customer list:\n"  
-        for c in customers:  
-            result += f"- {c['customer_id']}: {c['first_name']} {c['last_name']} ({c['email']}) - Loyalty: {c['loyalty_level']}\n"  
-        return result  
+        of_total = f" of {page['total']}" if page["total"] is not None else ""
+        lines = [f"Customer list ({len(customers)}{of_total}):"]  
+        lines.extend(  
+            f"- {c['customer_id']}: {c['first_name']} {c['last_name']} ({c['email']}) - Loyalty: {c['loyalty_level']}"  
+            for c in customers  
+        )  
+        if page["next_after_id"] is not None:  
+            lines.append(f"More customers available: call again with after_id={page['next_after_id']}")  
+        return "\n".join(lines) + "\n"  
     except Exception as e:  
         return f"Error retrieving customers: {str(e)}"  
   
@@ -558,6 +566,7 @@ server = FastMCP(name="Agentic MCP (Azure OpenAI + Autogen)", sampling_handler_b
 server.add_middleware(ErrorHandlingMiddleware(include_traceback=False))  
 server.add_middleware(LoggingMiddleware(include_payloads=False))  
 server.add_middleware(TimingMiddleware())  
+install_metrics(server)  
   
 # async def _register_session_cleanup(ctx: Context) -> None:  
 #     async def cleanup():  
@@ -614,4 +623,8 @@ import asyncio
 
 # --- Entrypoint ---  
 if __name__ == "__main__":  
+    from contoso_tools import DB_PATH
+    from migrate_schema import prepare_database
+
+    prepare_database(DB_PATH)  # derived tables + WAL once, before serving
     asyncio.run(server.run_http_async(host="0.0.0.0", port=8000))  
\ No newline at end of file
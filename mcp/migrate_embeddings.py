@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Convert ``KnowledgeDocuments`` embeddings from JSON text to binary BLOBs.
+
+Older databases store ``topic_embedding`` as a JSON array (~4x the bytes of
+raw float32 and a JSON parse on every read).  This tool adds the binary
+columns described in ``embedding_codec`` and fills them in place:
+
+    python migrate_embeddings.py --db data/contoso.db
+    python migrate_embeddings.py --db data/contoso.db --dtype int8 --drop-json
+
+It is idempotent: rows that already have a binary embedding are skipped
+unless ``--reencode`` is given (e.g. to switch float32 -> int8).
+``--drop-json`` clears the legacy text column and VACUUMs the file to give
+the space back.
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+from typing import Dict
+
+from embedding_codec import DTYPES, EMBEDDING_COLUMNS, FLOAT32, decode, encode
+
+
+def ensure_embedding_columns(db: sqlite3.Connection) -> None:
+    """Add any missing binary-embedding columns to KnowledgeDocuments."""
+    existing = {r[1] for r in db.execute("PRAGMA table_info(KnowledgeDocuments)")}
+    for name, sql_type in EMBEDDING_COLUMNS:
+        if name not in existing:
+            db.execute(f"ALTER TABLE KnowledgeDocuments ADD COLUMN {name} {sql_type}")
+    db.commit()
+
+
+def migrate(
+    db: sqlite3.Connection,
+    *,
+    dtype: str = FLOAT32,
+    reencode: bool = False,
+    drop_json: bool = False,
+    batch_size: int = 500,
+) -> Dict[str, int]:
+    """Fill the binary embedding columns; returns counters for reporting."""
+    ensure_embedding_columns(db)
+    pending = "" if reencode else "AND embedding IS NULL"
+
+    converted = skipped = 0
+    last_id = 0
+    while True:
+        # Keyset batches keep memory bounded on large knowledge bases.
+        rows = db.execute(
+            "SELECT document_id, topic_embedding, embedding, embedding_dtype, embedding_scale, embedding_offset "
+            f"FROM KnowledgeDocuments WHERE document_id > ? {pending} ORDER BY document_id LIMIT ?",
+            (last_id, batch_size),
+        ).fetchall()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        batch = []
+        for doc_id, text, blob, old_dtype, scale, offset in rows:
+            try:
+                if blob is not None:
+                    vector = decode(blob, old_dtype, scale, offset)
+                elif text:
+                    vector = json.loads(text)
+                else:
+                    skipped += 1
+                    continue
+            except (ValueError, TypeError):
+                skipped += 1
+                continue
+            batch.append((*encode(vector, dtype), doc_id))
+        with db:
+            db.executemany(
+                "UPDATE KnowledgeDocuments SET embedding = ?, embedding_dtype = ?, "
+                "embedding_scale = ?, embedding_offset = ? WHERE document_id = ?",
+                batch,
+            )
+        converted += len(batch)
+
+    if drop_json:
+        db.execute("UPDATE KnowledgeDocuments SET topic_embedding = NULL WHERE embedding IS NOT NULL")
+        db.commit()
+        db.execute("VACUUM")
+    return {"converted": converted, "skipped": skipped}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default=os.getenv("DB_PATH", "data/contoso.db"))
+    parser.add_argument("--dtype", choices=DTYPES, default=FLOAT32)
+    parser.add_argument("--reencode", action="store_true", help="re-encode rows that already have a BLOB")
+    parser.add_argument("--drop-json", action="store_true", help="clear topic_embedding text and VACUUM")
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    size_before = os.path.getsize(args.db)
+    db = sqlite3.connect(args.db)
+    try:
+        stats = migrate(
+            db,
+            dtype=args.dtype,
+            reencode=args.reencode,
+            drop_json=args.drop_json,
+            batch_size=args.batch_size,
+        )
+    finally:
+        db.close()
+    size_after = os.path.getsize(args.db)
+    print(
+        f"✅  {stats['converted']} embeddings written as {args.dtype} "
+        f"({stats['skipped']} skipped); file size {size_before:,} → {size_after:,} bytes"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Add the covering/composite indexes the Contoso tools rely on.
+
+``create_db.py`` builds new databases with these indexes, and
+``migrate_schema.prepare_database`` applies them at server startup.  This
+tool brings an existing database up to date in place on its own:
+
+    python migrate_indexes.py --db data/contoso.db
+
+It is idempotent (``CREATE INDEX IF NOT EXISTS``) and drops the
+single-column indexes that a composite one now makes redundant.
+``--analyze`` also refreshes the planner statistics.  Check the result with
+``python query_plan_audit.py``.
+"""
+
+import argparse
+import os
+import sqlite3
+from typing import Dict, List, Tuple
+
+# (index name, table, columns).  Column order matters: equality columns
+# first, then the range/ORDER BY column, then payload columns so the index
+# covers the query on its own.
+INDEXES: List[Tuple[str, str, str]] = [
+    ("idx_subs_customer", "Subscriptions", "customer_id"),
+    ("idx_inv_sub", "Invoices", "subscription_id"),
+    ("idx_pay_inv_status", "Payments", "invoice_id, status, amount"),
+    ("idx_usage_sub_date", "DataUsage", "subscription_id, usage_date, data_used_mb, voice_minutes, sms_count"),
+    ("idx_tickets_cust_status", "SupportTickets", "customer_id, status"),
+    ("idx_tickets_sub", "SupportTickets", "subscription_id"),
+    ("idx_inc_sub", "ServiceIncidents", "subscription_id"),
+    ("idx_seclogs_cust_time", "SecurityLogs", "customer_id, event_timestamp"),
+    ("idx_seclogs_cust_event", "SecurityLogs", "customer_id, event_type, event_timestamp"),
+    ("idx_orders_cust_date", "Orders", "customer_id, order_date"),
+    ("idx_products_category", "Products", "category"),
+    ("idx_customers_loyalty", "Customers", "loyalty_level"),
+]
+
+# Older indexes that are a strict prefix of one of the above.
+SUPERSEDED = ["idx_pay_inv", "idx_usage_sub", "idx_tickets_cust"]
+
+
+def index_statements() -> List[str]:
+    """``CREATE INDEX IF NOT EXISTS`` DDL for every entry in :data:`INDEXES`."""
+    return [f"CREATE INDEX IF NOT EXISTS {name} ON {table}({cols})" for name, table, cols in INDEXES]
+
+
+def migrate(db: sqlite3.Connection, *, analyze: bool = False) -> Dict[str, List[str]]:
+    """Create missing indexes and drop superseded ones; returns what changed."""
+    existing = {r[0] for r in db.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    created = [name for name, _, _ in INDEXES if name not in existing]
+    dropped = [name for name in SUPERSEDED if name in existing]
+    with db:
+        for ddl in index_statements():
+            db.execute(ddl)
+        for name in dropped:
+            db.execute(f"DROP INDEX IF EXISTS {name}")
+    if analyze and (created or dropped):
+        db.execute("ANALYZE")
+        db.commit()
+    return {"created": created, "dropped": dropped}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default=os.getenv("DB_PATH", "data/contoso.db"))
+    parser.add_argument("--analyze", action="store_true", help="refresh planner statistics (sqlite_stat1)")
+    args = parser.parse_args()
+
+    db = sqlite3.connect(args.db)
+    try:
+        changes = migrate(db, analyze=args.analyze)
+    finally:
+        db.close()
+    print(
+        f"✅  {len(changes['created'])} indexes created {changes['created']}, "
+        f"{len(changes['dropped'])} dropped {changes['dropped']}"
+    )
+
+
+if __name__ == "__main__":
+    main()
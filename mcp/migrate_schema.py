@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Create the derived, trigger-maintained tables the Contoso tools read from.
+
+* ``InvoiceBalances`` (``invoice_balances.py``)
+* ``DataUsageMonthly`` / ``DataUsageWeekly`` (``usage_rollups.py``)
+* ``KnowledgeIndexVersion`` and the ``KnowledgeDocumentsFTS`` full-text index
+  (``kb_index.py``)
+
+Each is back-filled when it is first created.  The database is also switched
+to WAL so readers keep going while a writer holds the lock, and the
+``migrate_indexes`` set is applied.  ``create_db.py`` builds new databases
+with all of this.  ``mcp_service.py`` and ``serve_workers.py`` run it once at
+startup, before serving; the tools never run DDL on a request and fail with a
+pointer here when a table is missing.  To bring an existing database up to
+date in place::
+
+    python migrate_schema.py --db data/contoso.db
+
+It is idempotent.
+"""
+
+import argparse
+import logging
+import os
+import sqlite3
+from typing import Dict
+
+import migrate_indexes
+from db_pool import open_connection
+from invoice_balances import ensure_invoice_balances
+from kb_index import ensure_fts, ensure_version_tracking
+from usage_rollups import ensure_usage_rollups
+
+logger = logging.getLogger(__name__)
+
+
+def migrate(db: sqlite3.Connection) -> Dict[str, bool]:
+    """Create any missing derived table; returns which ones are available."""
+    return {
+        "invoice_balances": ensure_invoice_balances(db),
+        "usage_rollups": ensure_usage_rollups(db),
+        "kb_version": ensure_version_tracking(db),
+        "kb_fts": ensure_fts(db),
+    }
+
+
+def prepare_database(path: str) -> None:
+    """One-off WAL switch, index and schema upgrades, done before the server starts."""
+    db = open_connection(path)
+    try:
+        mode = db.execute("PRAGMA journal_mode = WAL").fetchone()[0]
+        if mode.lower() != "wal":
+            logger.warning("%s stays in %s journal mode; concurrent writers will block readers", path, mode)
+        try:
+            changes = migrate_indexes.migrate(db)
+            if changes["created"] or changes["dropped"]:
+                logger.info("%s indexes: created %s, dropped %s", path, changes["created"], changes["dropped"])
+            migrate(db)
+        except sqlite3.OperationalError as exc:  # e.g. a fresh volume before create_db.py
+            logger.warning("Schema preparation skipped: %s", exc)
+    finally:
+        db.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default=os.getenv("DB_PATH", "data/contoso.db"))
+    args = parser.parse_args()
+
+    db = sqlite3.connect(args.db)
+    try:
+        mode = db.execute("PRAGMA journal_mode = WAL").fetchone()[0]
+        changes = migrate_indexes.migrate(db)
+        ready = migrate(db)
+    finally:
+        db.close()
+    print(f"✅  {args.db} ({mode}): " + ", ".join(f"{name} {'ok' if ok else 'UNAVAILABLE'}" for name, ok in ready.items())
+          + f"; {len(changes['created'])} indexes created, {len(changes['dropped'])} dropped")
+
+
+if __name__ == "__main__":
+    main()
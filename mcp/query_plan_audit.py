@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+``EXPLAIN QUERY PLAN`` auditor for the SQL issued by ``contoso_tools``.
+
+Every public ``*_async`` tool function is exercised against a scratch copy of
+the database (so write tools are safe to call) with a tracing connection that
+records each statement it executes.  Each distinct statement is then run
+through ``EXPLAIN QUERY PLAN`` and any ``SCAN`` of a real table – i.e. a
+statement that reads a whole table or index instead of seeking into one – is
+reported.  The exit status is non-zero if an unexpected scan is found, so the
+tool can gate CI:
+
+    python query_plan_audit.py --db data/contoso.db
+    python query_plan_audit.py --db data/contoso.db --verbose   # print every plan
+
+Listing endpoints that intentionally return a whole (small) table are
+declared in :data:`ALLOWED_SCANS`.  Older databases get the indexes from
+``migrate_schema.py`` (run at server startup) or ``migrate_indexes.py``.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Set, Tuple
+
+from db_pool import open_connection
+from migrate_schema import migrate
+
+# (tool function, table) pairs whose full scan is by design.
+ALLOWED_SCANS: Set[Tuple[str, str]] = {
+    ("get_all_customers_async", "Customers"),
+    ("count_customers_async", "Customers"),      # unfiltered / substring count
+    ("get_customers_page_async", "Customers"),   # include_total=True counts
+    ("get_products_async", "Products"),          # no category filter
+    ("get_promotions_async", "Promotions"),
+    ("get_eligible_promotions_async", "Promotions"),  # a handful of campaign rows
+    ("search_knowledge_base_async", "KnowledgeDocuments"),  # index (re)load
+}
+
+_DML = re.compile(r"^\s*(SELECT|WITH|INSERT|UPDATE|DELETE)\b", re.IGNORECASE)
+_SCAN = re.compile(r"^SCAN (\w+)(\.\w+)?")
+
+
+@dataclass
+class Statement:
+    function: str
+    sql: str
+    plan: List[str] = field(default_factory=list)
+    violations: List[str] = field(default_factory=list)
+    notes: List[str] = field(default_factory=list)
+
+
+def _sample_ids(db: sqlite3.Connection) -> Dict[str, Any]:
+    """Real keys to call the tools with, so plans reflect populated paths."""
+    def one(sql: str) -> Any:
+        row = db.execute(sql).fetchone()
+        return row[0] if row else 1
+
+    return {
+        "customer_id": one("SELECT customer_id FROM Subscriptions ORDER BY subscription_id LIMIT 1"),
+        "locked_customer_id": one(
+            "SELECT customer_id FROM SecurityLogs WHERE event_type = 'account_locked' LIMIT 1"
+        ),
+        "subscription_id": one("SELECT subscription_id FROM Subscriptions ORDER BY subscription_id LIMIT 1"),
+        "invoice_id": one("SELECT invoice_id FROM Invoices ORDER BY invoice_id LIMIT 1"),
+        "product_id": one("SELECT product_id FROM Products ORDER BY product_id LIMIT 1"),
+        "usage_end": one("SELECT MAX(usage_date) FROM DataUsage"),
+    }
+
+
+def scenarios(ids: Dict[str, Any]) -> List[Tuple[str, Dict[str, Any]]]:
+    """(function name, kwargs) pairs covering every tool and its SQL branches."""
+    cust, sub = ids["customer_id"], ids["subscription_id"]
+    end = ids["usage_end"] or "2025-01-31"
+    return [
+        ("get_all_customers_async", {}),
+        ("get_customers_page_async", {"limit": 10, "after_id": cust, "loyalty_level": "Gold", "include_total": True}),
+        ("get_customers_page_async", {"limit": 10, "name_contains": "an"}),
+        ("count_customers_async", {}),
+        ("get_customer_detail_async", {"customer_id": cust}),
+        ("get_customer_details_async", {"customer_ids": [cust, cust + 1, -1]}),
+        ("get_customer_details_async", {"customer_ids": [cust, cust + 1], "fields": ["email", "subscriptions"],
+                                        "max_items": 1}),
+        ("get_customer_orders_async", {"customer_id": cust}),
+        ("get_subscription_detail_async", {"subscription_id": sub}),
+        ("get_subscription_details_async", {"subscription_ids": [sub, sub + 1, -1]}),
+        ("get_subscription_details_async", {"subscription_ids": [sub, sub + 1], "fields": ["status"]}),
+        ("get_subscription_details_async", {"subscription_ids": [sub, sub + 1], "max_items": 2}),
+        ("get_data_usage_async", {"subscription_id": sub, "start_date": "0000-01-01", "end_date": end}),
+        ("get_data_usage_async", {"subscription_id": sub, "start_date": "0000-01-01", "end_date": end, "aggregate": True}),
+        ("get_data_usage_async", {"subscription_id": sub, "start_date": "2024-01-10", "end_date": "2024-12-20", "aggregate": True}),
+        ("get_data_usage_page_async", {"subscription_id": sub, "start_date": "0000-01-01", "end_date": end, "limit": 5}),
+        ("get_data_usage_page_async", {"subscription_id": sub, "start_date": "0000-01-01", "end_date": end, "limit": 5,
+                                       "cursor": "2024-01-01:1"}),
+        ("get_billing_summary_async", {"customer_id": cust}),
+        ("get_invoice_payments_async", {"invoice_id": ids["invoice_id"]}),
+        ("get_invoices_payments_async", {"invoice_ids": [ids["invoice_id"], ids["invoice_id"] + 1, -1]}),
+        ("get_security_logs_async", {"customer_id": cust}),
+        ("get_products_async", {}),
+        ("get_products_async", {"category": "mobile"}),
+        ("get_product_detail_async", {"product_id": ids["product_id"]}),
+        ("get_promotions_async", {}),
+        ("get_eligible_promotions_async", {"customer_id": cust}),
+        ("get_support_tickets_async", {"customer_id": cust}),
+        ("get_support_tickets_async", {"customer_id": cust, "open_only": True}),
+        ("search_knowledge_base_async", {"query": "roaming charges", "mode": "hybrid"}),
+        ("search_knowledge_base_async", {"query": "roaming charges", "mode": "vector"}),
+        ("search_knowledge_base_async", {"query": "roaming charges", "mode": "lexical"}),
+        # Writes last; they run against the scratch copy.
+        ("pay_invoice_async", {"invoice_id": ids["invoice_id"], "amount": 1.0}),
+        ("update_subscription_async", {"subscription_id": sub, "updates": {"roaming_enabled": 1}}),
+        ("unlock_account_async", {"customer_id": ids["locked_customer_id"]}),
+        ("create_support_ticket_async", {
+            "customer_id": cust, "subscription_id": sub, "category": "billing",
+            "priority": "low", "subject": "audit", "description": "query plan audit",
+        }),
+    ]
+
+
+@contextmanager
+def _traced_tools(db_path: str) -> Iterator[Tuple[Any, List[str]]]:
+    """``contoso_tools`` with ``run_db`` swapped for a statement-recording one."""
+    import contoso_tools
+
+    executed: List[str] = []
+
+    async def traced_run_db(fn: Callable[..., Any], *args: Any) -> Any:
+        db = open_connection(db_path)
+        db.set_trace_callback(executed.append)
+        try:
+            return fn(db, *args)
+        finally:
+            db.close()
+
+    saved = contoso_tools.run_db, contoso_tools.run_write, contoso_tools.DB_PATH
+    contoso_tools.run_db, contoso_tools.run_write, contoso_tools.DB_PATH = traced_run_db, traced_run_db, db_path
+    contoso_tools._kb_index.invalidate()
+    try:
+        yield contoso_tools, executed
+    finally:
+        contoso_tools.run_db, contoso_tools.run_write, contoso_tools.DB_PATH = saved
+        contoso_tools._kb_index.invalidate()
+
+
+def collect(db_path: str) -> List[Statement]:
+    """Run every scenario and return the distinct DML statements per function."""
+    statements: List[Statement] = []
+    seen: Set[Tuple[str, str]] = set()
+    with _traced_tools(db_path) as (tools, executed):
+        with sqlite3.connect(db_path) as probe:
+            # One-off schema upgrades (and their back-fill scans) are not
+            # part of any tool's steady-state plan.
+            migrate(probe)
+            ids = _sample_ids(probe)
+        for name, kwargs in scenarios(ids):
+            executed.clear()
+            try:
+                asyncio.run(getattr(tools, name)(**kwargs))
+            except ValueError:
+                pass  # e.g. "nothing to unlock" – the SQL still ran
+            for sql in executed:
+                if _DML.match(sql) and (name, sql) not in seen:
+                    seen.add((name, sql))
+                    statements.append(Statement(name, sql))
+    return statements
+
+
+def explain(db: sqlite3.Connection, stmt: Statement) -> Statement:
+    rows = db.execute(f"EXPLAIN QUERY PLAN {stmt.sql}").fetchall()
+    for row in rows:
+        detail = row[-1]
+        stmt.plan.append(detail)
+        m = _SCAN.match(detail)
+        if m and not _is_internal(m, detail):
+            # Aliases show up as "SCAN o"; resolve them back to the table name.
+            table = _resolve_alias(stmt.sql, m.group(1))
+            if (stmt.function, table) not in ALLOWED_SCANS:
+                stmt.violations.append(detail)
+        elif detail.startswith("USE TEMP B-TREE"):
+            stmt.notes.append(detail)
+    return stmt
+
+
+def _is_internal(m: "re.Match[str]", detail: str) -> bool:
+    """FTS5 virtual/shadow tables and the schema table are not ours to index."""
+    return (
+        "VIRTUAL TABLE" in detail
+        or m.group(2) is not None          # schema-qualified shadow table (FTS5 internals)
+        or m.group(1).startswith("sqlite_")
+        or m.group(1) == "CONSTANT"
+    )
+
+
+def _resolve_alias(sql: str, name: str) -> str:
+    m = re.search(rf"\b(?:FROM|JOIN)\s+(\w+)\s+(?:AS\s+)?{re.escape(name)}\b", sql, re.IGNORECASE)
+    return m.group(1) if m else name
+
+
+def audit(db_path: str) -> List[Statement]:
+    """Audit every statement on a scratch copy of ``db_path``."""
+    with tempfile.TemporaryDirectory() as tmp:
+        scratch = os.path.join(tmp, "audit.db")
+        with sqlite3.connect(db_path) as src, sqlite3.connect(scratch) as dst:
+            src.backup(dst)
+        statements = collect(scratch)
+        db = sqlite3.connect(scratch)
+        try:
+            return [explain(db, s) for s in statements]
+        finally:
+            db.close()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default=os.getenv("DB_PATH", "data/contoso.db"))
+    parser.add_argument("--verbose", "-v", action="store_true", help="print the plan of every statement")
+    args = parser.parse_args()
+
+    results = audit(args.db)
+    failures = [s for s in results if s.violations]
+    for s in results:
+        if s.violations or args.verbose:
+            flag = "❌" if s.violations else "✅"
+            print(f"{flag}  {s.function}: {' '.join(s.sql.split())[:160]}")
+            for detail in s.plan:
+                print(f"      {detail}")
+    print(f"\n{len(results)} statements audited, {len(failures)} with full scans")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
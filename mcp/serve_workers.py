@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Multi-process launcher for the Contoso MCP server (``mcp_service.py``).
+
+``python mcp_service.py`` serves everything from one process, so tool calls
+and result serialisation share a single core.  This supervisor runs
+``--workers`` uvicorn processes on one port instead:
+
+* ``--mode reuseport`` (default on Linux) – every worker binds its own
+  ``SO_REUSEPORT`` socket and the kernel spreads connections across them;
+* ``--mode shared`` – the supervisor binds one socket before starting the
+  workers (pre-fork) and they all accept from it.
+
+Before any worker starts, the database is switched to WAL and the derived
+tables (invoice balances, usage roll-ups, KB full-text index and change
+tracking) are created once, so workers never race on schema upgrades or
+back-fills.  Each worker commits its writes in groups on one writer
+connection (``db_pool.GroupCommitWriter``); workers contend for SQLite's
+write lock, retried with back-off for up to ``DB_WRITE_RETRY_SECONDS``, and
+a caller waits at most ``DB_WRITE_TIMEOUT_SECONDS`` for its commit, while
+readers keep going.
+
+Workers use stateless streamable HTTP, so any worker can answer any request
+of a client session.  A worker that dies is restarted.  SIGTERM / SIGINT
+stop the workers gracefully: they stop accepting, finish in-flight requests
+for up to ``--graceful-timeout`` seconds, then are killed.
+
+Each worker publishes its tool metrics to a shared directory, so
+``/metrics`` and ``/metrics.json`` report all workers from any of them, and
+``/health`` lists every worker::
+
+    python serve_workers.py --workers 4 --port 8000
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+import time
+from typing import Dict, Optional
+
+logger = logging.getLogger("serve_workers")
+
+MCP_WORKERS = int(os.getenv("MCP_WORKERS", str(os.cpu_count() or 1)))
+GRACEFUL_TIMEOUT_SECONDS = float(os.getenv("MCP_GRACEFUL_TIMEOUT_SECONDS", "30"))
+RESTART_BACKOFF_SECONDS = 1.0
+
+
+def _bind(host: str, port: int, reuse_port: bool) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+# ──────────────────────────────  WORKER  ───────────────────────────────
+def _worker(index: int, args: argparse.Namespace, sock: Optional[socket.socket]) -> None:
+    os.environ["MCP_WORKER_ID"] = str(index)
+    os.environ["TOOL_METRICS_DIR"] = args.metrics_dir
+    asyncio.run(_serve(args, sock))
+
+
+async def _serve(args: argparse.Namespace, sock: Optional[socket.socket]) -> None:
+    import uvicorn
+    from starlette.requests import Request
+    from starlette.responses import JSONResponse
+
+    from db_pool import close_pools
+    from mcp_service import mcp
+    from tool_metrics import METRICS
+
+    @mcp.custom_route("/health", methods=["GET"])
+    async def _health(request: Request):
+        now = time.time()
+        workers = [
+            {
+                "worker": w["worker"],
+                "pid": w["pid"],
+                "alive": w["alive"],
+                "uptime_seconds": round(now - w["started"], 1),
+                "last_report_seconds": round(now - w["updated"], 1),
+                "calls": sum(t["calls"] for t in w["tools"].values()),
+                "errors": sum(t["errors"] for t in w["tools"].values()),
+                "in_flight": sum(t["in_flight"] for t in w["tools"].values()) if w["alive"] else 0,
+            }
+            for w in METRICS.workers()
+        ]
+        alive = sum(w["alive"] for w in workers)
+        return JSONResponse({
+            "status": "ok",
+            "served_by": os.getpid(),
+            "workers_alive": alive,
+            "workers_expected": args.workers,
+            "workers": workers,
+        })
+
+    if sock is None:
+        sock = _bind(args.host, args.port, reuse_port=True)
+    METRICS.publish(force=True)  # visible in /health before the first call
+    app = mcp.http_app(transport="http", stateless_http=True)
+    config = uvicorn.Config(
+        app,
+        lifespan="on",
+        log_level=args.log_level,
+        timeout_graceful_shutdown=args.graceful_timeout,
+    )
+    try:
+        await uvicorn.Server(config).serve(sockets=[sock])
+    finally:
+        close_pools()
+        METRICS.publish(force=True)
+
+
+# ────────────────────────────  SUPERVISOR  ─────────────────────────────
+class Supervisor:
+    """Starts, restarts and gracefully stops the worker processes."""
+
+    def __init__(self, args: argparse.Namespace, sock: Optional[socket.socket]) -> None:
+        self.args = args
+        self.sock = sock
+        self.ctx = multiprocessing.get_context("spawn")
+        self.procs: Dict[int, multiprocessing.process.BaseProcess] = {}
+        self.stopping = False
+
+    def _start(self, index: int) -> None:
+        proc = self.ctx.Process(
+            target=_worker, args=(index, self.args, self.sock), name=f"mcp-worker-{index}", daemon=False
+        )
+        proc.start()
+        self.procs[index] = proc
+        logger.info("worker %d started (pid %d)", index, proc.pid)
+
+    def _stop(self, signum: int, frame: object) -> None:
+        self.stopping = True
+
+    def run(self) -> int:
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+        for index in range(self.args.workers):
+            self._start(index)
+        while not self.stopping:
+            for index, proc in list(self.procs.items()):
+                if not proc.is_alive() and not self.stopping:
+                    logger.warning("worker %d (pid %d) exited with %s; restarting", index, proc.pid, proc.exitcode)
+                    time.sleep(RESTART_BACKOFF_SECONDS)
+                    self._start(index)
+            time.sleep(0.5)
+        return self.shutdown()
+
+    def shutdown(self) -> int:
+        logger.info("stopping %d workers", len(self.procs))
+        for proc in self.procs.values():
+            if proc.is_alive():
+                os.kill(proc.pid, signal.SIGTERM)
+        deadline = time.monotonic() + self.args.graceful_timeout + 5
+        for proc in self.procs.values():
+            proc.join(max(0.0, deadline - time.monotonic()))
+        forced = [p for p in self.procs.values() if p.is_alive()]
+        for proc in forced:
+            logger.warning("worker pid %d did not stop in time; killing", proc.pid)
+            proc.kill()
+            proc.join()
+        return 1 if forced else 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=MCP_WORKERS)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--mode", choices=("reuseport", "shared"),
+                        default="reuseport" if hasattr(socket, "SO_REUSEPORT") else "shared")
+    parser.add_argument("--graceful-timeout", type=float, default=GRACEFUL_TIMEOUT_SECONDS,
+                        help="seconds in-flight requests get to finish on shutdown")
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(message)s")
+
+    from contoso_tools import DB_PATH
+    from migrate_schema import prepare_database
+
+    prepare_database(DB_PATH)
+    args.metrics_dir = tempfile.mkdtemp(prefix="mcp-metrics-")
+    # reuseport: bind once here so a taken port fails fast, then let each
+    # worker bind its own socket; shared: hand this socket to every worker.
+    sock = _bind(args.host, args.port, reuse_port=args.mode == "reuseport")
+    if args.mode == "reuseport":
+        sock.close()
+        sock = None
+    print(f"✅  {args.workers} workers on http://{args.host}:{args.port}/mcp ({args.mode}, db {DB_PATH})")
+    try:
+        return Supervisor(args, sock).run()
+    finally:
+        shutil.rmtree(args.metrics_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Cached bearer-token verification for the MCP server.
+
+With real Entra ID auth every MCP request (``list_tools``, each
+``call_tool`` of each agent turn) used to look the signing key up and verify
+the RS256 signature again.  This module keeps that work off the hot path:
+
+* :class:`JWKSCache` – the JSON Web Key Set parsed once into public keys by
+  ``kid``, refreshed in the background every ``JWKS_REFRESH_SECONDS`` and on
+  demand when a token names an unknown ``kid`` (key rotation), at most once
+  per ``JWKS_MIN_REFRESH_SECONDS``.  A failed refresh keeps the old keys.
+  The source is the ``jwks_uri`` or, as a stand-in for tests and offline
+  development, a local JWKS file (``JWKS_FILE``).
+* :class:`VerifiedTokenCache` – an LRU from the SHA-256 of a token that
+  verified successfully to its ``AccessToken``.  Entries expire at the
+  token's ``exp`` (capped at ``TOKEN_CACHE_TTL_SECONDS``); tokens that fail
+  verification are never cached.
+* :class:`CachingJWTVerifier` – FastMCP's ``JWTVerifier`` wired to both.
+
+A local key pair and tokens signed with it, for the ``JWKS_FILE`` stand-in::
+
+    python token_cache.py keygen --jwks dev_jwks.json --key dev_key.json
+    python token_cache.py token --key dev_key.json --roles query security
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+import httpx
+from authlib.jose import JsonWebKey, JsonWebToken
+from fastmcp.server.auth import AccessToken
+from fastmcp.server.auth.providers.jwt import JWTVerifier
+
+logger = logging.getLogger(__name__)
+
+JWKS_REFRESH_SECONDS = float(os.getenv("JWKS_REFRESH_SECONDS", "3600"))
+JWKS_MIN_REFRESH_SECONDS = float(os.getenv("JWKS_MIN_REFRESH_SECONDS", "30"))
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+TOKEN_CACHE_TTL_SECONDS = float(os.getenv("TOKEN_CACHE_TTL_SECONDS", "3600"))
+
+
+# ─────────────────────────────  JWKS  ──────────────────────────────
+class JWKSCache:
+    """Public keys by ``kid`` from a JWKS URL or local file."""
+
+    def __init__(
+        self,
+        source: str,
+        *,
+        refresh_seconds: float = JWKS_REFRESH_SECONDS,
+        min_refresh_seconds: float = JWKS_MIN_REFRESH_SECONDS,
+    ) -> None:
+        self.source = source
+        self.refresh_seconds = refresh_seconds
+        self.min_refresh_seconds = min_refresh_seconds
+        self._keys: Dict[str, Any] = {}
+        self._fetched_at = 0.0
+        self._attempted_at = float("-inf")
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def _local_path(self) -> Optional[Path]:
+        parsed = urlparse(self.source)
+        if parsed.scheme == "file":
+            return Path(parsed.path)
+        if parsed.scheme in ("http", "https"):
+            return None
+        return Path(self.source)
+
+    async def _load(self) -> Dict[str, Any]:
+        path = self._local_path()
+        if path is not None:
+            jwks = json.loads(await asyncio.to_thread(path.read_text))
+        else:
+            async with httpx.AsyncClient(timeout=10) as client:
+                response = await client.get(self.source)
+                response.raise_for_status()
+                jwks = response.json()
+        keys = {}
+        for key_data in jwks.get("keys", []):
+            keys[key_data.get("kid") or "_default"] = JsonWebKey.import_key(key_data).get_public_key()
+        return keys
+
+    async def refresh(self) -> bool:
+        """Re-read the key set; on failure the previous keys stay in use."""
+        async with self._lock:
+            return await self._refresh_locked()
+
+    async def _refresh_locked(self) -> bool:
+        self._attempted_at = time.monotonic()
+        try:
+            keys = await self._load()
+        except Exception as exc:
+            logger.warning("JWKS refresh from %s failed: %s", self.source, exc)
+            return False
+        self._keys, self._fetched_at = keys, time.monotonic()
+        return True
+
+    def _lookup(self, kid: Optional[str]) -> Optional[Any]:
+        if kid:
+            return self._keys.get(kid)
+        return next(iter(self._keys.values())) if len(self._keys) == 1 else None
+
+    async def get_key(self, kid: Optional[str]) -> Any:
+        key = self._lookup(kid)
+        if key is not None and time.monotonic() - self._fetched_at < 2 * self.refresh_seconds:
+            return key
+        async with self._lock:
+            # Another request may have refreshed while we waited.
+            key = self._lookup(kid)
+            if key is None or time.monotonic() - self._fetched_at >= 2 * self.refresh_seconds:
+                if time.monotonic() - self._attempted_at >= self.min_refresh_seconds:
+                    await self._refresh_locked()
+                key = self._lookup(kid) or key
+        if key is None:
+            raise ValueError(f"Key ID '{kid}' not found in JWKS" if kid else "No unambiguous key in JWKS")
+        return key
+
+    def start(self) -> None:
+        """Start the background refresh task on the running loop (idempotent)."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._refresh_forever())
+
+    async def _refresh_forever(self) -> None:
+        while True:
+            await asyncio.sleep(self.refresh_seconds)
+            await self.refresh()
+
+    async def aclose(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+# ───────────────────────  VERIFIED TOKENS  ─────────────────────────
+class VerifiedTokenCache:
+    """LRU of verified tokens (by SHA-256) that honours each token's ``exp``."""
+
+    def __init__(
+        self,
+        max_size: int = TOKEN_CACHE_SIZE,
+        max_ttl: float = TOKEN_CACHE_TTL_SECONDS,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.max_size = max_size
+        self.max_ttl = max_ttl
+        self.clock = clock
+        self._entries: "OrderedDict[bytes, Tuple[AccessToken, float]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str) -> Optional[AccessToken]:
+        key = self._key(token)
+        entry = self._entries.get(key)
+        if entry is None or entry[1] <= self.clock():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, token: str, access: AccessToken) -> None:
+        now = self.clock()
+        expires = now + self.max_ttl
+        if access.expires_at is not None:
+            expires = min(expires, access.expires_at)
+        if expires <= now or self.max_size <= 0:
+            return
+        key = self._key(token)
+        self._entries[key] = (access, expires)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# ──────────────────────────  VERIFIER  ─────────────────────────────
+class CachingJWTVerifier(JWTVerifier):
+    """``JWTVerifier`` with a background-refreshed JWKS and a verified-token LRU."""
+
+    def __init__(self, *, jwks_uri: str, token_cache: Optional[VerifiedTokenCache] = None, **kwargs: Any) -> None:
+        super().__init__(jwks_uri=jwks_uri, **kwargs)
+        self.jwks = JWKSCache(jwks_uri)
+        self.tokens = token_cache if token_cache is not None else VerifiedTokenCache()
+
+    async def _get_jwks_key(self, kid: Optional[str]) -> Any:
+        self.jwks.start()
+        return await self.jwks.get_key(kid)
+
+    async def load_access_token(self, token: str) -> Optional[AccessToken]:
+        cached = self.tokens.get(token)
+        if cached is not None:
+            return cached
+        access = await super().load_access_token(token)
+        if access is not None:
+            self.tokens.put(token, access)
+        return access
+
+
+# ─────────────────────  LOCAL KEYS (dev / tests)  ──────────────────
+def _keygen(args: argparse.Namespace) -> None:
+    key = JsonWebKey.generate_key("RSA", 2048, is_private=True, options={"kid": args.kid})
+    Path(args.key).write_text(json.dumps(key.as_dict(is_private=True)))
+    Path(args.jwks).write_text(json.dumps({"keys": [key.as_dict(is_private=False)]}, indent=2))
+    print(f"✅  private key → {args.key}, JWKS (kid={args.kid}) → {args.jwks}")
+
+
+def _token(args: argparse.Namespace) -> None:
+    key = JsonWebKey.import_key(json.loads(Path(args.key).read_text()))
+    now = int(time.time())
+    claims = {"sub": args.sub, "iat": now, "exp": now + args.ttl, "roles": args.roles}
+    header = {"alg": "RS256", "kid": key.as_dict()["kid"]}
+    print(JsonWebToken(["RS256"]).encode(header, claims, key).decode())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    kg = sub.add_parser("keygen", help="write an RSA key and its public JWKS")
+    kg.add_argument("--jwks", default="dev_jwks.json")
+    kg.add_argument("--key", default="dev_key.json")
+    kg.add_argument("--kid", default="dev-1")
+    kg.set_defaults(func=_keygen)
+    tk = sub.add_parser("token", help="print a signed token")
+    tk.add_argument("--key", default="dev_key.json")
+    tk.add_argument("--sub", default="dev-user")
+    tk.add_argument("--roles", nargs="*", default=["query"])
+    tk.add_argument("--ttl", type=int, default=3600, help="seconds until exp")
+    tk.set_defaults(func=_token)
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
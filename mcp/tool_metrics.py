@@ -0,0 +1,324 @@
+"""Per-tool latency and throughput metrics for the MCP servers.
+
+:class:`MetricsMiddleware` records, for every ``tools/call``:
+
+* call and error counts and the number of calls in flight
+* a latency histogram (``TOOL_METRICS_BUCKETS`` seconds, cumulative)
+* request bytes (the JSON arguments) and response bytes (text content)
+* the part of the latency spent running SQL (timed on the database worker
+  thread), waiting for a pooled connection or the group commit
+  (``db_wait``), and in result serialisation (``tool_results.trusted_result``),
+  collected through ``contoso_tools.PHASE_HOOKS`` into a per-call context
+  variable
+
+:func:`install` adds the middleware to a FastMCP server together with two
+custom routes: ``/metrics`` (Prometheus text exposition) and
+``/metrics.json`` (the same numbers plus p50/p95/p99 estimated from the
+histogram).
+
+Metrics are kept per process.  When several worker processes serve one port
+(``serve_workers.py``) each one also publishes its counters to
+``TOOL_METRICS_DIR`` (at most every ``TOOL_METRICS_PUBLISH_SECONDS``) and the
+routes report the sum over all workers, whichever worker answers the scrape.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import time
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastmcp import FastMCP
+from fastmcp.server.middleware import Middleware, MiddlewareContext
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse
+
+from contoso_tools import PHASE_HOOKS
+
+TOOL_METRICS_BUCKETS: Tuple[float, ...] = tuple(
+    float(b) for b in os.getenv(
+        "TOOL_METRICS_BUCKETS", "0.001,0.0025,0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2.5,5,10"
+    ).split(",")
+)
+PHASES = ("sql", "db_wait", "serialize")
+TOOL_METRICS_DIR = os.getenv("TOOL_METRICS_DIR") or None
+TOOL_METRICS_PUBLISH_SECONDS = float(os.getenv("TOOL_METRICS_PUBLISH_SECONDS", "1"))
+
+# Seconds per phase for the tool call running in the current task.
+_phases: ContextVar[Optional[Dict[str, float]]] = ContextVar("tool_metrics_phases", default=None)
+
+
+def _record_phase(phase: str, seconds: float) -> None:
+    acc = _phases.get()
+    if acc is not None:
+        acc[phase] = acc.get(phase, 0.0) + seconds
+
+
+@dataclass
+class ToolStats:
+    calls: int = 0
+    errors: int = 0
+    in_flight: int = 0
+    buckets: List[int] = field(default_factory=lambda: [0] * (len(TOOL_METRICS_BUCKETS) + 1))
+    seconds: float = 0.0
+    phase_seconds: Dict[str, float] = field(default_factory=lambda: dict.fromkeys(PHASES, 0.0))
+    bytes_in: int = 0
+    bytes_out: int = 0
+
+    def observe(self, seconds: float) -> None:
+        for i, bound in enumerate(TOOL_METRICS_BUCKETS):
+            if seconds <= bound:
+                self.buckets[i] += 1
+                break
+        else:
+            self.buckets[-1] += 1
+        self.seconds += seconds
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Histogram estimate (linear within a bucket, like ``histogram_quantile``)."""
+        total = sum(self.buckets)
+        if not total:
+            return None
+        rank, seen, lower = q * total, 0, 0.0
+        for bound, count in zip(TOOL_METRICS_BUCKETS, self.buckets):
+            if count and seen + count >= rank:
+                return lower + (bound - lower) * (rank - seen) / count
+            seen, lower = seen + count, bound
+        return TOOL_METRICS_BUCKETS[-1]
+
+    def merge(self, other: "ToolStats") -> None:
+        self.calls += other.calls
+        self.errors += other.errors
+        self.in_flight += other.in_flight
+        self.buckets = [a + b for a, b in zip(self.buckets, other.buckets)]
+        self.seconds += other.seconds
+        for phase, seconds in other.phase_seconds.items():
+            self.phase_seconds[phase] = self.phase_seconds.get(phase, 0.0) + seconds
+        self.bytes_in += other.bytes_in
+        self.bytes_out += other.bytes_out
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class ToolMetrics:
+    """Per-tool :class:`ToolStats`, updated on the event loop."""
+
+    def __init__(self, directory: Optional[str] = TOOL_METRICS_DIR) -> None:
+        self.tools: Dict[str, ToolStats] = {}
+        self.started = time.time()
+        self.directory = Path(directory) if directory else None
+        self._published = 0.0
+        self._trailing: Optional[asyncio.TimerHandle] = None
+
+    def stats(self, tool: str) -> ToolStats:
+        st = self.tools.get(tool)
+        if st is None:
+            st = self.tools[tool] = ToolStats()
+        return st
+
+    def reset(self) -> None:
+        self.tools.clear()
+        self.started = time.time()
+
+    # ------------------------------------------------------ worker sharing
+    def state(self) -> Dict[str, Any]:
+        return {
+            "pid": os.getpid(),
+            "worker": os.getenv("MCP_WORKER_ID"),
+            "started": self.started,
+            "updated": time.time(),
+            "tools": {name: asdict(st) for name, st in self.tools.items()},
+        }
+
+    def publish(self, force: bool = False) -> None:
+        """Write this process's counters to ``directory`` (throttled).
+
+        A throttled call schedules one trailing publish, so a worker that goes
+        idle after a burst still publishes its final counters.
+        """
+        if self.directory is None:
+            return
+        now = time.monotonic()
+        wait = TOOL_METRICS_PUBLISH_SECONDS - (now - self._published)
+        if not force and wait > 0:
+            if self._trailing is None:
+                try:
+                    loop = asyncio.get_running_loop()
+                except RuntimeError:
+                    return
+                self._trailing = loop.call_later(wait, self._publish_trailing)
+            return
+        if self._trailing is not None:
+            self._trailing.cancel()
+            self._trailing = None
+        self._published = now
+        path = self.directory / f"{os.getpid()}.json"
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self.state()))
+        os.replace(tmp, path)
+
+    def _publish_trailing(self) -> None:
+        self._trailing = None
+        self.publish(force=True)
+
+    def workers(self) -> List[Dict[str, Any]]:
+        """Published state of every worker (this one live), oldest first."""
+        if self.directory is None:
+            return [self.state()]
+        self.publish(force=True)
+        states = []
+        for path in self.directory.glob("*.json"):
+            try:
+                state = json.loads(path.read_text())
+            except (OSError, ValueError):
+                continue  # replaced or removed mid-read
+            state["alive"] = _pid_alive(state["pid"])
+            states.append(state)
+        return sorted(states, key=lambda st: st["started"])
+
+    def aggregate(self) -> "ToolMetrics":
+        """The sum over all workers; counters of exited workers are kept."""
+        if self.directory is None:
+            return self
+        total = ToolMetrics(directory=None)
+        total.started = float("inf")
+        for state in self.workers():
+            total.started = min(total.started, state["started"])
+            for name, raw in state["tools"].items():
+                st = ToolStats(**raw)
+                if not state["alive"]:
+                    st.in_flight = 0
+                total.stats(name).merge(st)
+        return total
+
+    # ------------------------------------------------------------ exporters
+    def snapshot(self) -> Dict[str, Any]:
+        tools = {}
+        for name, st in sorted(self.tools.items()):
+            done = st.calls - st.in_flight
+            tools[name] = {
+                "calls": st.calls,
+                "errors": st.errors,
+                "in_flight": st.in_flight,
+                "seconds_total": round(st.seconds, 6),
+                "mean_ms": round(st.seconds / done * 1000, 3) if done else None,
+                **{
+                    f"p{int(q * 100)}_ms": None if (v := st.quantile(q)) is None else round(v * 1000, 3)
+                    for q in (0.5, 0.95, 0.99)
+                },
+                **{f"{p}_seconds_total": round(s, 6) for p, s in st.phase_seconds.items()},
+                "bytes_in": st.bytes_in,
+                "bytes_out": st.bytes_out,
+            }
+        return {"uptime_seconds": round(time.time() - self.started, 3), "tools": tools}
+
+    def prometheus(self) -> str:
+        lines: List[str] = []
+
+        def family(name: str, kind: str, help_text: str, samples: List[Tuple[str, str, float]]) -> None:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for suffix, labels, value in samples:
+                lines.append(f"{name}{suffix}{{{labels}}} {value:g}")
+
+        items = sorted(self.tools.items())
+        label = {name: f'tool="{_escape(name)}"' for name, _ in items}
+        family("mcp_tool_calls_total", "counter", "Tool calls started.",
+               [("", label[n], st.calls) for n, st in items])
+        family("mcp_tool_errors_total", "counter", "Tool calls that raised.",
+               [("", label[n], st.errors) for n, st in items])
+        family("mcp_tool_in_flight", "gauge", "Tool calls currently running.",
+               [("", label[n], st.in_flight) for n, st in items])
+        histogram: List[Tuple[str, str, float]] = []
+        for n, st in items:
+            cumulative = 0
+            for bound, count in zip(TOOL_METRICS_BUCKETS, st.buckets):
+                cumulative += count
+                histogram.append(("_bucket", f'{label[n]},le="{bound:g}"', cumulative))
+            histogram.append(("_bucket", f'{label[n]},le="+Inf"', cumulative + st.buckets[-1]))
+            histogram.append(("_sum", label[n], st.seconds))
+            histogram.append(("_count", label[n], cumulative + st.buckets[-1]))
+        family("mcp_tool_duration_seconds", "histogram", "Tool call latency.", histogram)
+        for phase in PHASES:
+            family(f"mcp_tool_{phase}_seconds_total", "counter", f"Time spent in the {phase} phase.",
+                   [("", label[n], st.phase_seconds[phase]) for n, st in items])
+        family("mcp_tool_request_bytes_total", "counter", "JSON-encoded tool arguments.",
+               [("", label[n], st.bytes_in) for n, st in items])
+        family("mcp_tool_response_bytes_total", "counter", "Text content returned by tools.",
+               [("", label[n], st.bytes_out) for n, st in items])
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _response_bytes(result: Any) -> int:
+    return sum(len(text.encode()) for c in getattr(result, "content", None) or () if (text := getattr(c, "text", None)))
+
+
+METRICS = ToolMetrics()
+
+
+class MetricsMiddleware(Middleware):
+    """Feeds a :class:`ToolMetrics` from every tool call."""
+
+    def __init__(self, metrics: ToolMetrics = METRICS) -> None:
+        self.metrics = metrics
+        if _record_phase not in PHASE_HOOKS:
+            PHASE_HOOKS.append(_record_phase)
+
+    async def on_call_tool(self, context: MiddlewareContext, call_next):
+        st = self.metrics.stats(context.message.name)
+        st.calls += 1
+        st.in_flight += 1
+        st.bytes_in += len(json.dumps(context.message.arguments or {}, default=str))
+        phases: Dict[str, float] = {}
+        token = _phases.set(phases)
+        t0 = time.perf_counter()
+        try:
+            result = await call_next(context)
+        except BaseException:
+            st.errors += 1
+            raise
+        else:
+            st.bytes_out += _response_bytes(result)
+            return result
+        finally:
+            st.observe(time.perf_counter() - t0)
+            st.in_flight -= 1
+            for phase, seconds in phases.items():
+                st.phase_seconds[phase] = st.phase_seconds.get(phase, 0.0) + seconds
+            _phases.reset(token)
+            self.metrics.publish()
+
+
+def install(server: FastMCP, metrics: ToolMetrics = METRICS, path: str = "/metrics") -> ToolMetrics:
+    """Add :class:`MetricsMiddleware` and the ``/metrics`` routes to ``server``."""
+    server.add_middleware(MetricsMiddleware(metrics))
+
+    @server.custom_route(path, methods=["GET"])
+    async def _metrics_text(request: Request):
+        return PlainTextResponse(metrics.aggregate().prometheus(), media_type="text/plain; version=0.0.4")
+
+    @server.custom_route(f"{path}.json", methods=["GET"])
+    async def _metrics_json(request: Request):
+        snapshot = metrics.aggregate().snapshot()
+        if metrics.directory is not None:
+            snapshot["workers"] = len([w for w in metrics.workers() if w["alive"]])
+        return JSONResponse(snapshot)
+
+    return metrics
@@ -0,0 +1,103 @@
+"""Trusted fast path from ``contoso_tools`` dicts to MCP tool results.
+
+A tool declared as ``-> SubscriptionDetail`` used to build the Pydantic model
+(validating every invoice and payment), after which FastMCP serialised the
+model twice: once to JSON text for the content block and once to plain
+Python for ``structuredContent``.  The dicts come straight from our own
+SQLite rows, so re-validating them buys nothing on the hot path.
+
+:func:`trusted_result` instead projects the dicts onto the declared model's
+fields (dropping extra columns such as ``SELECT *`` keys, exactly like the
+model would), serialises that once with ``pydantic_core`` and returns a ready
+``ToolResult``.  The return annotation still drives the tool's output
+schema.  Set ``TRUSTED_TOOL_RESULTS=false`` to validate through a cached
+``TypeAdapter`` instead (e.g. while changing a model or a query).
+"""
+
+from __future__ import annotations
+
+import os
+import types
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple, Union, get_args, get_origin
+
+import pydantic_core
+from fastmcp.tools.tool import ToolResult
+from mcp.types import TextContent
+from pydantic import BaseModel, TypeAdapter
+
+from contoso_tools import timed_phase
+
+TRUSTED_TOOL_RESULTS = os.getenv("TRUSTED_TOOL_RESULTS", "true").lower() in ("1", "true", "yes")
+
+# field name -> (nested model, is a list) or None for plain values
+_Shape = Dict[str, Optional[Tuple[type, bool]]]
+
+
+def _nested(annotation: Any) -> Optional[Tuple[type, bool]]:
+    """The model inside ``annotation`` (``M``, ``Optional[M]``, ``List[M]`` ...)."""
+    origin = get_origin(annotation)
+    if origin in (Union, types.UnionType):
+        for arg in get_args(annotation):
+            found = _nested(arg)
+            if found:
+                return found
+        return None
+    if origin in (list, List):
+        args = get_args(annotation)
+        found = _nested(args[0]) if args else None
+        return (found[0], True) if found else None
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return annotation, False
+    return None
+
+
+@lru_cache(maxsize=None)
+def _shape(model: type) -> _Shape:
+    return {name: _nested(f.annotation) for name, f in model.model_fields.items()}
+
+
+def _plain(model: type, data: Dict[str, Any]) -> Dict[str, Any]:
+    """``data`` restricted to ``model``'s fields, recursively; no validation."""
+    shape = _shape(model)
+    out: Dict[str, Any] = {}
+    for key, value in data.items():
+        if key not in shape:
+            continue
+        nested = shape[key]
+        if nested is None or value is None:
+            out[key] = value
+        elif nested[1]:
+            out[key] = [_plain(nested[0], v) for v in value]
+        else:
+            out[key] = _plain(nested[0], value)
+    return out
+
+
+@lru_cache(maxsize=None)
+def _adapter(tp: Any) -> TypeAdapter:
+    return TypeAdapter(tp)
+
+
+def plain_result(tp: Any, data: Any) -> Any:
+    """``data`` shaped like the serialised form of ``tp`` (a model or ``List[model]``)."""
+    nested = _nested(tp)
+    if nested is None:
+        return data
+    model, many = nested
+    return [_plain(model, d) for d in data] if many else _plain(model, data)
+
+
+def trusted_result(tp: Any, data: Any) -> Any:
+    """Tool return value for ``data`` declared as ``tp``.
+
+    Non-object results (lists) are wrapped as ``{"result": ...}`` in
+    ``structuredContent``, matching FastMCP's wrapped output schema.
+    """
+    if not TRUSTED_TOOL_RESULTS:
+        return _adapter(tp).validate_python(data)
+    with timed_phase("serialize"):
+        plain = plain_result(tp, data)
+        text = pydantic_core.to_json(plain).decode()
+        structured = {"result": plain} if isinstance(plain, list) else plain
+        return ToolResult(content=[TextContent(type="text", text=text)], structured_content=structured)
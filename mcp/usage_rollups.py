@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Monthly and weekly ``DataUsage`` rollups maintained by SQLite triggers.
+
+``get_data_usage_async(aggregate=True)`` used to pull every daily row of the
+requested window into Python just to add up three columns.  Two rollup
+tables hold the same sums per subscription and calendar bucket:
+
+* ``DataUsageMonthly`` keyed by ``(subscription_id, month)`` – ``'YYYY-MM'``
+* ``DataUsageWeekly``  keyed by ``(subscription_id, week_start)`` – the Monday
+
+Triggers on ``DataUsage`` insert, update and delete add/subtract the row's
+values (all integers, so the sums stay exact).  :func:`decompose` splits an
+inclusive ``[start, end]`` window into whole months, whole weeks that do not
+cross a month boundary, and the remaining edge days; :func:`usage_totals`
+then sums a handful of rollup rows plus at most a few weeks' worth of daily
+rows instead of the whole window.
+
+``migrate_schema`` creates and back-fills the tables (``create_db.py`` and
+server startup run it; the tools never do); offline::
+
+    python usage_rollups.py --db data/contoso.db            # create + back-fill
+    python usage_rollups.py --db data/contoso.db --check    # compare with the daily rows
+"""
+
+import argparse
+import logging
+import os
+import sqlite3
+import sys
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_MONTH = "substr({d}, 1, 7)"
+_WEEK = "date({d}, 'weekday 0', '-6 days')"
+_METRICS = ("data_used_mb", "voice_minutes", "sms_count")
+
+# (table, bucket column, SQL expression deriving the bucket from a date)
+ROLLUPS = [
+    ("DataUsageMonthly", "month", _MONTH),
+    ("DataUsageWeekly", "week_start", _WEEK),
+]
+
+
+def _add(table: str, bucket: str, expr: str, row: str, sign: str) -> str:
+    """Upsert ``sign``·``row`` into its bucket (``row`` is ``new``/``old``)."""
+    values = ", ".join(f"{sign}IFNULL({row}.{m}, 0)" for m in _METRICS)
+    updates = ", ".join(f"{m} = {m} + excluded.{m}" for m in _METRICS)
+    return (
+        f"INSERT INTO {table}(subscription_id, {bucket}, {', '.join(_METRICS)}, days) "
+        f"VALUES ({row}.subscription_id, {expr.format(d=f'{row}.usage_date')}, {values}, {sign}1) "
+        f"ON CONFLICT(subscription_id, {bucket}) DO UPDATE SET {updates}, days = days + excluded.days;"
+    )
+
+
+def _ddl() -> List[str]:
+    stmts = []
+    for table, bucket, _ in ROLLUPS:
+        stmts.append(
+            f"""CREATE TABLE IF NOT EXISTS {table}(
+                    subscription_id INTEGER NOT NULL,
+                    {bucket}        TEXT NOT NULL,
+                    data_used_mb    INTEGER NOT NULL DEFAULT 0,
+                    voice_minutes   INTEGER NOT NULL DEFAULT 0,
+                    sms_count       INTEGER NOT NULL DEFAULT 0,
+                    days            INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (subscription_id, {bucket})
+                ) WITHOUT ROWID"""
+        )
+    # Rows whose usage_date is not a valid date cannot be bucketed and are
+    # left out of the rollups.
+    valid_new = "date(new.usage_date) IS NOT NULL"
+    valid_old = "date(old.usage_date) IS NOT NULL"
+    ins = "".join(_add(t, b, e, "new", "") for t, b, e in ROLLUPS)
+    dele = "".join(_add(t, b, e, "old", "-") for t, b, e in ROLLUPS)
+    stmts += [
+        f"""CREATE TRIGGER IF NOT EXISTS trg_usage_rollup_ins AFTER INSERT ON DataUsage
+            WHEN {valid_new} BEGIN {ins} END""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_usage_rollup_del AFTER DELETE ON DataUsage
+            WHEN {valid_old} BEGIN {dele} END""",
+        # An update is a delete of the old values plus an insert of the new
+        # ones (the row may move to another subscription or bucket).
+        f"""CREATE TRIGGER IF NOT EXISTS trg_usage_rollup_upd_old AFTER UPDATE ON DataUsage
+            WHEN {valid_old} BEGIN {dele} END""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_usage_rollup_upd_new AFTER UPDATE ON DataUsage
+            WHEN {valid_new} BEGIN {ins} END""",
+    ]
+    return stmts
+
+
+def _backfill() -> List[str]:
+    sums = ", ".join(f"SUM(IFNULL({m}, 0))" for m in _METRICS)
+    return [
+        f"""INSERT OR REPLACE INTO {table}(subscription_id, {bucket}, {', '.join(_METRICS)}, days)
+            SELECT subscription_id, {expr.format(d='usage_date')} AS bucket, {sums}, COUNT(*)
+            FROM DataUsage
+            WHERE date(usage_date) IS NOT NULL
+            GROUP BY subscription_id, bucket"""
+        for table, bucket, expr in ROLLUPS
+    ]
+
+
+def has_usage_rollups(db: sqlite3.Connection) -> bool:
+    names = {r[0] for r in db.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name IN ('DataUsageMonthly', 'DataUsageWeekly')"
+    )}
+    return len(names) == len(ROLLUPS)
+
+
+def ensure_usage_rollups(db: sqlite3.Connection) -> bool:
+    """Create (and on first creation back-fill) the rollup tables + triggers.
+
+    Returns False on a read-only database without them.
+    """
+    if has_usage_rollups(db):
+        return True
+    owns_transaction = not db.in_transaction
+    try:
+        for stmt in _ddl() + _backfill():
+            db.execute(stmt)
+        if owns_transaction:
+            db.commit()
+        return True
+    except sqlite3.OperationalError as exc:
+        if owns_transaction:
+            db.rollback()
+        logger.warning("Usage rollups unavailable (%s)", exc)
+        return False
+
+
+# ──────────────────────────────  QUERYING  ──────────────────────────────
+def _month_end(d: date) -> date:
+    nxt = (d.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return nxt - timedelta(days=1)
+
+
+def decompose(start: date, end: date) -> Tuple[List[str], List[str], List[Tuple[str, str]]]:
+    """Split ``[start, end]`` into (months, week starts, edge-day ranges).
+
+    Whole calendar months come from the monthly table, whole Monday-Sunday
+    weeks that stay inside one month from the weekly table, and whatever is
+    left (at most six days on either side of each month edge) from the
+    daily rows, as inclusive ``(first, last)`` ranges.
+    """
+    months: List[str] = []
+    weeks: List[str] = []
+    days: List[Tuple[str, str]] = []
+    cur = start
+    while cur <= end:
+        month_end = _month_end(cur)
+        if cur.day == 1 and month_end <= end:
+            months.append(cur.strftime("%Y-%m"))
+            cur = month_end + timedelta(days=1)
+            continue
+        week_end = cur + timedelta(days=6)
+        if cur.weekday() == 0 and week_end <= end and week_end <= month_end:
+            weeks.append(cur.isoformat())
+            cur = week_end + timedelta(days=1)
+            continue
+        if days and date.fromisoformat(days[-1][1]) == cur - timedelta(days=1):
+            days[-1] = (days[-1][0], cur.isoformat())
+        else:
+            days.append((cur.isoformat(), cur.isoformat()))
+        cur += timedelta(days=1)
+    return months, weeks, days
+
+
+def _parse(value: str) -> Optional[date]:
+    try:
+        return date.fromisoformat(value) if len(value) == 10 else None
+    except (TypeError, ValueError):
+        return None
+
+
+def usage_totals(
+    db: sqlite3.Connection,
+    subscription_id: int,
+    start_date: str,
+    end_date: str,
+    *,
+    use_rollups: bool = True,
+) -> Dict[str, Any]:
+    """Sum usage over an inclusive date window in a single SQL statement."""
+    start, end = _parse(start_date), _parse(end_date)
+    parts: List[str] = []
+    params: List[Any] = []
+    if use_rollups and start and end:
+        months, weeks, days = decompose(start, end)
+        if months:
+            parts.append(
+                f"SELECT {', '.join(_METRICS)}, days FROM DataUsageMonthly "
+                "WHERE subscription_id = ? AND month BETWEEN ? AND ?"
+            )
+            params += [subscription_id, months[0], months[-1]]
+        if weeks:
+            parts.append(
+                f"SELECT {', '.join(_METRICS)}, days FROM DataUsageWeekly "
+                f"WHERE subscription_id = ? AND week_start IN ({', '.join('?' * len(weeks))})"
+            )
+            params += [subscription_id, *weeks]
+        ranges = days
+    else:
+        # Unparseable dates keep the original string BETWEEN semantics.
+        ranges = [(start_date, end_date)]
+    for first, last in ranges:
+        parts.append(
+            f"SELECT {', '.join(_METRICS)}, 1 AS days FROM DataUsage "
+            "WHERE subscription_id = ? AND usage_date BETWEEN ? AND ?"
+        )
+        params += [subscription_id, first, last]
+
+    totals = {"total_mb": 0, "total_voice_minutes": 0, "total_sms": 0, "days": 0}
+    if parts:
+        row = db.execute(
+            "SELECT IFNULL(SUM(data_used_mb), 0), IFNULL(SUM(voice_minutes), 0), "
+            f"IFNULL(SUM(sms_count), 0), IFNULL(SUM(days), 0) FROM ({' UNION ALL '.join(parts)})",
+            params,
+        ).fetchone()
+        totals = dict(zip(totals, row))
+    return totals
+
+
+def mismatches(db: sqlite3.Connection) -> List[Tuple]:
+    """Rollup rows that differ from a fresh GROUP BY over the daily rows."""
+    bad: List[Tuple] = []
+    sums = ", ".join(f"SUM(IFNULL({m}, 0)) AS {m}" for m in _METRICS)
+    cols = ", ".join(_METRICS)
+    for table, bucket, expr in ROLLUPS:
+        fresh = (
+            f"SELECT subscription_id, {expr.format(d='usage_date')} AS {bucket}, {sums}, COUNT(*) AS days "
+            f"FROM DataUsage WHERE date(usage_date) IS NOT NULL GROUP BY subscription_id, {bucket}"
+        )
+        stored = f"SELECT subscription_id, {bucket}, {cols}, days FROM {table} WHERE days != 0"
+        diff = f"SELECT * FROM ({fresh} EXCEPT {stored}) UNION ALL SELECT * FROM ({stored} EXCEPT {fresh})"
+        for row in db.execute(diff):
+            bad.append((table, *row))
+    return bad
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default=os.getenv("DB_PATH", "data/contoso.db"))
+    parser.add_argument("--check", action="store_true", help="verify the rollups against DataUsage")
+    args = parser.parse_args()
+
+    db = sqlite3.connect(args.db)
+    try:
+        if not ensure_usage_rollups(db):
+            return 1
+        if args.check:
+            bad = mismatches(db)
+            print(f"{'❌' if bad else '✅'}  {len(bad)} rollup rows out of date")
+            for row in bad[:20]:
+                print(f"      {row}")
+            return 1 if bad else 0
+        counts = {t: db.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0] for t, _, _ in ROLLUPS}
+        print(f"✅  usage rollups ready {counts}")
+        return 0
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())